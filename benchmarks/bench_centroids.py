@@ -0,0 +1,88 @@
+# bench_centroids.py
+#
+# Centroids for a national-scale drought snapshot: the old per-feature
+# vertex-mean loop vs. the batch shoelace kernel in geometryKernel (which
+# also yields areas and bounding boxes), checked against shapely.
+#
+#   python -m benchmarks.bench_centroids
+
+import time
+
+import numpy as np
+import shapely
+
+from benchmarks.bench_lod import synthetic_drought
+from geometryKernel import rings_stats
+
+
+def vertex_mean_centroid(rings):
+    x_coords = [point[0] for ring in rings for point in ring]
+    y_coords = [point[1] for ring in rings for point in ring]
+    return {"longitude": sum(x_coords) / len(x_coords), "latitude": sum(y_coords) / len(y_coords)}
+
+
+def shoelace_centroid(rings):
+    """
+    The same area-weighted centroid as the kernel, one feature at a time in
+    pure Python: the like-for-like baseline.
+    """
+    area = cx = cy = 0.0
+    for ring in rings:
+        x0, y0 = ring[0][0], ring[0][1]
+        for (xa, ya), (xb, yb) in zip(ring, ring[1:] + ring[:1]):
+            xa, ya, xb, yb = xa - x0, ya - y0, xb - x0, yb - y0
+            cross = xa * yb - xb * ya
+            area += cross
+            cx += (xa + xb + 3 * x0) * cross
+            cy += (ya + yb + 3 * y0) * cross
+    return {"longitude": cx / (3 * area), "latitude": cy / (3 * area)}
+
+
+def with_holes(entries):
+    """
+    Give every other polygon a counter-clockwise hole in its eastern half, so
+    the true centroid moves away from the vertex mean.
+    """
+    for i, entry in enumerate(entries):
+        ring = np.asarray(entry["rings"][0])
+        if i % 2:
+            continue
+        cx, cy = ring[:, 0].mean(), ring[:, 1].mean()
+        r = (ring[:, 0].max() - ring[:, 0].min()) / 6
+        angles = np.linspace(0, 2 * np.pi, 64)
+        hole = np.column_stack([cx + r + r * np.cos(angles), cy + r * np.sin(angles)])
+        # The synthetic outlines wind counter-clockwise, so the hole goes clockwise
+        entry["rings"] = [ring.tolist(), hole[::-1].tolist()]
+    return entries
+
+
+def main():
+    entries = with_holes(synthetic_drought())
+    rings = [entry["rings"] for entry in entries]
+    vertices = sum(len(ring) for feature in rings for ring in feature)
+    print(f"{len(entries)} features, {vertices} vertices")
+
+    start = time.perf_counter()
+    old = np.array([[c["longitude"], c["latitude"]] for c in map(vertex_mean_centroid, rings)])
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = np.array([[c["longitude"], c["latitude"]] for c in map(shoelace_centroid, rings)])
+    python_shoelace = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats = rings_stats(rings)
+    kernel = time.perf_counter() - start
+
+    polygons = [shapely.Polygon(feature[0], feature[1:]) for feature in rings]
+    expected = shapely.get_coordinates(shapely.centroid(polygons))
+    print(f"vertex-mean loop: {loop * 1000:7.1f}ms  max centroid error {np.abs(old - expected).max():.4f} deg")
+    print(f"shoelace loop:    {python_shoelace * 1000:7.1f}ms  max centroid error "
+          f"{np.abs(exact - expected).max():.1e} deg")
+    print(f"shoelace kernel:  {kernel * 1000:7.1f}ms  max centroid error "
+          f"{np.abs(stats.centroids - expected).max():.1e} deg, "
+          f"max area error {np.abs(stats.area - shapely.area(polygons)).max():.1e}")
+
+
+if __name__ == "__main__":
+    main()
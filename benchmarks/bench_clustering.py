@@ -0,0 +1,51 @@
+# bench_clustering.py
+#
+# Full haversine DBSCAN recluster vs. an incremental update of the persistent
+# clusterer after 1% of the warnings expire and 1% new ones arrive.
+#
+#   python -m benchmarks.bench_clustering
+
+import time
+
+import numpy as np
+
+from clusterEngine import IncrementalDBSCAN, full_dbscan
+
+EPS_KM = 10
+CHURN = 0.01
+
+
+def synthetic_points(rng, n):
+    # Roughly the contiguous US
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for n in (1_000, 10_000, 100_000):
+        coords = synthetic_points(rng, n)
+        keys = list(range(n))
+
+        clusterer = IncrementalDBSCAN(eps_km=EPS_KM)
+        start = time.perf_counter()
+        clusterer.update(keys, coords)
+        initial = time.perf_counter() - start
+
+        churn = int(n * CHURN)
+        keys = keys[churn:] + list(range(n, n + churn))
+        coords = np.vstack([coords[churn:], synthetic_points(rng, churn)])
+
+        start = time.perf_counter()
+        full_dbscan(coords, eps_km=EPS_KM)
+        full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        clusterer.update(keys, coords)
+        incremental = time.perf_counter() - start
+
+        print(f"n={n:<7} full={full * 1000:9.1f}ms  incremental={incremental * 1000:9.1f}ms  "
+              f"(initial build {initial * 1000:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_deck_payload.py
+#
+# Serialization time and payload size of the pydeck layers at national scale:
+# the old list-of-dicts / per-row colour list path vs. the NumPy buffer path
+# in deckBuffers.
+#
+#   python -m benchmarks.bench_deck_payload
+
+import time
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from benchmarks.bench_lod import synthetic_drought
+from deckBuffers import CompactDeck, point_layer_data, polygon_buffers, polygon_layer_data
+from droughtData import drought_categories
+
+WARNINGS = 20_000
+PALETTE = [[255, 0, 0], [0, 255, 0], [0, 0, 255], [255, 255, 0], [255, 165, 0], [255, 0, 255],
+           [0, 255, 255], [75, 0, 130], [255, 20, 147], [0, 255, 127], [255, 105, 180]]
+
+
+def to_json(layer, deck_class=pdk.Deck):
+    deck = deck_class(layers=[layer], initial_view_state=pdk.ViewState(latitude=0, longitude=0, zoom=1))
+    return deck.to_json()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    payload = fn()
+    return time.perf_counter() - start, len(payload)
+
+
+def drought_old(entries):
+    polygons = [{"rings": entry["rings"], "label": entry["label"]} for entry in entries]
+    for polygon in polygons:
+        for category in drought_categories.values():
+            if category["label"] == polygon["label"]:
+                polygon["color"] = category["color"]
+                break
+    return to_json(pdk.Layer("PolygonLayer", data=polygons, get_polygon="rings", get_fill_color="color"))
+
+
+def drought_new(buffers):
+    return to_json(pdk.Layer("PolygonLayer", data=polygon_layer_data(buffers), get_polygon="polygon",
+                             position_format="XY", get_fill_color="color"), CompactDeck)
+
+
+def warnings_old(lat, lon, codes):
+    df = pd.DataFrame({"latitude": lat, "longitude": lon, "event_type": codes})
+    df["color"] = df["event_type"].map(dict(enumerate(PALETTE)))
+    return to_json(pdk.Layer("ScatterplotLayer", data=df, get_position="[longitude, latitude]",
+                             get_fill_color="color"))
+
+
+def warnings_new(lat, lon, codes):
+    df = point_layer_data(lat, lon, codes, PALETTE)
+    return to_json(pdk.Layer("ScatterplotLayer", data=df, get_position="[longitude, latitude]",
+                             get_fill_color="[r, g, b]"), CompactDeck)
+
+
+def main():
+    entries = synthetic_drought()
+    for i, entry in enumerate(entries):
+        entry["dm"] = i % 5
+        entry["rings"] = [[[round(x, 4), round(y, 4)] for x, y in ring] for ring in entry["rings"]]
+    palette = [drought_categories[f"d{dm}"]["color"] for dm in range(5)]
+    start = time.perf_counter()
+    buffers = polygon_buffers(entries, palette)
+    build = time.perf_counter() - start
+
+    for name, fn in (("drought old", lambda: drought_old(entries)), ("drought new", lambda: drought_new(buffers))):
+        seconds, size = timed(fn)
+        print(f"{name}: {size / 1e6:7.2f} MB  {seconds * 1000:7.0f}ms")
+    print(f"  (one-off buffer build, cached per snapshot: {build * 1000:.0f}ms)")
+
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(25, 49, WARNINGS), rng.uniform(-124, -67, WARNINGS)
+    codes = rng.integers(0, len(PALETTE), WARNINGS)
+    for name, fn in (("warnings old", lambda: warnings_old(lat, lon, codes)),
+                     ("warnings new", lambda: warnings_new(lat, lon, codes))):
+        seconds, size = timed(fn)
+        print(f"{name}: {size / 1e6:7.2f} MB  {seconds * 1000:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
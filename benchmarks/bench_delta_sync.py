@@ -0,0 +1,84 @@
+# bench_delta_sync.py
+#
+# Full re-download vs. FeatureLayerSync delta refresh against a stub layer
+# whose features are added, edited and deleted between refreshes.
+#
+#   python -m benchmarks.bench_delta_sync
+
+import json
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.featureServerStub import StubFeatureServer, make_polygon_features, feature_id
+from featureSync import FeatureLayerSync
+
+LAYER = 3
+FEATURES = 5000
+EDIT_FIELD = "EditDate"
+# Largest vertex difference accepted between a synced and a served feature,
+# in degrees: with FARMVIS_PBF=1 the sync reads quantized f=pbf answers
+TOLERANCE = 1e-6
+
+
+def mutate(stub, round_no, next_id):
+    features = stub.layers[LAYER]
+    for feature in features[:20]:
+        stub.delete(LAYER, feature_id(feature))
+    for feature in make_polygon_features(20, seed=round_no)[:20]:
+        feature["attributes"]["OBJECTID"] = next_id
+        stub.upsert(LAYER, feature)
+        next_id += 1
+    for feature in stub.layers[LAYER][100:110]:
+        edited = json.loads(json.dumps(feature))
+        edited["attributes"]["dm"] = (edited["attributes"]["dm"] + 1) % 5
+        stub.upsert(LAYER, edited)
+    return next_id
+
+
+def same_feature(synced, served):
+    """
+    Same attributes, and the same rings to within TOLERANCE.
+    """
+    if synced["attributes"] != served["attributes"]:
+        return False
+    rings, expected = synced["geometry"]["rings"], served["geometry"]["rings"]
+    return len(rings) == len(expected) and all(
+        len(ring) == len(other) and np.allclose(ring, other, rtol=0, atol=TOLERANCE)
+        for ring, other in zip(rings, expected))
+
+
+def full_download(stub):
+    start = time.perf_counter()
+    response = requests.get(stub.url + f"{LAYER}/query",
+                            params={"where": "1=1", "outFields": "*", "f": "json", "resultRecordCount": FEATURES * 2})
+    features = response.json()["features"]
+    return len(response.content), time.perf_counter() - start, len(features)
+
+
+def main():
+    with StubFeatureServer({LAYER: make_polygon_features(FEATURES, edit_field=EDIT_FIELD)},
+                           edit_field=EDIT_FIELD, max_record_count=FEATURES * 2) as stub:
+        sync = FeatureLayerSync(stub.url + str(LAYER))
+        summary = sync.refresh()
+        print(f"cold sync: {stub.bytes_served / 1e6:.2f} MB in {summary['seconds'] * 1000:.0f}ms")
+
+        next_id = FEATURES + 1
+        for round_no in range(1, 4):
+            # Edit timestamps are compared to the millisecond
+            time.sleep(0.01)
+            next_id = mutate(stub, round_no, next_id)
+
+            full_bytes, full_seconds, _ = full_download(stub)
+            summary = sync.refresh()
+            assert sync.features.keys() == {feature_id(f) for f in stub.layers[LAYER]}
+            assert all(same_feature(sync.features[feature_id(f)], f) for f in stub.layers[LAYER])
+
+            print(f"round {round_no}: full {full_bytes / 1e6:.2f} MB / {full_seconds * 1000:.0f}ms, "
+                  f"delta {summary['bytes'] / 1e3:.1f} kB / {summary['seconds'] * 1000:.0f}ms "
+                  f"(+{summary['added']} ~{summary['updated']} -{summary['removed']})")
+
+
+if __name__ == "__main__":
+    main()
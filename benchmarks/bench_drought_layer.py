@@ -0,0 +1,78 @@
+# bench_drought_layer.py
+#
+# Per-rerun cost of the folium drought map without vector tiles: the old path
+# (DataFrame + GeoJSON rebuilt, joined by folium.Choropleth and rendered on
+# every rerun) vs. the shared DroughtLayer and map HTML built once per snapshot.
+# Runs offline: the generalized view the map draws is published into a
+# temporary feature cache, as the ingest service does with each snapshot.
+#
+#   python -m benchmarks.bench_drought_layer
+
+import tempfile
+import time
+
+import folium
+import pandas as pd
+
+import droughtData
+import featureCache
+import tileServer
+from benchmarks.bench_lod import synthetic_drought
+from views.droughtMap import get_map_html
+
+RERUNS = 3
+
+
+def old_map(drought_data):
+    m = folium.Map(location=[39.5, -98.35], zoom_start=4)
+    df = pd.DataFrame(drought_data)
+    geojson_data = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": entry["rings"]},
+             "properties": {"OBJECTID": entry["OBJECTID"], "drought_level": entry["dm"]}}
+            for entry in drought_data
+        ]
+    }
+    folium.Choropleth(geo_data=geojson_data, name='choropleth', data=df, columns=['OBJECTID', 'dm'],
+                      key_on='feature.properties.OBJECTID', fill_color='YlOrRd', fill_opacity=0.7,
+                      line_opacity=0.2, legend_name='Drought Intensity').add_to(m)
+    return m
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(RERUNS):
+        fn()
+    return (time.perf_counter() - start) / RERUNS
+
+
+def main():
+    tileServer.VECTOR_TILES = False
+    entries = synthetic_drought()
+    for i, entry in enumerate(entries):
+        entry.update(OBJECTID=i + 1, period="20240101", dm=i % 5, centroid=None, bbox=None)
+        entry["rings"] = [[[round(x, 4), round(y, 4)] for x, y in ring] for ring in entry["rings"]]
+    droughtData.add_geometry_stats(entries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        featureCache._cache = featureCache.FeatureCache(f"{tmp}/features.sqlite")
+        start = time.perf_counter()
+        droughtData.publish_drought_views(entries)
+        views = time.perf_counter() - start
+
+        start = time.perf_counter()
+        layer = droughtData.build_drought_layer(entries, 1)
+        build = time.perf_counter() - start
+
+        print(f"old Choropleth rerun:  {timed(lambda: old_map(entries).get_root().render()) * 1000:7.0f}ms")
+        start = time.perf_counter()
+        get_map_html(layer)
+        first = time.perf_counter() - start
+        print(f"shared layer rerun:    {timed(lambda: get_map_html(layer)) * 1000:7.0f}ms")
+        print(f"  (once per snapshot: views {views * 1000:.0f}ms, layer build {build * 1000:.0f}ms, "
+              f"map render {first * 1000:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
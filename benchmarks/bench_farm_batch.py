@@ -0,0 +1,76 @@
+# bench_farm_batch.py
+#
+# Batch farm scoring over synthetic drought polygons and warnings: 100k farms
+# through the bulk join (in process and over a process pool) vs. per-farm
+# lookups, the nearest-warning search against brute-force great-circle
+# distances, and a CSV to Parquet round trip.
+#
+#   python -m benchmarks.bench_farm_batch
+
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import farmBatch
+from benchmarks.bench_lod import synthetic_drought
+from benchmarks.bench_risk import synthetic_warnings
+from riskEngine import RiskIndex, haversine_km
+
+FARMS = 100_000
+PER_FARM_SAMPLE = 2000
+
+
+def main():
+    entries = synthetic_drought()
+    for i, entry in enumerate(entries):
+        entry["dm"] = i % 5
+    index = RiskIndex(entries, synthetic_warnings())
+
+    rng = np.random.default_rng(11)
+    farms = pd.DataFrame({"farm_id": np.arange(FARMS), "latitude": rng.uniform(27, 47, FARMS),
+                          "longitude": rng.uniform(-118, -72, FARMS)})
+
+    start = time.perf_counter()
+    scored = farmBatch.score_farms(farms, index, workers=1)
+    bulk = time.perf_counter() - start
+    print(f"bulk join, 1 process:   {bulk:6.2f}s for {FARMS} farms ({bulk / FARMS * 1e6:.1f}µs per farm)")
+
+    workers = max(2, os.cpu_count() or 1)
+    start = time.perf_counter()
+    pooled = farmBatch.score_points(index, farms["latitude"].to_numpy(), farms["longitude"].to_numpy(), workers)
+    print(f"bulk join, {workers} processes: {time.perf_counter() - start:6.2f}s "
+          f"(this machine has {os.cpu_count()} CPUs)")
+    assert (pooled["drought_level"] == scored["drought_level"].fillna(-1).to_numpy()).all()
+
+    sample = random.Random(3).sample(range(FARMS), PER_FARM_SAMPLE)
+    start = time.perf_counter()
+    single = [index.assess(farms.latitude[i], farms.longitude[i]) for i in sample]
+    per_farm = (time.perf_counter() - start) / PER_FARM_SAMPLE
+    print(f"per-farm assess:        {per_farm * FARMS:6.2f}s extrapolated ({per_farm * 1e6:.1f}µs per farm)")
+    levels = scored["drought_level"].fillna(-1).to_numpy()
+    mismatched = sum(levels[i] != (-1 if r.drought_level is None else r.drought_level)
+                     for i, r in zip(sample, single))
+    print(f"drought level differing from per-farm lookups: {mismatched} of {PER_FARM_SAMPLE}")
+
+    errors = []
+    for i in sample[:500]:
+        exact = haversine_km(farms.latitude[i], farms.longitude[i], index.latitudes, index.longitudes).min()
+        errors.append(scored["nearest_warning_km"][i] - exact)
+    errors = np.array(errors)
+    print(f"nearest warning vs. brute force: {np.mean(errors < 1e-6):.1%} exact, "
+          f"worst {errors.max():.2f}km further")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        farms.to_csv(f"{tmp}/farms.csv", index=False)
+        farms_in, _ = farmBatch.read_farms(f"{tmp}/farms.csv")
+        start = time.perf_counter()
+        farmBatch.write_farms(farmBatch.score_farms(farms_in, index), f"{tmp}/scored.parquet")
+        print(f"CSV in, Parquet out:    {time.perf_counter() - start:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# bench_feature_cache.py
+#
+# Cold drought load from a stub FeatureServer vs. repeat loads served from the
+# in-memory ingest snapshot, and from the snapshot persisted in the on-disk
+# feature cache by a fresh worker process.
+#
+#   python -m benchmarks.bench_feature_cache
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+import droughtData
+import featureCache
+import ingestService
+from benchmarks.featureServerStub import StubFeatureServer, make_polygon_features
+
+FEATURES = 3000
+
+
+def timed_load():
+    start = time.perf_counter()
+    data, _ = droughtData.fetch_drought_data()
+    return time.perf_counter() - start, len(data)
+
+
+def worker_load(cache_path, stub_url, results):
+    # A fresh process: nothing in memory, only the shared SQLite file
+    featureCache._cache = featureCache.FeatureCache(cache_path)
+    ingestService._service = None
+    droughtData._layer = None
+    droughtData.url = stub_url
+    results.put(timed_load())
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubFeatureServer({3: make_polygon_features(FEATURES)}, max_record_count=1000) as stub:
+        cache_path = os.path.join(tmp, "features.sqlite")
+        featureCache._cache = featureCache.FeatureCache(cache_path)
+        droughtData.url = stub.url + "3/query"
+
+        elapsed, n = timed_load()
+        print(f"cold load:      {elapsed * 1000:8.1f}ms  {n} features, {stub.requests_served} requests")
+        elapsed, n = timed_load()
+        print(f"repeat load:    {elapsed * 1000:8.1f}ms  {n} features, {stub.requests_served} requests")
+
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=worker_load, args=(cache_path, droughtData.url, results))
+        process.start()
+        elapsed, n = results.get()
+        process.join()
+        print(f"other process:  {elapsed * 1000:8.1f}ms  {n} features, {stub.requests_served} requests")
+
+        print("cache stats:", featureCache.get_cache().stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# bench_fetch_layers.py
+#
+# Compare sequential and concurrent warningsData.process_layers against a local
+# stub FeatureServer that injects a different latency for each layer.
+#
+#   python -m benchmarks.bench_fetch_layers
+
+import time
+
+import warningsData
+from benchmarks.featureServerStub import StubFeatureServer, make_point_features
+
+
+def run(max_workers):
+    start = time.perf_counter()
+    warnings, properties, layer_summary = warningsData.process_layers(
+        warningsData.LAYERS, "1=1", max_workers=max_workers
+    )
+    return time.perf_counter() - start, len(warnings)
+
+
+def main():
+    latency = {layer: 0.05 + 0.025 * i for i, layer in enumerate(warningsData.LAYERS)}
+    layers = {
+        layer: make_point_features(200, event=warningsData.INTERESTED_EVENTS[i], seed=layer)
+        for i, layer in enumerate(warningsData.LAYERS)
+    }
+
+    with StubFeatureServer(layers, latency) as stub:
+        warningsData.BASE_URL = stub.url
+        # Measure one full request per layer, not the delta sync round trips
+        # or cache hits
+        warningsData.DELTA_SYNC = False
+        warningsData.FEATURE_CACHE = False
+        print(f"sum of latencies: {sum(latency.values()):.3f}s, slowest layer: {max(latency.values()):.3f}s")
+        for workers in (1, 4, len(warningsData.LAYERS)):
+            elapsed, n = run(workers)
+            print(f"max_workers={workers:<3} wall={elapsed:.3f}s features={n}")
+
+
+if __name__ == "__main__":
+    main()
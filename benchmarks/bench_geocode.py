@@ -0,0 +1,62 @@
+# bench_geocode.py
+#
+# Gazetteer lookups: load time, forward (name) and reverse (nearest place)
+# lookups per call, for the bundled table and for a synthetic table the size
+# of GeoNames cities1000 (~150k places). For scale, a Nominatim lookup is a
+# network round trip, typically 0.3-1s, and limited to one per second.
+#
+#   python -m benchmarks.bench_geocode
+
+import random
+import string
+import time
+
+from gazetteer import Gazetteer, read_table, GAZETTEER_PATH
+
+SYNTHETIC_PLACES = 150_000
+LOOKUPS = 20_000
+
+
+def synthetic_rows(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))).title()
+        yield (name, rng.choice(["KS", "MO", "IA", "NE", "TX"]), "US", rng.uniform(25, 49),
+               rng.uniform(-124, -67), rng.randint(1000, 100_000), [])
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def report(label, rows):
+    start = time.perf_counter()
+    gazetteer = Gazetteer(rows)
+    loaded = time.perf_counter() - start
+
+    rng = random.Random(1)
+    names = [str(gazetteer.names[rng.randrange(len(gazetteer))]) for _ in range(LOOKUPS)]
+    qualified = [f"  {name.upper()}, {gazetteer.lookup(name).admin1} " for name in names[:LOOKUPS // 10]]
+    points = [(rng.uniform(25, 49), rng.uniform(-124, -67)) for _ in range(LOOKUPS)]
+
+    start = time.perf_counter()
+    gazetteer.tree()
+    tree = time.perf_counter() - start
+
+    forward = timed(lambda q: gazetteer.lookup(q), [(q,) for q in names])
+    forward_qualified = timed(lambda q: gazetteer.lookup(q), [(q,) for q in qualified])
+    reverse = timed(gazetteer.nearest, points[:LOOKUPS // 4])
+    print(f"{label:<10} {len(gazetteer):>7} places  load {loaded * 1000:6.0f}ms  tree {tree * 1000:5.0f}ms  "
+          f"forward {forward:5.1f}µs  qualified {forward_qualified:5.1f}µs  reverse {reverse:6.1f}µs")
+
+
+def main():
+    report("bundled", list(read_table(GAZETTEER_PATH)))
+    report("synthetic", list(synthetic_rows(SYNTHETIC_PLACES)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# bench_lod.py
+#
+# JSON payload size and pydeck serialization time for full-resolution drought
+# polygons vs. each level of the simplified LOD pyramid.
+#
+#   python -m benchmarks.bench_lod
+
+import math
+import random
+import time
+
+import pydeck as pdk
+
+from geometryLod import LOD_ZOOMS, build_lod_pyramid
+
+POLYGONS = 400
+VERTICES = 2000
+
+
+def synthetic_drought(seed=0):
+    """
+    Wiggly polygons with dense vertices, like the USDM drought outlines.
+    """
+    rng = random.Random(seed)
+    entries = []
+    for i in range(POLYGONS):
+        lon, lat, r = rng.uniform(-120, -70), rng.uniform(26, 48), rng.uniform(0.5, 3)
+        ring = []
+        for k in range(VERTICES):
+            angle = 2 * math.pi * k / VERTICES
+            wobble = 1 + 0.15 * math.sin(7 * angle) + rng.uniform(-0.02, 0.02)
+            ring.append([lon + r * wobble * math.cos(angle), lat + r * wobble * math.sin(angle)])
+        ring.append(ring[0])
+        entries.append({"rings": [ring], "label": "D1 (Moderate Drought)", "color": [255, 165, 0]})
+    return entries
+
+
+def serialize(polygons):
+    layer = pdk.Layer("PolygonLayer", data=polygons, get_polygon="rings", get_fill_color="color")
+    deck = pdk.Deck(layers=[layer], initial_view_state=pdk.ViewState(latitude=0, longitude=0, zoom=1))
+    start = time.perf_counter()
+    payload = deck.to_json()
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    entries = synthetic_drought()
+
+    start = time.perf_counter()
+    pyramid = build_lod_pyramid(entries)
+    print(f"pyramid build: {(time.perf_counter() - start) * 1000:.0f}ms for levels {LOD_ZOOMS}")
+
+    size, seconds = serialize(entries)
+    print(f"full   : {size / 1e6:8.2f} MB  {seconds * 1000:8.1f}ms")
+    for zoom in LOD_ZOOMS:
+        vertices = sum(len(ring) for entry in pyramid[zoom] for ring in entry["rings"])
+        size_z, seconds_z = serialize(pyramid[zoom])
+        print(f"zoom {zoom:<2}: {size_z / 1e6:8.2f} MB  {seconds_z * 1000:8.1f}ms  "
+              f"{vertices} vertices  ({size / size_z:.0f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_page_imports.py
+#
+# Cold import cost of each page, measured with `python -X importtime` in a
+# fresh interpreter per page. streamlit itself is imported first and not
+# counted, since every page needs it. "all pages" is what the app paid on
+# every cold start when main.py imported every view up front.
+#
+#   python -m benchmarks.bench_page_imports [--rev GIT_REV]
+#
+# --rev measures a git revision (exported to a temporary directory) instead
+# of the working tree, for before/after comparisons.
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    "Preferences": ["views.prefs"],
+    "Dashboard": ["views.dashboard"],
+    "About": ["views.about"],
+    "Event Map": ["views.warningsMap"],
+    "Drought Map": ["views.droughtMap"],
+    "Soil Moisture Map": ["views.soilMoistureMap"],
+}
+PAGES["all pages"] = [module for modules in PAGES.values() for module in modules]
+
+
+def import_times(modules, cwd):
+    """
+    (total_seconds, {third-party package: seconds}) for importing modules
+    after streamlit. A package's time includes whatever it imported itself.
+    """
+    code = "import streamlit\n" + "".join(f"import {module}\n" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd,
+                            capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=cwd))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    local = {os.path.splitext(name)[0] for name in os.listdir(cwd)}
+    total = 0.0
+    packages = {}
+    seen_streamlit = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, field = line.split("|")
+        name = field.strip()
+        # Nested imports are indented by two spaces per level
+        depth = (len(field) - len(field.lstrip()) - 1) // 2
+        if not seen_streamlit:
+            seen_streamlit = depth == 0 and name == "streamlit"
+            continue
+        seconds = int(cumulative) / 1e6
+        if depth == 0:
+            total += seconds
+        if "." not in name and name not in local and not name.startswith("_"):
+            packages[name] = max(packages.get(name, 0), seconds)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rev", help="git revision to measure instead of the working tree")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = ROOT
+        if args.rev:
+            archive = subprocess.run(["git", "archive", args.rev], cwd=ROOT, capture_output=True, check=True)
+            subprocess.run(["tar", "-x", "-C", tmp], input=archive.stdout, check=True)
+            cwd = tmp
+
+        for page, modules in PAGES.items():
+            try:
+                total, packages = import_times(modules, cwd)
+            except RuntimeError as e:
+                print(f"{page:<18} failed: {e}")
+                continue
+            heaviest = sorted(packages.items(), key=lambda item: -item[1])[:4]
+            detail = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in heaviest)
+            print(f"{page:<18} {total * 1000:7.0f}ms  ({detail})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench_pbf.py
+#
+# f=pbf against the JSON formats for the drought layer (f=json) and a
+# warnings layer (f=pgeojson): bytes on the wire, plain and gzipped (ArcGIS
+# gzips responses), and decode time. pbf is timed both to columns
+# (pbfDecoder.decode) and on to the same feature dicts as the JSON path.
+#
+# At --scale 1 the recorded pbf answers in benchmarks/recordings/ are used
+# when present (see replay.py); otherwise the stub's encoder builds them from
+# the JSON features. Either way the decoded features are checked against the
+# JSON ones first: same attributes, vertices within TOLERANCE.
+#
+#   python -m benchmarks.bench_pbf [--scale 10] [--repeat 5]
+
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+import numpy as np
+
+import pbfDecoder
+from benchmarks import replay
+from benchmarks.featureServerStub import encode_pbf
+from geometryKernel import flatten_rings
+
+SCALE = 10
+REPEAT = 5
+# Largest vertex difference accepted between the pbf and JSON answers, in degrees
+TOLERANCE = 1e-6
+
+
+def datasets(scale, directory=replay.RECORDINGS_DIR):
+    """
+    (name, JSON format, features, pbf body) for each benchmarked layer.
+    """
+    drought = replay.load_drought_features(directory)
+    warnings = replay.load_warning_layers([1], ["Flood Warning"], directory)[1]
+    result = []
+    for name, fmt, features, recording in (("drought", "json", drought, "drought"),
+                                           ("warnings", "pgeojson", warnings, "warnings_1")):
+        body = replay.read_pbf_recording(recording, directory)
+        if body is None or scale > 1:
+            features = replay.scale_features(features, scale)
+            body = encode_pbf(features)
+        result.append((name, fmt, features, body))
+    return result
+
+
+def vertices(features):
+    """
+    Every vertex of Esri JSON or GeoJSON polygons or points, as one (V, 2) array.
+    """
+    rings = []
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        if "rings" in geometry:
+            rings.append(geometry["rings"])
+        elif geometry.get("type") == "Polygon":
+            rings.append(geometry["coordinates"])
+        elif geometry.get("type") == "MultiPolygon":
+            rings.append([ring for polygon in geometry["coordinates"] for ring in polygon])
+        elif geometry.get("type") == "Point":
+            rings.append([[geometry["coordinates"]]])
+    return flatten_rings(rings)[0]
+
+
+def check(fmt, features, body):
+    """
+    The largest vertex difference between the JSON features and the decoded
+    pbf; raises if they differ in anything else.
+    """
+    result = pbfDecoder.decode(body)
+    convert = pbfDecoder.geojson_features if fmt == "pgeojson" else pbfDecoder.esri_features
+    decoded = list(convert(result))
+    assert len(decoded) == len(features), f"{len(decoded)} features decoded, {len(features)} expected"
+    key = "properties" if fmt == "pgeojson" else "attributes"
+    for expected, actual in zip(features, decoded):
+        assert expected[key] == actual[key], f"attributes differ: {expected[key]} != {actual[key]}"
+    # GeoJSON rings come back in Esri winding, so compare sorted vertices
+    expected, actual = vertices(features), vertices(decoded)
+    assert expected.shape == actual.shape, f"{len(actual)} vertices decoded, {len(expected)} expected"
+    if fmt == "pgeojson":
+        expected, actual = np.sort(expected, axis=0), np.sort(actual, axis=0)
+    error = float(np.abs(expected - actual).max()) if len(expected) else 0.0
+    assert error <= TOLERANCE, f"vertices off by {error}"
+    return error
+
+
+def median_seconds(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare f=pbf with the JSON formats.")
+    parser.add_argument("--scale", type=int, default=SCALE, help="multiple of the recorded feature counts")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per decoder")
+    parser.add_argument("--recordings", default=replay.RECORDINGS_DIR, help="directory of recorded responses")
+    args = parser.parse_args(argv)
+
+    for name, fmt, features, body in datasets(args.scale, args.recordings):
+        error = check(fmt, features, body)
+        text = json.dumps({"features": features}).encode()
+        convert = pbfDecoder.geojson_features if fmt == "pgeojson" else pbfDecoder.esri_features
+        json_seconds = median_seconds(lambda: json.loads(text), args.repeat)
+        columns_seconds = median_seconds(lambda: pbfDecoder.decode(body), args.repeat)
+        features_seconds = median_seconds(lambda: list(convert(pbfDecoder.decode(body))), args.repeat)
+        print(f"{name}: {len(features)} features, pbf vertices within {error:.1e} degrees of the JSON ones")
+        print(f"  f={fmt:<9} {len(text) / 1e6:8.2f}MB  {len(gzip.compress(text)) / 1e6:8.2f}MB gzipped  "
+              f"decode {json_seconds * 1000:8.1f}ms")
+        print(f"  f=pbf       {len(body) / 1e6:8.2f}MB  {len(gzip.compress(body)) / 1e6:8.2f}MB gzipped  "
+              f"decode {columns_seconds * 1000:8.1f}ms to columns, {features_seconds * 1000:.1f}ms to features")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_risk.py
+#
+# Risk lookups for farm locations over synthetic drought polygons and
+# warnings: building the per-snapshot index, then per-location assessment
+# with the STRtrees vs. a linear scan over every polygon and warning.
+#
+#   python -m benchmarks.bench_risk
+
+import random
+import time
+
+import numpy as np
+import shapely
+
+import warningsData
+from benchmarks.bench_lod import synthetic_drought
+from benchmarks.featureServerStub import make_point_features
+from riskEngine import RISK_RADIUS_KM, RiskIndex, haversine_km
+from tileServer import esri_polygon
+
+WARNINGS = 5000
+LOCATIONS = 2000
+
+
+def synthetic_warnings():
+    features = make_point_features(WARNINGS, event="Flood Warning", lat=37.0, lon=-95.0, spread=12.0, seed=3)
+    warnings, properties, summary = warningsData.build_warning_table([1], [features])
+    return warningsData.cluster_warnings(warnings, scope="bench")
+
+
+def linear_scan(polygons, levels, lats, lons, lat, lon):
+    point = shapely.Point(lon, lat)
+    inside = [level for polygon, level in zip(polygons, levels) if polygon.intersects(point)]
+    distances = haversine_km(lat, lon, lats, lons)
+    return max(inside, default=None), np.flatnonzero(distances <= RISK_RADIUS_KM)
+
+
+def main():
+    entries = synthetic_drought()
+    for i, entry in enumerate(entries):
+        entry["dm"] = i % 5
+    warnings = synthetic_warnings()
+
+    start = time.perf_counter()
+    index = RiskIndex(entries, warnings)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.0f}ms "
+          f"({len(entries)} polygons, {len(warnings)} warnings; once per snapshot)")
+
+    rng = random.Random(7)
+    locations = [(rng.uniform(27, 47), rng.uniform(-118, -72)) for _ in range(LOCATIONS)]
+
+    start = time.perf_counter()
+    results = [index.assess(lat, lon) for lat, lon in locations]
+    indexed = (time.perf_counter() - start) / LOCATIONS
+
+    polygons = [esri_polygon(entry["rings"]) for entry in entries]
+    levels = [entry["dm"] for entry in entries]
+    lats, lons = warnings["latitude"].to_numpy(), warnings["longitude"].to_numpy()
+    sample = locations[:LOCATIONS // 10]
+    start = time.perf_counter()
+    scanned = [linear_scan(polygons, levels, lats, lons, lat, lon) for lat, lon in sample]
+    linear = (time.perf_counter() - start) / len(sample)
+
+    mismatches = sum(
+        result.drought_level != level or len(result.warnings) != len(nearby)
+        for result, (level, nearby) in zip(results, scanned)
+    )
+    print(f"assess (STRtree): {indexed * 1e6:8.1f}µs per location")
+    print(f"linear scan:      {linear * 1e6:8.1f}µs per location  ({linear / indexed:.0f}x slower)")
+    print(f"answers differing from the scan: {mismatches} of {len(sample)}")
+    scores = np.array([(r.flood_score, r.drought_score) for r in results])
+    print(f"mean flood score {scores[:, 0].mean():.2f}, mean drought score {scores[:, 1].mean():.2f}")
+
+
+if __name__ == "__main__":
+    main()
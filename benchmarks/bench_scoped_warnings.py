@@ -0,0 +1,59 @@
+# bench_scoped_warnings.py
+#
+# National vs. location-scoped warning loads against a stub FeatureServer
+# holding warnings spread over the continental US: features downloaded,
+# bytes, wall time, and DBSCAN input size for each envelope radius (each on
+# its own grid level), plus a second user nearby with the per-cell cache warm.
+#
+#   python -m benchmarks.bench_scoped_warnings
+
+import tempfile
+import time
+
+import featureCache
+import warningsData
+from benchmarks.featureServerStub import StubFeatureServer, make_point_features
+
+PER_LAYER = 1500
+# Kansas City, roughly mid-country
+USER_LAT, USER_LON = 39.1, -94.6
+# Lawrence, KS: shares most of Kansas City's cells
+NEARBY_LAT, NEARBY_LON = 38.97, -95.24
+
+
+def timed(stub, fn):
+    requests_before, bytes_before = stub.requests_served, stub.bytes_served
+    start = time.perf_counter()
+    warnings, properties = fn()
+    return (time.perf_counter() - start, len(warnings),
+            stub.requests_served - requests_before, stub.bytes_served - bytes_before)
+
+
+def main():
+    # Each layer's warnings centred on a different part of the country
+    layers = {
+        layer: make_point_features(PER_LAYER, event=warningsData.INTERESTED_EVENTS[i],
+                                   lat=37.5, lon=-120.0 + 5.0 * i, spread=10.0, seed=layer)
+        for i, layer in enumerate(warningsData.LAYERS)
+    }
+    with tempfile.TemporaryDirectory() as tmp, StubFeatureServer(layers) as stub:
+        featureCache._cache = featureCache.FeatureCache(f"{tmp}/features.sqlite")
+        warningsData.BASE_URL = stub.url
+        warningsData.DELTA_SYNC = False
+
+        rows = [("national", lambda: warningsData.load_warnings())]
+        for radius in warningsData.SCOPE_RADII_KM:
+            rows.append((f"scoped {radius}km", lambda radius=radius: warningsData.load_scoped_warnings(
+                USER_LAT, USER_LON, radius)))
+        radius = warningsData.SCOPE_RADII_KM[0]
+        rows.append((f"nearby {radius}km", lambda: warningsData.load_scoped_warnings(NEARBY_LAT, NEARBY_LON, radius)))
+
+        for name, fn in rows:
+            seconds, n, served, size = timed(stub, fn)
+            print(f"{name:<14} {seconds * 1000:7.0f}ms  features={n:<6} requests={served:<4} "
+                  f"{size / 1e6:6.2f} MB")
+        print("(the nearby row only fetches the cells the first user's envelope didn't cover)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# bench_stream_decode.py
+#
+# Peak memory of decoding one large FeatureServer response with
+# response.json() against featureReader.FeatureStream. Each method runs in
+# its own process against a stub layer of large polygons, so its peak RSS
+# isn't hidden by the stub or by another method's high-water mark. "reduce"
+# keeps only a small summary of each feature, as the warnings and drought
+# parsers do; "keep" holds every feature, as a cached or synced layer does.
+#
+#   python -m benchmarks.bench_stream_decode [--features 5000] [--vertices 200]
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+
+from benchmarks.featureServerStub import StubFeatureServer, make_polygon_features
+from featureReader import FeatureStream
+
+LAYER = 3
+FEATURES = 5000
+VERTICES = 200
+METHODS = ("json", "stream")
+MODES = ("reduce", "keep")
+
+
+def decode(url, method, mode):
+    response = requests.get(url, params={"where": "1=1", "outFields": "*", "f": "json"}, stream=True)
+    response.raise_for_status()
+    if method == "json":
+        features = response.json()["features"]
+    else:
+        features = FeatureStream(response)
+    if mode == "keep":
+        return len(list(features))
+    # Reduced to what a parser keeps: an id and a vertex count
+    return len([(f["attributes"]["OBJECTID"], len(f["geometry"]["rings"][0])) for f in features])
+
+
+def rss_bytes():
+    """
+    Peak resident set size of this process so far (Linux).
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def child(url, method, mode):
+    before = rss_bytes()
+    start = time.perf_counter()
+    count = decode(url, method, mode)
+    seconds = time.perf_counter() - start
+    rss = rss_bytes() - before
+
+    tracemalloc.start()
+    decode(url, method, mode)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(json.dumps({"features": count, "seconds": seconds, "rss_bytes": rss, "peak_bytes": peak}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak memory of json() against FeatureStream.")
+    parser.add_argument("--features", type=int, default=FEATURES)
+    parser.add_argument("--vertices", type=int, default=VERTICES)
+    parser.add_argument("--child", nargs=3, metavar=("URL", "METHOD", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(*args.child)
+        return
+
+    layer = make_polygon_features(args.features, vertices=args.vertices)
+    with StubFeatureServer({LAYER: layer}, max_record_count=args.features) as stub:
+        url = stub.url + f"{LAYER}/query"
+        size = len(requests.get(url, params={"where": "1=1", "outFields": "*", "f": "json"}).content)
+        print(f"{args.features} features x {args.vertices} vertices, {size / 1e6:.1f}MB response")
+        for mode in MODES:
+            for method in METHODS:
+                output = subprocess.run([sys.executable, "-m", "benchmarks.bench_stream_decode",
+                                         "--child", url, method, mode],
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output)
+                print(f"{mode:<7} {method:<7} {result['features']:>6} features {result['seconds'] * 1000:8.0f}ms  "
+                      f"peak {result['peak_bytes'] / 1e6:7.1f}MB traced  +{result['rss_bytes'] / 1e6:7.1f}MB RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_suggestions.py
+#
+# Suggestion latency against a stub chat completions server (300ms to first
+# token, 120 tokens 10ms apart): the old pipeline (new client per click,
+# 0.1s sleep after every chunk) vs. the pooled client, and a repeat of the
+# same farm served from the response cache. Reports time to first token,
+# total time and tokens/s.
+#
+#   python -m benchmarks.bench_suggestions
+
+import tempfile
+import time
+
+import openai
+
+import featureCache
+import suggestions
+from benchmarks.openaiServerStub import StubChatServer
+
+CLICKS = 3
+INFO = [["Wheat", "Corn"], "Commercial", "Conventional", 120.0, "Aphids"]
+
+
+def old_click(base_url, prompt):
+    # The previous gen_response loop, minus the Streamlit calls
+    start = time.perf_counter()
+    client = openai.OpenAI(api_key="stub", base_url=base_url)
+    request = client.chat.completions.create(
+        model=suggestions.SUGGESTION_MODEL, messages=[{"role": "assistant", "content": prompt}], stream=True
+    )
+    first = None
+    tokens = 0
+    for chunk in request:
+        if chunk.choices[0].delta.content is not None:
+            first = first or time.perf_counter()
+            tokens += 1
+        time.sleep(0.1)
+    end = time.perf_counter()
+    return suggestions.SuggestionMetrics(False, first - start, end - start, tokens)
+
+
+def new_click(conditions):
+    answer = suggestions.suggest(suggestions.build_prompt(*conditions),
+                                 conditions=suggestions.conditions_key(*conditions))
+    for _ in answer:
+        pass
+    return answer.metrics
+
+
+def report(label, metrics):
+    ttft = sum(m.ttft for m in metrics) / len(metrics)
+    total = sum(m.total for m in metrics) / len(metrics)
+    rate = sum(m.tokens_per_second for m in metrics) / len(metrics)
+    print(f"{label:<24} ttft {ttft * 1000:7.1f}ms  total {total * 1000:8.1f}ms  "
+          + (f"{rate:6.0f} tokens/s" if rate else ""))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp, StubChatServer() as stub:
+        featureCache._cache = featureCache.FeatureCache(f"{tmp}/features.sqlite")
+        base_url = f"{stub.url}/v1"
+        suggestions._client = openai.OpenAI(api_key="stub", base_url=base_url)
+
+        farms = [((39.1 + i, -94.6), "Kansas City", 21.3, 61, 4.1, 2, INFO) for i in range(CLICKS)]
+        report("old (client per click)", [old_click(base_url, suggestions.build_prompt(*farm)) for farm in farms])
+        report("pooled client", [new_click(farm) for farm in farms])
+        # Same farms again, conditions moved within their buckets
+        again = [((39.12 + i, -94.58), " kansas city", 21.1, 62, 3.9, 2, [["Corn", "Wheat"], *INFO[1:4], " aphids"])
+                 for i in range(CLICKS)]
+        report("cached (same buckets)", [new_click(farm) for farm in again])
+        print(f"stub: {stub.requests_served} requests over {stub.connections} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench_tiles.py
+#
+# Vector tiles vs. embedding the whole drought layer in the page: bytes the
+# browser fetches for a typical view at several zooms, time to cut a tile
+# cold, and the same tiles again from the server's tile cache.
+#
+#   python -m benchmarks.bench_tiles
+
+import math
+import time
+
+import requests
+
+from benchmarks.bench_deck_payload import drought_new
+from benchmarks.bench_lod import synthetic_drought
+from deckBuffers import polygon_buffers
+from droughtData import drought_categories
+from tileServer import TileServer, TileSource, esri_polygon
+
+# (zoom, centre lon, centre lat) of the views to load
+VIEWS = [(3, -98.35, 39.5), (5, -98.35, 39.5), (8, -95.0, 37.0), (11, -95.0, 37.0)]
+# Tiles across and down in a ~1280x768 viewport
+VIEW_TILES = (5, 3)
+
+
+def tile_xy(zoom, lon, lat):
+    n = 2 ** zoom
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def view_tiles(zoom, lon, lat):
+    cx, cy = tile_xy(zoom, lon, lat)
+    n = 2 ** zoom
+    width, height = VIEW_TILES
+    return [(zoom, x % n, y)
+            for x in range(cx - width // 2, cx + width // 2 + 1)
+            for y in range(cy - height // 2, cy + height // 2 + 1) if 0 <= y < n]
+
+
+def load_view(session, base_url, tiles):
+    start = time.perf_counter()
+    size = 0
+    for z, x, y in tiles:
+        response = session.get(f"{base_url}/drought/{z}/{x}/{y}.pbf")
+        size += len(response.content)
+    return size, time.perf_counter() - start
+
+
+def main():
+    entries = synthetic_drought()
+    for i, entry in enumerate(entries):
+        entry["dm"] = i % 5
+    palette = [drought_categories[f"d{dm}"]["color"] for dm in range(5)]
+    embedded = len(drought_new(polygon_buffers(entries, palette)))
+    print(f"embedded PolygonLayer: {embedded / 1e6:.2f} MB per page load")
+
+    server = TileServer(port=0).start()
+    base_url = f"http://127.0.0.1:{server.port}"
+    try:
+        start = time.perf_counter()
+        properties = [{"dm": entry["dm"], "label": entry["label"]} for entry in entries]
+        server.publish("drought", "bench",
+                       lambda: TileSource("drought", [esri_polygon(e["rings"]) for e in entries], properties))
+        print(f"publish (project + index): {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        session = requests.Session()
+        for zoom, lon, lat in VIEWS:
+            tiles = view_tiles(zoom, lon, lat)
+            cold_size, cold = load_view(session, base_url, tiles)
+            warm_size, warm = load_view(session, base_url, tiles)
+            print(f"z{zoom:<2} {len(tiles)} tiles: {cold_size / 1e3:8.1f} KB "
+                  f"({cold_size / embedded:6.1%} of embedded)  cold {cold * 1000:6.0f}ms  "
+                  f"cached {warm * 1000:5.0f}ms")
+        print(f"tile cache: {server.hits} hits, {server.misses} misses")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# bench_weather_fetch.py
+#
+# Dashboard weather lookups for a set of farms clustered around a few towns,
+# against a stub OpenWeatherMap with a fixed latency: the old sequential,
+# uncached requests vs. concurrent requests over a pooled session with the
+# grid-keyed cache, cold and warm.
+#
+#   python -m benchmarks.bench_weather_fetch
+
+import random
+import time
+
+import requests
+
+from benchmarks.weatherServerStub import StubWeatherServer
+from views import dashboard
+
+LATENCY = 0.08
+FARMS = 60
+# Farms scattered within ~15 km of each town
+TOWNS = [(39.1, -94.6), (41.6, -93.6), (38.6, -90.2)]
+
+
+def farms(n, seed=0):
+    rng = random.Random(seed)
+    return [(lat + rng.uniform(-0.15, 0.15), lon + rng.uniform(-0.15, 0.15))
+            for lat, lon in (rng.choice(TOWNS) for _ in range(n))]
+
+
+def fetch_sequential(base_url, lat, lon):
+    # The previous implementation: two one-off connections, one after the other
+    weather = requests.get(f"{base_url}/weather?lat={lat}&lon={lon}&appid=x&units=metric").json()
+    aqi = requests.get(f"{base_url}/air_pollution?lat={lat}&lon={lon}&appid=x").json()
+    return weather, aqi
+
+
+def run(stub, label, fetch, locations):
+    served = stub.requests_served
+    start = time.perf_counter()
+    for lat, lon in locations:
+        fetch(lat, lon)
+    seconds = time.perf_counter() - start
+    print(f"{label:<22} {seconds * 1000:7.0f}ms  {seconds / len(locations) * 1000:6.1f}ms/farm  "
+          f"requests={stub.requests_served - served}")
+
+
+def main():
+    locations = farms(FARMS)
+    cells = {dashboard.snap_to_grid(lat, lon) for lat, lon in locations}
+    print(f"{len(locations)} farms in {len(cells)} grid cells of {dashboard.WEATHER_GRID_DEGREES}°, "
+          f"{LATENCY * 1000:.0f}ms upstream latency")
+
+    with StubWeatherServer(latency=LATENCY) as stub:
+        dashboard.OPENWEATHER_URL = stub.url
+        dashboard.get_api_key = lambda: "x"
+        dashboard.fetch_weather_cell.clear()
+
+        run(stub, "sequential, uncached", lambda lat, lon: fetch_sequential(stub.url, lat, lon), locations)
+        run(stub, "concurrent, cold", dashboard.fetch_weather_data, locations)
+        run(stub, "concurrent, warm", dashboard.fetch_weather_data, locations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# bench_zoom_query.py
+#
+# Bytes downloaded for the warnings layer with the old full-precision
+# outFields=* query against the zoom-band query from featureQuery for the
+# national Event Map (zoom 6), and GeoJSON bytes embedded by the folium
+# drought map (zoom 4) for the full synced drought layer against the view
+# droughtData builds from it when a snapshot is published. It also checks
+# that the generalized geometry looks the same at the view's zoom: the
+# largest Hausdorff distance between each original and generalized polygon
+# (and the largest centroid shift) in screen pixels.
+#
+#   python -m benchmarks.bench_zoom_query [--features 500] [--vertices 1000]
+
+import argparse
+import json
+
+import numpy as np
+import requests
+import shapely
+
+import droughtData
+import warningsData
+from benchmarks import replay
+from benchmarks.featureServerStub import StubFeatureServer, make_polygon_features
+from featureQuery import build_query, query_band
+from geometryLod import degrees_per_pixel
+from tileServer import esri_polygon
+from views import droughtMap
+
+DROUGHT_LAYER = 3
+WARNINGS_LAYER = 1
+FEATURES = 500
+VERTICES = 1000
+# Views and the zoom each draws its layer at
+VIEWS = [
+    ("drought", "folium drought map", droughtMap.MAP_ZOOM),
+    ("warnings", "national Event Map", warningsData.MAP_ZOOM),
+]
+# The queries before zoom bands
+FULL_QUERIES = {
+    "drought": {"where": "1=1", "outFields": "*", "returnGeometry": "true", "returnCentroid": "true",
+                "f": "json", "outSR": 4326},
+    "warnings": {"where": "1=1", "outFields": "*", "returnGeometry": "true", "f": "pgeojson"},
+}
+FIELDS = {"drought": droughtData.FIELDS, "warnings": warningsData.QUERY_FIELDS}
+
+
+def polygons(features):
+    """
+    Shapely polygons of Esri JSON or GeoJSON features, by OBJECTID.
+    """
+    result = {}
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        values = feature.get("attributes") or feature.get("properties") or {}
+        rings = geometry.get("rings") or geometry.get("coordinates") or []
+        if rings:
+            result[values.get("OBJECTID")] = esri_polygon(rings)
+    return result
+
+
+def drought_entries(features):
+    """
+    Drought features as load_drought_data keeps them for a snapshot.
+    """
+    entries = [droughtData.process_feature(feature) for feature in features]
+    droughtData.add_geometry_stats(entries)
+    return entries
+
+
+def geojson_bytes(entries):
+    return len(json.dumps(droughtData.build_drought_layer(entries, 1).geojson))
+
+
+def fetch(session, url, params):
+    """
+    (bytes of the JSON answer, bytes of the pbf answer, features)
+    """
+    response = session.get(url, params=params)
+    response.raise_for_status()
+    pbf = session.get(url, params=dict(params, f="pbf"))
+    pbf.raise_for_status()
+    return len(response.content), len(pbf.content), response.json()["features"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bytes and visual error of zoom-band queries.")
+    parser.add_argument("--features", type=int, default=FEATURES, help="drought polygons")
+    parser.add_argument("--vertices", type=int, default=VERTICES, help="vertices per drought polygon")
+    args = parser.parse_args(argv)
+
+    layers = {
+        DROUGHT_LAYER: make_polygon_features(args.features, vertices=args.vertices),
+        WARNINGS_LAYER: replay.synthetic_warning_layer(WARNINGS_LAYER, "Flood Warning"),
+    }
+    session = requests.Session()
+    with StubFeatureServer(layers, max_record_count=max(len(f) for f in layers.values())) as stub:
+        urls = {"drought": f"{stub.url}{DROUGHT_LAYER}/query", "warnings": f"{stub.url}{WARNINGS_LAYER}/query"}
+        full = {name: fetch(session, urls[name], FULL_QUERIES[name]) for name in urls}
+        for name, (json_bytes, pbf_bytes, features) in full.items():
+            print(f"{name}: full precision, outFields=*  {json_bytes / 1e6:7.2f}MB json  {pbf_bytes / 1e6:7.2f}MB pbf  "
+                  f"{len(features)} features")
+
+        for name, view, zoom in VIEWS:
+            band = query_band(zoom)
+            if name == "drought":
+                # Built locally from the synced features, not queried per band
+                entries = drought_entries(full[name][2])
+                view_entries = droughtData.build_drought_view(entries, band)
+                original = {entry["OBJECTID"]: esri_polygon(entry["rings"]) for entry in entries}
+                generalized = {entry["OBJECTID"]: esri_polygon(entry["rings"]) for entry in view_entries}
+            else:
+                params, band = build_query("1=1", FIELDS[name], zoom, f=FULL_QUERIES[name]["f"])
+                json_bytes, pbf_bytes, features = fetch(session, urls[name], params)
+                original = polygons(full[name][2])
+                generalized = polygons(features)
+            shared = sorted(set(original) & set(generalized))
+            before = np.array([original[oid] for oid in shared], dtype=object)
+            after = np.array([generalized[oid] for oid in shared], dtype=object)
+            pixel = degrees_per_pixel(zoom)
+            worst = shapely.hausdorff_distance(before, after).max() / pixel if shared else 0.0
+            shift = shapely.distance(shapely.centroid(before), shapely.centroid(after)).max() / pixel if shared else 0.0
+            if name == "drought":
+                full_bytes = geojson_bytes(entries)
+                view_bytes = geojson_bytes(view_entries)
+                size = f"{view_bytes / 1e6:7.2f}MB GeoJSON in the page ({view_bytes / full_bytes:.1%})"
+            else:
+                size = (f"{json_bytes / 1e6:7.2f}MB json ({json_bytes / full[name][0]:.1%})  "
+                        f"{pbf_bytes / 1e6:7.2f}MB pbf ({pbf_bytes / full[name][1]:.1%})")
+            print(f"  {view} (zoom {zoom}, band {band}): {size}  "
+                  f"{len(generalized)}/{len(original)} polygons, outlines within {worst:.2f}px, "
+                  f"centroids within {shift:.3f}px")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# featureServerStub.py
+#
+# Minimal local stand-in for an ArcGIS FeatureServer, used by the benchmarks.
+# Each layer is a list of features (GeoJSON or Esri JSON) served from
+# /<layer_id>/query, with an optional per-layer latency injected before the
+# response is sent. /<layer_id> returns layer metadata.
+#
+# Supported query parameters: where (1=1, or an edit-date comparison),
+# objectIds, returnIdsOnly, returnCountOnly, resultOffset, resultRecordCount,
+# outFields, maxAllowableOffset, geometryPrecision and f. Pages are capped at
+# max_record_count like a real server. Layers may be mutated between requests
+# with upsert() and delete().
+#
+# f=pbf answers are encoded from the same features (see encode_pbf); with
+# pbf=False the stub rejects f=pbf with a JSON error, as servers without
+# pbf support do.
+
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+EDIT_FILTER = re.compile(r"(\w+) > TIMESTAMP '([^']+)'")
+# Quantization step of f=pbf coordinates, in degrees
+PBF_SCALE = 1e-9
+
+
+def feature_values(feature):
+    return feature.get("attributes") or feature.get("properties") or {}
+
+
+def feature_id(feature):
+    return feature.get("id", feature_values(feature).get("OBJECTID"))
+
+
+def make_polygon_features(count, vertices=40, edit_field=None, seed=0):
+    """
+    Generate synthetic Esri JSON polygons (drought-style) spread over the US.
+    """
+    import math
+    import random
+    rng = random.Random(seed)
+    features = []
+    for i in range(count):
+        lon, lat, r = rng.uniform(-120, -70), rng.uniform(26, 48), rng.uniform(0.1, 1.0)
+        ring = [[lon + r * math.cos(2 * math.pi * k / vertices), lat + r * math.sin(2 * math.pi * k / vertices)]
+                for k in range(vertices)]
+        ring.append(ring[0])
+        attributes = {"OBJECTID": i + 1, "dm": rng.randint(0, 4), "period": "20241015"}
+        if edit_field:
+            attributes[edit_field] = 1_700_000_000_000
+        features.append({"attributes": attributes, "geometry": {"rings": [ring]}})
+    return features
+
+
+def in_envelope(feature, xmin, ymin, xmax, ymax):
+    """
+    Whether a GeoJSON point feature lies inside the envelope. Other geometry
+    types always match, which is enough for the stub.
+    """
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") != "Point":
+        return True
+    x, y = geometry["coordinates"][:2]
+    return xmin <= x <= xmax and ymin <= y <= ymax
+
+
+def make_point_features(count, event="Flood Warning", lat=35.0, lon=-95.0, spread=5.0, seed=0):
+    """
+    Generate synthetic point warnings scattered around (lat, lon).
+    """
+    import random
+    rng = random.Random(seed)
+    features = []
+    for i in range(count):
+        features.append({
+            "type": "Feature",
+            "id": i + 1,
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon + rng.uniform(-spread, spread), lat + rng.uniform(-spread, spread)]
+            },
+            "properties": {"OBJECTID": i + 1, "Event": event}
+        })
+    return features
+
+
+def _generalize_rings(rings, offset, precision):
+    import numpy as np
+    import shapely
+
+    out = []
+    for ring in rings:
+        coords = np.asarray(ring, dtype=float)[:, :2]
+        if offset and len(coords) >= 4:
+            # Topology preserving, so small rings keep a triangle rather than collapsing
+            simplified = shapely.simplify(shapely.Polygon(coords), offset, preserve_topology=True)
+            coords = np.asarray(simplified.exterior.coords) if not simplified.is_empty else coords[:0]
+        if precision is not None:
+            coords = np.round(coords, precision)
+        if len(coords) >= 4:
+            out.append(coords.tolist())
+    return out
+
+
+def generalize(feature, offset=None, precision=None, fields=None):
+    """
+    A copy of a feature as the server returns it for maxAllowableOffset
+    (Douglas-Peucker per ring, dropping rings that collapse), geometryPrecision
+    (decimals) and outFields (None for *). Lines are left as they are.
+    """
+    feature = dict(feature)
+    values_key = "attributes" if "attributes" in feature else "properties"
+    if fields is not None and values_key in feature:
+        feature[values_key] = {key: value for key, value in feature[values_key].items() if key in fields}
+    geometry = feature.get("geometry")
+    if not geometry or (not offset and precision is None):
+        return feature
+    geometry = dict(geometry)
+    kind = geometry.get("type")
+    if "rings" in geometry:
+        geometry["rings"] = _generalize_rings(geometry["rings"], offset, precision)
+    elif kind == "Polygon":
+        geometry["coordinates"] = _generalize_rings(geometry["coordinates"], offset, precision)
+    elif kind == "MultiPolygon":
+        geometry["coordinates"] = [_generalize_rings(polygon, offset, precision)
+                                   for polygon in geometry["coordinates"]]
+    elif kind == "Point" and precision is not None:
+        geometry["coordinates"] = [round(c, precision) for c in geometry["coordinates"]]
+    elif "x" in geometry and precision is not None:
+        geometry["x"], geometry["y"] = round(geometry["x"], precision), round(geometry["y"], precision)
+    feature["geometry"] = geometry
+    return feature
+
+
+def _esri_parts(geometry):
+    """
+    (pbf geometry type, parts) of a GeoJSON or Esri JSON geometry. GeoJSON
+    rings are reversed, as Esri exteriors wind clockwise.
+    """
+    if not geometry:
+        return None, []
+    if "rings" in geometry:
+        return 3, geometry["rings"]
+    if "paths" in geometry:
+        return 2, geometry["paths"]
+    if "points" in geometry:
+        return 1, [geometry["points"]]
+    if "x" in geometry:
+        return 0, [[[geometry["x"], geometry["y"]]]]
+    kind, coordinates = geometry.get("type"), geometry.get("coordinates")
+    if kind == "Point":
+        return 0, [[coordinates]]
+    if kind == "MultiPoint":
+        return 1, [coordinates]
+    if kind == "LineString":
+        return 2, [coordinates]
+    if kind == "MultiLineString":
+        return 2, coordinates
+    if kind == "Polygon":
+        return 3, [ring[::-1] for ring in coordinates]
+    if kind == "MultiPolygon":
+        return 3, [ring[::-1] for polygon in coordinates for ring in polygon]
+    return None, []
+
+
+def _pbf_value(message, value):
+    if isinstance(value, bool):
+        message.bool_value = value
+    elif isinstance(value, int):
+        message.sint64_value = value
+    elif isinstance(value, float):
+        message.double_value = value
+    elif value is not None:
+        message.string_value = str(value)
+
+
+def encode_pbf(features, exceeded=False, object_id_field="OBJECTID", scale=PBF_SCALE):
+    """
+    An f=pbf response body for GeoJSON or Esri JSON features of one geometry
+    type, quantized to scale degrees from the upper left corner of their
+    extent.
+    """
+    import numpy as np
+    import pbfDecoder
+
+    message = pbfDecoder.message_class()()
+    result = message.queryResult.featureResult
+    result.objectIdFieldName = object_id_field
+    result.exceededTransferLimit = exceeded
+    result.spatialReference.wkid = 4326
+
+    names = {}
+    geometries = []
+    for feature in features:
+        for name, value in feature_values(feature).items():
+            if name not in names or names[name] is None:
+                names[name] = None if value is None else type(value)
+        geometries.append(_esri_parts(feature.get("geometry")))
+    field_types = {bool: 1, int: 1, float: 3, str: 4}
+    for name, kind in names.items():
+        result.fields.add(name=name, fieldType=6 if name == object_id_field else field_types.get(kind, 4))
+    kinds = {kind for kind, _ in geometries if kind is not None}
+    if len(kinds) > 1:
+        raise ValueError("A pbf response holds one geometry type")
+    result.geometryType = kinds.pop() if kinds else 127
+
+    vertices = [np.asarray(part, dtype=float)[:, :2] for _, parts in geometries for part in parts if len(part)]
+    everything = np.concatenate(vertices) if vertices else np.zeros((1, 2))
+    left, top = float(everything[:, 0].min()), float(everything[:, 1].max())
+    result.transform.quantizeOriginPostion = 0
+    result.transform.scale.xScale = result.transform.scale.yScale = scale
+    result.transform.translate.xTranslate = left
+    result.transform.translate.yTranslate = top
+
+    for feature, (_, parts) in zip(features, geometries):
+        encoded = result.features.add()
+        values = feature_values(feature)
+        for name in names:
+            _pbf_value(encoded.attributes.add(), values.get(name))
+        parts = [np.asarray(part, dtype=float)[:, :2] for part in parts if len(part)]
+        if not parts:
+            continue
+        points = np.concatenate(parts)
+        quantized = np.column_stack([np.round((points[:, 0] - left) / scale),
+                                     np.round((top - points[:, 1]) / scale)]).astype(np.int64)
+        deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        encoded.geometry.lengths.extend(len(part) for part in parts)
+        encoded.geometry.coords.extend(deltas.ravel().tolist())
+    return message.SerializeToString()
+
+
+class StubFeatureServer:
+    """
+    Serve layers over HTTP on localhost in a background thread.
+
+    layers: {layer_id: [geojson features]}
+    latency: {layer_id: seconds} delay applied before each response
+    pbf: answer f=pbf queries (else with an error, like an older server)
+    """
+
+    def __init__(self, layers, latency=None, edit_field=None, max_record_count=2000,
+                 host="127.0.0.1", port=0, pbf=True):
+        self.layers = layers
+        self.pbf = pbf
+        self.latency = latency or {}
+        self.edit_field = edit_field
+        self.max_record_count = max_record_count
+        self.requests_served = 0
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this the
+            # body waits on the client's delayed ACK of the headers
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                self.serve(parsed.path, parse_qs(parsed.query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode()
+                self.serve(urlparse(self.path).path, parse_qs(body))
+
+            def serve(self, path, query):
+                parts = [p for p in path.split("/") if p]
+                is_query = bool(parts) and parts[-1] == "query"
+                try:
+                    layer_id = int(parts[-2] if is_query else parts[-1])
+                except (IndexError, ValueError):
+                    self.send_error(404)
+                    return
+                if layer_id not in stub.layers:
+                    self.send_error(404)
+                    return
+
+                time.sleep(stub.latency.get(layer_id, 0))
+                query = {key: values[0] for key, values in query.items()}
+                with stub._lock:
+                    result = stub.respond(layer_id, query) if is_query else stub.describe(layer_id)
+                pbf = isinstance(result, bytes)
+                body = result if pbf else json.dumps(result).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf" if pbf else "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub.requests_served += 1
+                    stub.bytes_served += len(body)
+
+        return Handler
+
+    def describe(self, layer_id):
+        info = {"id": layer_id, "objectIdField": "OBJECTID"}
+        if self.edit_field:
+            info["editFieldsInfo"] = {"editDateField": self.edit_field}
+        return info
+
+    def respond(self, layer_id, query):
+        features = self.layers[layer_id]
+
+        edited = EDIT_FILTER.search(query.get("where", ""))
+        if edited:
+            field = edited.group(1)
+            text = edited.group(2)
+            pattern = "%Y-%m-%d %H:%M:%S.%f" if "." in text else "%Y-%m-%d %H:%M:%S"
+            cutoff = datetime.strptime(text, pattern).replace(tzinfo=timezone.utc)
+            cutoff_ms = cutoff.timestamp() * 1000
+            features = [f for f in features if (feature_values(f).get(field) or 0) > cutoff_ms]
+
+        if query.get("geometryType") == "esriGeometryEnvelope":
+            xmin, ymin, xmax, ymax = (float(v) for v in query["geometry"].split(","))
+            features = [f for f in features if in_envelope(f, xmin, ymin, xmax, ymax)]
+
+        if query.get("objectIds"):
+            wanted = {int(oid) for oid in query["objectIds"].split(",")}
+            features = [f for f in features if feature_id(f) in wanted]
+
+        if query.get("returnIdsOnly") == "true":
+            return {"objectIdFieldName": "OBJECTID", "objectIds": [feature_id(f) for f in features]}
+        if query.get("returnCountOnly") == "true":
+            return {"count": len(features)}
+
+        offset = int(query.get("resultOffset", 0))
+        limit = min(int(query.get("resultRecordCount", self.max_record_count)), self.max_record_count)
+        exceeded = len(features) > offset + limit
+        features = features[offset:offset + limit]
+
+        fields = query.get("outFields", "*")
+        fields = None if "*" in fields.split(",") else set(fields.split(","))
+        max_offset = float(query["maxAllowableOffset"]) if query.get("maxAllowableOffset") else None
+        precision = int(query["geometryPrecision"]) if query.get("geometryPrecision") else None
+        if fields is not None or max_offset or precision is not None:
+            features = [generalize(f, max_offset, precision, fields) for f in features]
+
+        if query.get("f") == "pbf":
+            if not self.pbf:
+                return {"error": {"code": 400, "message": "Invalid or missing input parameters.",
+                                  "details": ["Unable to perform query operation for format: pbf"]}}
+            return encode_pbf(features, exceeded)
+        if query.get("f", "json") in ("geojson", "pgeojson"):
+            return {"type": "FeatureCollection", "features": features,
+                    "properties": {"exceededTransferLimit": exceeded}}
+        return {"objectIdFieldName": "OBJECTID", "features": features, "exceededTransferLimit": exceeded}
+
+    def upsert(self, layer_id, feature):
+        """
+        Insert or replace a feature, stamping the edit field with the current time.
+        """
+        with self._lock:
+            if self.edit_field:
+                feature_values(feature)[self.edit_field] = int(time.time() * 1000)
+            features = self.layers[layer_id]
+            oid = feature_id(feature)
+            self.layers[layer_id] = [f for f in features if feature_id(f) != oid] + [feature]
+
+    def delete(self, layer_id, oid):
+        with self._lock:
+            self.layers[layer_id] = [f for f in self.layers[layer_id] if feature_id(f) != oid]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
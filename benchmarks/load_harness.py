@@ -0,0 +1,360 @@
+# load_harness.py
+#
+# How many concurrent farmers one Streamlit server carries. The harness starts
+# the app with `streamlit run`, with its FeatureServer and OpenWeatherMap URLs
+# pointed at the stubs of the benchmark suite. Headless websocket clients then
+# act as browser sessions and walk the Dashboard and Maps pages, using the
+# same BackMsg/ForwardMsg protocol as the frontend.
+#
+# A warm-up session first takes the cold start (first snapshots, first
+# renders). Then, at each concurrency level, every session does --rounds
+# rounds of:
+#
+#   Dashboard -> Dashboard with a new city -> Event Map -> Drought Map -> Soil Moisture Map
+#
+# with random think time between steps. Per level it reports:
+#
+# - per-page latency percentiles, from sending the rerun to script_finished
+# - bytes sent to the browser
+# - the server process's CPU time and RSS growth per session (from /proc)
+# - reruns per second
+#
+# Latency has degraded at the first level whose overall p95 exceeds
+# DEGRADE_FACTOR times the p95 of the first level (normally a single
+# session), or --slo seconds.
+#
+#   python -m benchmarks.load_harness [--levels 1 2 4 8 16] [--rounds 3] [--think 0.5] [--scale 1] [-o load.json]
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.sync.client import connect
+
+from benchmarks.suite import DROUGHT_LAYER, Fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEVELS = (1, 2, 4, 8, 16)
+ROUNDS = 3
+# Mean pause between a session's steps (seconds)
+THINK_TIME = 0.5
+# Latency has degraded once overall p95 reaches this multiple of the first level's
+DEGRADE_FACTOR = 2.0
+# How long to wait for the server to come up, and for one rerun (seconds);
+# the first rerun can wait on the ingest service's first snapshots
+STARTUP_TIMEOUT = 60
+RERUN_TIMEOUT = 120
+CITIES = ["Chicago", "Denver", "Kansas City", "Omaha", "Des Moines", "Fresno", "Memphis", "Boise", "Wichita", "Lubbock"]
+PERCENTILES = (50, 95, 99)
+# Widget labels, as in main.py and views/dashboard.py
+NAVIGATION = "Go to"
+MAP_SELECT = "Select Map"
+CITY = "City"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class AppServer:
+    """
+    `streamlit run main.py` in a subprocess, backed by the stub services.
+    """
+
+    def __init__(self, scale=1):
+        self.fixtures = Fixtures(scale)
+        self.port = free_port()
+        self.process = None
+
+    @property
+    def stream_url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def __enter__(self):
+        fixtures = self.fixtures.__enter__()
+        env = dict(
+            os.environ,
+            FARMVIS_WARNINGS_URL=fixtures.warnings_stub.url,
+            FARMVIS_DROUGHT_URL=f"{fixtures.drought_stub.url}{DROUGHT_LAYER}/query",
+            OPENWEATHER_URL=fixtures.weather_stub.url,
+            OPENWEATHERMAP_API_KEY="replay",
+            # A private cache, so persisted snapshots of the real services aren't served
+            FARMVIS_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "load.sqlite"),
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "main.py"),
+             "--server.headless", "true", "--server.port", str(self.port),
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                if requests.get(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1).ok:
+                    return self
+            except requests.RequestException:
+                pass
+            if self.process.poll() is not None:
+                break
+            time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError("the Streamlit server didn't start")
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+        self.fixtures.__exit__(*exc)
+
+    def cpu_seconds(self):
+        """
+        User plus system CPU time of the server process so far, or None
+        without /proc.
+        """
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def rss_bytes(self):
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return None
+
+
+class Session:
+    """
+    One simulated browser tab: a websocket to the server, the widgets of the
+    last run and the latencies of its reruns.
+    """
+
+    def __init__(self, server, seed, think=THINK_TIME):
+        self.server = server
+        self.rng = random.Random(seed)
+        self.think = think
+        self.websocket = None
+        # {label: widget id} of the widgets in the last run, and the values we set
+        self.widgets = {}
+        self.values = {}
+        self.latencies = []
+        self.received = []
+        self.errors = []
+
+    def __enter__(self):
+        self.websocket = connect(self.server.stream_url, subprotocols=["streamlit"], max_size=None,
+                                 open_timeout=STARTUP_TIMEOUT).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.websocket.close()
+
+    def rerun(self, page, **changes):
+        """
+        Set widgets (by label) and rerun, as the browser does after an
+        interaction; records how long the run took.
+        """
+        for label in changes:
+            if label not in self.widgets:
+                self.errors.append(f"{page}: no {label!r} widget on the page")
+        self.values.update(changes)
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        for label, value in self.values.items():
+            if label in self.widgets:
+                widget = message.rerun_script.widget_states.widgets.add()
+                widget.id = self.widgets[label]
+                widget.string_value = value
+
+        start = time.perf_counter()
+        self.websocket.send(message.SerializeToString())
+        widgets = {}
+        received = 0
+        while True:
+            raw = self.websocket.recv(timeout=RERUN_TIMEOUT)
+            received += len(raw)
+            forward = ForwardMsg()
+            forward.ParseFromString(raw)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type in ("radio", "text_input"):
+                    widget = getattr(element, element_type)
+                    widgets[widget.label] = widget.id
+                elif element_type == "exception":
+                    self.errors.append(f"{page}: {element.exception.type}: {element.exception.message}")
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors.append(f"{page}: compile error")
+                break
+
+        self.latencies.append((page, time.perf_counter() - start))
+        self.received.append((page, received))
+        self.widgets = widgets
+        # Widgets that left the page lose their state on the server too
+        self.values = {label: value for label, value in self.values.items() if label in widgets}
+
+    def pause(self):
+        if self.think:
+            time.sleep(self.rng.uniform(0, 2 * self.think))
+
+    def open(self):
+        self.rerun("Preferences")
+
+    def round(self):
+        steps = [
+            ("Dashboard", {NAVIGATION: "Dashboard"}),
+            ("Dashboard: new city", {CITY: self.rng.choice(CITIES)}),
+            ("Event Map", {NAVIGATION: "Maps"}),
+            ("Drought Map", {MAP_SELECT: "Drought Map"}),
+            ("Soil Moisture Map", {MAP_SELECT: "Soil Moisture Map"}),
+        ]
+        for page, changes in steps:
+            self.pause()
+            self.rerun(page, **changes)
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    result = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    result["count"] = len(values)
+    return result
+
+
+def run_level(server, sessions, rounds, think, seed=0):
+    """
+    sessions concurrent sessions doing rounds rounds each.
+    """
+    def simulate(user):
+        try:
+            user.open()
+            for _ in range(rounds):
+                user.round()
+        except Exception as e:
+            user.errors.append(f"session: {type(e).__name__}: {e}")
+
+    rss_before = server.rss_bytes()
+    cpu_before = server.cpu_seconds()
+    with contextlib.ExitStack() as stack:
+        users = [stack.enter_context(Session(server, seed * 1000 + i, think)) for i in range(sessions)]
+        start = time.perf_counter()
+        threads = [threading.Thread(target=simulate, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        # Measured while every session is still connected, so its state counts
+        cpu_after = server.cpu_seconds()
+        rss_after = server.rss_bytes()
+
+    latencies = [entry for user in users for entry in user.latencies]
+    pages = {}
+    for page, seconds in latencies:
+        pages.setdefault(page, []).append(seconds)
+    received = {}
+    for page, size in (entry for user in users for entry in user.received):
+        received.setdefault(page, []).append(size)
+    cpu = None if cpu_before is None else cpu_after - cpu_before
+    return {
+        "sessions": sessions,
+        "pages": {page: {**percentiles(values), "bytes": int(np.mean(received[page]))}
+                  for page, values in pages.items()},
+        "overall": percentiles([seconds for page, seconds in latencies]),
+        "errors": [error for user in users for error in user.errors],
+        "wall_seconds": wall,
+        "reruns_per_second": len(latencies) / wall,
+        "cpu_seconds": cpu,
+        "cpu_seconds_per_session": None if cpu is None else cpu / sessions,
+        "rss_bytes": rss_after,
+        "rss_bytes_per_session": None if rss_before is None else max(0, rss_after - rss_before) / sessions,
+    }
+
+
+def degradation_point(levels, factor=DEGRADE_FACTOR, slo=None):
+    """
+    The first concurrency level whose p95 latency degraded, or None.
+    """
+    reference = levels[0]["overall"]["p95"]
+    for level in levels:
+        p95 = level["overall"]["p95"]
+        if p95 > reference * factor or (slo is not None and p95 > slo):
+            return level["sessions"]
+    return None
+
+
+def report(level):
+    resources = ""
+    if level["cpu_seconds"] is not None:
+        resources = (f", server CPU {level['cpu_seconds_per_session']:.2f}s/session, "
+                     f"RSS {level['rss_bytes'] / 1e6:.0f}MB (+{level['rss_bytes_per_session'] / 1e6:.1f}MB/session)")
+    print(f"{level['sessions']:>3} sessions: {level['reruns_per_second']:.1f} reruns/s{resources}, "
+          f"{len(level['errors'])} errors")
+    for error in sorted(set(level["errors"]))[:5]:
+        print(f"    error: {error}")
+    for page, stats in level["pages"].items():
+        print(f"    {page:<22} " + " ".join(f"p{p}={stats[f'p{p}'] * 1000:7.0f}ms" for p in PERCENTILES)
+              + f" {stats['bytes'] / 1e3:8.1f}kB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the Streamlit app.")
+    parser.add_argument("--levels", type=int, nargs="+", default=list(LEVELS), help="concurrent sessions to try")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="page rounds per session")
+    parser.add_argument("--think", type=float, default=THINK_TIME, help="mean think time between steps (seconds)")
+    parser.add_argument("--scale", type=int, default=1, help="multiple of the recorded feature counts")
+    parser.add_argument("--slo", type=float, help="p95 latency (seconds) that also counts as degraded")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    with AppServer(args.scale) as server:
+        start = time.perf_counter()
+        with Session(server, seed=-1, think=0) as warmup:
+            warmup.open()
+            warmup.round()
+        cold = time.perf_counter() - start
+        print(f"cold start: {cold:.1f}s (" + ", ".join(f"{page} {seconds:.2f}s" for page, seconds in warmup.latencies)
+              + ")")
+        for error in warmup.errors:
+            print(f"    error: {error}")
+
+        levels = []
+        for sessions in args.levels:
+            level = run_level(server, sessions, args.rounds, args.think, seed=sessions)
+            levels.append(level)
+            report(level)
+
+    degraded = degradation_point(levels, slo=args.slo)
+    if degraded is None:
+        print(f"p95 latency held up to {levels[-1]['sessions']} concurrent sessions")
+    else:
+        print(f"p95 latency degrades at {degraded} concurrent sessions (limit: {DEGRADE_FACTOR}x the "
+              f"{levels[0]['sessions']}-session p95" + (f" or {args.slo}s" if args.slo is not None else "") + ")")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cold_start": {"seconds": cold, "steps": warmup.latencies, "errors": warmup.errors},
+                       "levels": levels, "degrades_at": degraded}, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
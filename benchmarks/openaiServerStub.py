@@ -0,0 +1,126 @@
+# openaiServerStub.py
+#
+# Minimal local stand-in for the OpenAI chat completions API, used by the
+# benchmarks. POST /v1/chat/completions streams a fixed number of tokens as
+# server-sent events, after a configurable time to first token and with a
+# fixed delay between tokens. Non-streaming requests get the whole answer at
+# once. Point the client at it with base_url=f"{stub.url}/v1".
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubChatServer:
+    """
+    Serve chat completions over HTTP on localhost in a background thread.
+    """
+
+    def __init__(self, tokens=120, ttft=0.3, token_delay=0.01, host="127.0.0.1", port=0):
+        self.tokens = tokens
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.requests_served = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                with stub._lock:
+                    stub.requests_served += 1
+
+                model = request.get("model", "stub")
+                words = [f"word{i} " for i in range(stub.tokens)]
+                time.sleep(stub.ttft)
+                if not request.get("stream"):
+                    time.sleep(stub.token_delay * stub.tokens)
+                    self.send_json(completion(model, "".join(words), stub.tokens))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, word in enumerate(words):
+                    if i:
+                        time.sleep(stub.token_delay)
+                    self.send_event(chunk(model, {"content": word}))
+                self.send_event(chunk(model, {}, finish_reason="stop"))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self.send_event({**chunk(model, {}), "choices": [], "usage": usage(stub.tokens)})
+                self.send_chunk(b"data: [DONE]\n\n")
+                self.send_chunk(b"")
+
+            def send_json(self, body):
+                body = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_event(self, body):
+                self.send_chunk(f"data: {json.dumps(body)}\n\n".encode())
+
+            def send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def usage(tokens):
+    return {"prompt_tokens": 200, "completion_tokens": tokens, "total_tokens": 200 + tokens}
+
+
+def chunk(model, delta, finish_reason=None):
+    return {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+def completion(model, text, tokens):
+    return {"id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(tokens)}
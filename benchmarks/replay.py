@@ -0,0 +1,232 @@
+# replay.py
+#
+# Recorded FeatureServer and OpenWeatherMap responses for the benchmark suite,
+# and synthetic scaled-up copies of them. Recordings live in
+# benchmarks/recordings/ as plain JSON:
+#
+#   warnings_<layer>.json   features of one NWS warnings layer (GeoJSON)
+#   drought.json            features of the USDM drought layer (Esri JSON)
+#   weather.json            {"weather": {...}, "air_pollution": {...}}
+#
+# plus the same layers' raw f=pbf answers (warnings_<layer>.pbf, drought.pbf),
+# recorded alongside the JSON when the service supports pbf.
+#
+# Refresh them from the live services (the weather responses need an
+# OpenWeatherMap API key, as for the dashboard):
+#
+#   python -m benchmarks.replay record
+#
+# Anything not recorded is replaced by synthetic data of a similar shape, so
+# the suite also runs offline.
+
+import copy
+import json
+import os
+import random
+import sys
+
+import requests
+
+from benchmarks.featureServerStub import make_point_features, make_polygon_features
+from benchmarks.weatherServerStub import air_pollution_response, weather_response
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+# Synthetic stand-ins: warnings per layer, drought polygons and their vertices
+SYNTHETIC_WARNINGS = 40
+SYNTHETIC_DROUGHT = 30
+SYNTHETIC_VERTICES = 200
+# Scaled copies are moved by up to this many degrees, so they don't all overlap
+SCALE_JITTER_DEGREES = 2.0
+RECORD_TIMEOUT = 60
+
+
+def recording_path(name, directory=RECORDINGS_DIR):
+    return os.path.join(directory, f"{name}.json")
+
+
+def read_recording(name, directory=RECORDINGS_DIR):
+    path = recording_path(name, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_recording(name, data, directory=RECORDINGS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    with open(recording_path(name, directory), "w") as f:
+        json.dump(data, f)
+
+
+def pbf_recording_path(name, directory=RECORDINGS_DIR):
+    return os.path.join(directory, f"{name}.pbf")
+
+
+def read_pbf_recording(name, directory=RECORDINGS_DIR):
+    path = pbf_recording_path(name, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def record_pbf(session, url, params, name, directory=RECORDINGS_DIR):
+    """
+    Save the f=pbf answer to the same query, if the service gives one.
+    """
+    response = session.get(url, params=dict(params, f="pbf"), timeout=RECORD_TIMEOUT)
+    if not response.ok or "json" in response.headers.get("Content-Type", ""):
+        print(f"{name}: no pbf answer")
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(pbf_recording_path(name, directory), "wb") as f:
+        f.write(response.content)
+
+
+def synthetic_warning_layer(layer, event):
+    """
+    Point warnings on even layers, small GeoJSON polygons on odd ones (most
+    NWS warnings are polygons, which the parser reduces to centroids). Like
+    a real FeatureServer layer, each layer has one geometry type.
+    """
+    points = make_point_features(SYNTHETIC_WARNINGS, event=event, lat=37.0, lon=-95.0, spread=12.0, seed=layer)
+    if layer % 2 == 0:
+        return points
+    polygons = []
+    for i, feature in enumerate(make_polygon_features(SYNTHETIC_WARNINGS, vertices=12, seed=layer)):
+        polygons.append({
+            "type": "Feature",
+            "id": i + 1,
+            "geometry": {"type": "Polygon", "coordinates": feature["geometry"]["rings"]},
+            "properties": {"OBJECTID": i + 1, "Event": event},
+        })
+    return polygons
+
+
+def load_warning_layers(layers, events, directory=RECORDINGS_DIR):
+    """
+    {layer: features} for each warnings layer, recorded or synthetic.
+    """
+    result = {}
+    for i, layer in enumerate(layers):
+        features = read_recording(f"warnings_{layer}", directory)
+        result[layer] = features if features is not None else synthetic_warning_layer(layer, events[i % len(events)])
+    return result
+
+
+def load_drought_features(directory=RECORDINGS_DIR):
+    features = read_recording("drought", directory)
+    if features is None:
+        features = make_polygon_features(SYNTHETIC_DROUGHT, vertices=SYNTHETIC_VERTICES)
+    return features
+
+
+def load_weather(directory=RECORDINGS_DIR):
+    """
+    {"weather": response, "air_pollution": response} templates for the stub.
+    """
+    recorded = read_recording("weather", directory)
+    if recorded is None:
+        recorded = {"weather": weather_response(39.1, -94.6), "air_pollution": air_pollution_response(39.1, -94.6)}
+    return recorded
+
+
+def _shift(coordinates, dx, dy):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [coordinates[0] + dx, coordinates[1] + dy, *coordinates[2:]]
+    return [_shift(part, dx, dy) for part in coordinates]
+
+
+def shift_geometry(geometry, dx, dy):
+    """
+    A GeoJSON or Esri JSON geometry moved by (dx, dy) degrees, in place.
+    """
+    if not geometry:
+        return geometry
+    if "coordinates" in geometry:
+        geometry["coordinates"] = _shift(geometry["coordinates"], dx, dy)
+    if "rings" in geometry:
+        geometry["rings"] = _shift(geometry["rings"], dx, dy)
+    if "paths" in geometry:
+        geometry["paths"] = _shift(geometry["paths"], dx, dy)
+    if "x" in geometry and "y" in geometry:
+        geometry["x"] += dx
+        geometry["y"] += dy
+    return geometry
+
+
+def scale_features(features, factor, seed=0):
+    """
+    features followed by factor - 1 shifted copies with new OBJECTIDs, for
+    benchmarking at factor times the recorded feature count.
+    """
+    if factor <= 1:
+        return features
+    rng = random.Random(seed)
+    values = [f.get("attributes") or f.get("properties") or {} for f in features]
+    stride = max([v.get("OBJECTID") or 0 for v in values] + [len(features)]) + 1
+    scaled = list(features)
+    for k in range(1, factor):
+        for feature in features:
+            dx = rng.uniform(-SCALE_JITTER_DEGREES, SCALE_JITTER_DEGREES)
+            dy = rng.uniform(-SCALE_JITTER_DEGREES, SCALE_JITTER_DEGREES)
+            copied = copy.deepcopy(feature)
+            shift_geometry(copied.get("geometry"), dx, dy)
+            attributes = copied.get("attributes") or copied.get("properties")
+            if attributes is not None and attributes.get("OBJECTID") is not None:
+                attributes["OBJECTID"] += k * stride
+            if copied.get("id") is not None:
+                copied["id"] += k * stride
+            scaled.append(copied)
+    return scaled
+
+
+def record(directory=RECORDINGS_DIR):
+    """
+    Save the live responses the suite replays.
+    """
+    import droughtData
+    import warningsData
+    from views import dashboard
+
+    session = requests.Session()
+    for layer in warningsData.LAYERS:
+        url = f"{warningsData.BASE_URL}{layer}/query"
+        params = {"where": warningsData.where_interested(), "outFields": "*", "returnGeometry": "true",
+                  "f": "pgeojson"}
+        response = session.get(url, timeout=RECORD_TIMEOUT, params=params)
+        response.raise_for_status()
+        features = response.json().get("features", [])
+        write_recording(f"warnings_{layer}", features, directory)
+        record_pbf(session, url, params, f"warnings_{layer}", directory)
+        print(f"warnings layer {layer}: {len(features)} features")
+
+    response = session.get(droughtData.url, params=droughtData.params, timeout=RECORD_TIMEOUT)
+    response.raise_for_status()
+    features = response.json().get("features", [])
+    write_recording("drought", features, directory)
+    record_pbf(session, droughtData.url, droughtData.params, "drought", directory)
+    print(f"drought: {len(features)} features")
+
+    api_key = dashboard.get_api_key()
+    if api_key:
+        params = {"lat": 39.1, "lon": -94.6, "appid": api_key}
+        weather = dashboard.get_json(f"{dashboard.OPENWEATHER_URL}/weather", {**params, "units": "metric"})
+        aqi = dashboard.get_json(f"{dashboard.OPENWEATHER_URL}/air_pollution", params)
+        write_recording("weather", {"weather": weather, "air_pollution": aqi}, directory)
+        print("weather: recorded")
+    else:
+        print("weather: no OpenWeatherMap API key, keeping the synthetic responses")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["record"]:
+        print("usage: python -m benchmarks.replay record [directory]")
+        return 2
+    record(argv[1] if len(argv) > 1 else RECORDINGS_DIR)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+# suite.py
+#
+# Benchmark suite for the data pipelines, run against local stubs that replay
+# the recorded FeatureServer and OpenWeatherMap responses (see replay.py) at
+# 1x, 10x and 100x the recorded feature counts. For every function and scale
+# it reports wall time (median of --repeat runs), peak Python memory (from a
+# separate run under tracemalloc), bytes downloaded, features produced and
+# the time spent in each timing stage.
+#
+# Results are written as JSON and compared against a stored baseline; any
+# function that got slower, bigger or heavier on the wire beyond the
+# tolerances is reported, and the exit status is 1.
+#
+#   python -m benchmarks.suite [--scales 1 10 100] [--repeat 3] [-o results.json]
+#   python -m benchmarks.suite --save-baseline      # store this run as the baseline
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import droughtData
+import tileServer
+import timing
+import warningsData
+from benchmarks import replay
+from benchmarks.featureServerStub import StubFeatureServer
+from benchmarks.weatherServerStub import StubWeatherServer
+from views import dashboard, droughtMap
+
+SCALES = (1, 10, 100)
+REPEAT = 3
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results.json")
+# Allowed growth over the baseline before a result counts as a regression
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.20
+PAYLOAD_TOLERANCE = 0.05
+# Differences below these are noise, whatever the ratio
+MIN_TIME_DELTA = 0.005
+MIN_MEMORY_DELTA = 1 << 20
+# Drought layer id in the stub, as in droughtData.url
+DROUGHT_LAYER = 3
+# Weather lookups per scale step, each in its own grid cell
+WEATHER_CELLS = 10
+
+
+class Fixtures:
+    """
+    Stubs serving the recorded (or synthetic) responses scaled by one factor,
+    with the modules under test pointed at them.
+    """
+
+    def __init__(self, scale, recordings=replay.RECORDINGS_DIR):
+        self.scale = scale
+        base = replay.load_warning_layers(warningsData.LAYERS, warningsData.INTERESTED_EVENTS, recordings)
+        layers = {layer: replay.scale_features(features, scale, seed=layer) for layer, features in base.items()}
+        drought = replay.scale_features(replay.load_drought_features(recordings), scale)
+        max_records = max(len(features) for features in [drought, *layers.values()])
+        self.warnings_stub = StubFeatureServer(layers, max_record_count=max(2000, max_records))
+        self.drought_stub = StubFeatureServer({DROUGHT_LAYER: drought}, max_record_count=2000)
+        self.weather_stub = StubWeatherServer(recorded=replay.load_weather(recordings))
+
+    def __enter__(self):
+        for stub in (self.warnings_stub, self.drought_stub, self.weather_stub):
+            stub.start()
+        warningsData.BASE_URL = self.warnings_stub.url
+        # Every run downloads and parses: no on-disk cache, no previous sync
+        warningsData.FEATURE_CACHE = False
+        warningsData._session = None
+        droughtData.url = f"{self.drought_stub.url}{DROUGHT_LAYER}/query"
+        tileServer.VECTOR_TILES = False
+        dashboard.OPENWEATHER_URL = self.weather_stub.url
+        dashboard.get_api_key = lambda: "replay"
+        return self
+
+    def __exit__(self, *exc):
+        for stub in (self.warnings_stub, self.drought_stub, self.weather_stub):
+            stub.stop()
+
+
+def downloaded(spans):
+    return sum(span.bytes for span in spans if span.stage == "http_fetch")
+
+
+class Pipeline:
+    """
+    The benchmarked functions at one scale. Each returns (features, payload
+    bytes); later steps work on the output of earlier ones, as in the app.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.warnings = None
+        self.entries = None
+        self.layer = None
+        self.runs = 0
+
+    def process_layers(self, spans):
+        warningsData._layer_syncs.clear()
+        self.warnings, properties, summary = warningsData.process_layers(
+            warningsData.LAYERS, warningsData.where_interested(), zoom=warningsData.MAP_ZOOM)
+        return len(self.warnings), downloaded(spans)
+
+    def apply_dbscan(self, spans):
+        # A new scope each run, so the clusterer starts from nothing
+        self.runs += 1
+        keys = list(zip(self.warnings["layer_id"], self.warnings["feature_id"]))
+        warningsData.apply_dbscan(self.warnings[["latitude", "longitude"]].to_numpy(), keys,
+                                  scope=f"suite-{self.scale}-{self.runs}")
+        return len(self.warnings), 0
+
+    def load_drought_data(self, spans):
+        droughtData._sync = None
+        droughtData._processed = {}
+        self.entries = droughtData.load_drought_data()
+        return len(self.entries), downloaded(spans)
+
+    def build_drought_layer(self, spans):
+        self.layer = droughtData.build_drought_layer(self.entries, self.runs)
+        return len(self.entries), 0
+
+    def create_choropleth_map(self, spans):
+        html = droughtMap.create_choropleth_map(self.layer).get_root().render()
+        return len(self.layer.geojson["features"]), len(html)
+
+    def fetch_weather(self, spans):
+        dashboard.fetch_weather_cell.clear()
+        cells = WEATHER_CELLS * self.scale
+        for i in range(cells):
+            dashboard.fetch_weather_data(30 + (i // 100) * 0.5, -120 + (i % 100) * 0.5)
+        return cells, downloaded(spans)
+
+    def steps(self):
+        return [
+            ("warningsData.process_layers", self.process_layers),
+            ("warningsData.apply_dbscan", self.apply_dbscan),
+            ("droughtData.load_drought_data", self.load_drought_data),
+            ("droughtData.build_drought_layer", self.build_drought_layer),
+            ("droughtMap.create_choropleth_map", self.create_choropleth_map),
+            ("dashboard.fetch_weather_data", self.fetch_weather),
+        ]
+
+
+def measure(name, fn, repeat):
+    """
+    One result: median and best wall time of repeat runs, then one more run
+    under tracemalloc for the peak memory.
+    """
+    seconds = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()), timing.collect(name) as spans:
+            start = time.perf_counter()
+            features, payload = fn(spans)
+            seconds.append(time.perf_counter() - start)
+        stages = {}
+        for span in spans:
+            key = f"{span.stage}:{span.source}" if span.source else span.stage
+            stages[key] = stages.get(key, 0.0) + span.seconds
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), timing.collect(name) as spans:
+            fn(spans)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": statistics.median(seconds),
+        "seconds_min": min(seconds),
+        "peak_bytes": peak,
+        "payload_bytes": payload,
+        "features": features,
+        "stages": {key: round(value, 6) for key, value in sorted(stages.items())},
+    }
+
+
+def run_suite(scales=SCALES, repeat=REPEAT, recordings=replay.RECORDINGS_DIR):
+    results = []
+    for scale in scales:
+        with Fixtures(scale, recordings):
+            pipeline = Pipeline(scale)
+            for name, fn in pipeline.steps():
+                result = {"name": name, "scale": scale, **measure(name, fn, repeat)}
+                print(f"{name:<34} {scale:>4}x {result['seconds'] * 1000:9.1f}ms "
+                      f"{result['peak_bytes'] / 1e6:8.1f}MB peak {result['payload_bytes'] / 1e6:8.2f}MB payload "
+                      f"{result['features']:>8} features")
+                results.append(result)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def exceeds(value, base, tolerance, min_delta):
+    return value > base * (1 + tolerance) and value - base > min_delta
+
+
+def compare(report, baseline):
+    """
+    Regressions against the baseline, as printable lines.
+    """
+    previous = {(r["name"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        base = previous.get((result["name"], result["scale"]))
+        if base is None:
+            continue
+        label = f"{result['name']} @{result['scale']}x"
+        if exceeds(result["seconds"], base["seconds"], TIME_TOLERANCE, MIN_TIME_DELTA):
+            regressions.append(f"{label}: {base['seconds'] * 1000:.1f}ms -> {result['seconds'] * 1000:.1f}ms")
+        if exceeds(result["peak_bytes"], base["peak_bytes"], MEMORY_TOLERANCE, MIN_MEMORY_DELTA):
+            regressions.append(f"{label}: peak {base['peak_bytes'] / 1e6:.1f}MB -> {result['peak_bytes'] / 1e6:.1f}MB")
+        if exceeds(result["payload_bytes"], base["payload_bytes"], PAYLOAD_TOLERANCE, 0):
+            regressions.append(f"{label}: payload {base['payload_bytes'] / 1e6:.2f}MB -> "
+                               f"{result['payload_bytes'] / 1e6:.2f}MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data pipelines against replayed responses.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES),
+                        help="multiples of the recorded feature counts (default: 1 10 100)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per function and scale")
+    parser.add_argument("--recordings", default=replay.RECORDINGS_DIR, help="directory of recorded responses")
+    parser.add_argument("-o", "--output", default=RESULTS_PATH, help="where to write the results JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.scales, args.repeat, args.recordings)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved baseline {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against (run with --save-baseline to store one)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline)
+    if regressions:
+        print(f"{len(regressions)} regressions against {args.baseline} (from {baseline.get('created')}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"no regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# weatherServerStub.py
+#
+# Minimal local stand-in for the OpenWeatherMap current weather and air
+# pollution APIs, used by the benchmarks. Serves /weather and /air_pollution
+# with a fixed latency, returning responses shaped like the real ones with
+# values derived from the requested coordinates, or replaying recorded
+# responses (with the requested coordinates filled in).
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def weather_response(lat, lon):
+    return {
+        "coord": {"lat": lat, "lon": lon},
+        "main": {"temp": round(15 + (lat % 10), 2), "humidity": int(40 + abs(lon) % 50)},
+        "wind": {"speed": round(abs(lat - lon) % 12, 2)},
+    }
+
+
+def air_pollution_response(lat, lon):
+    return {"coord": {"lat": lat, "lon": lon}, "list": [{"main": {"aqi": int(abs(lat + lon)) % 5 + 1}}]}
+
+
+class StubWeatherServer:
+    """
+    Serve the weather endpoints over HTTP on localhost in a background thread.
+    """
+
+    def __init__(self, latency=0.0, recorded=None, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.recorded = recorded or {}
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+        endpoints = {"weather": weather_response, "air_pollution": air_pollution_response}
+
+        def replay(name):
+            def respond(lat, lon):
+                return {**stub.recorded[name], "coord": {"lat": lat, "lon": lon}}
+            return respond
+        endpoints.update({name: replay(name) for name in stub.recorded})
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this the
+            # body waits on the client's delayed ACK of the headers
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                endpoint = endpoints.get(parsed.path.strip("/").rsplit("/", 1)[-1])
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                if endpoint is None or "lat" not in query or "lon" not in query:
+                    self.send_error(404)
+                    return
+
+                time.sleep(stub.latency)
+                body = json.dumps(endpoint(float(query["lat"]), float(query["lon"]))).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub.requests_served += 1
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
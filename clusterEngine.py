@@ -0,0 +1,199 @@
+# clusterEngine.py
+
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class IncrementalDBSCAN:
+    """
+    DBSCAN over (lat, lon) points with a haversine metric and eps in kilometres.
+
+    The clusterer keeps its neighbourhood graph between calls to update(), so a
+    refresh only runs radius queries for warnings that were added, and only
+    relabels the clusters that touch added or expired warnings. Points are
+    identified by a hashable key (e.g. (layer_id, OBJECTID)).
+
+    Cluster ids of untouched clusters stay the same across updates, so ids are
+    stable but not contiguous. Noise is -1, as in sklearn.
+    """
+
+    def __init__(self, eps_km=10.0, min_samples=3):
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self._slots = {}          # key -> slot
+        self._keys = []           # slot -> key
+        self._coords = np.empty((0, 2))   # slot -> (lat, lon) in radians
+        self._neighbors = []      # slot -> set of neighbouring slots
+        self._labels = []         # slot -> cluster id
+        self._members = {}        # cluster id -> set of slots
+        self._free = []
+        self._next_label = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _is_core(self, slot):
+        # sklearn counts the point itself towards min_samples
+        return len(self._neighbors[slot]) + 1 >= self.min_samples
+
+    def _set_label(self, slot, label):
+        old = self._labels[slot]
+        if old >= 0:
+            self._members[old].discard(slot)
+            if not self._members[old]:
+                del self._members[old]
+        if label >= 0:
+            self._members.setdefault(label, set()).add(slot)
+        self._labels[slot] = label
+
+    def _remove(self, key):
+        slot = self._slots.pop(key)
+        affected = self._neighbors[slot]
+        for other in affected:
+            self._neighbors[other].discard(slot)
+        touched = {self._labels[slot]} if self._labels[slot] >= 0 else set()
+        self._set_label(slot, -1)
+        self._neighbors[slot] = set()
+        self._keys[slot] = None
+        self._free.append(slot)
+        return affected, touched
+
+    def _add(self, key, coord):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._keys)
+            self._keys.append(None)
+            self._neighbors.append(set())
+            self._labels.append(-1)
+            if slot >= len(self._coords):
+                grown = np.empty((max(16, 2 * len(self._coords)), 2))
+                grown[:len(self._coords)] = self._coords
+                self._coords = grown
+        self._slots[key] = slot
+        self._keys[slot] = key
+        self._coords[slot] = coord
+        return slot
+
+    def update(self, keys, coordinates):
+        """
+        Bring the clustering in line with the current set of points.
+
+        keys: sequence of hashable ids; coordinates: matching (lat, lon) pairs in
+        degrees. Keys missing from this call are treated as expired. Returns the
+        labels aligned with keys.
+        """
+        with self._lock:
+            keys = list(keys)
+            coords = np.radians(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+            rows = {key: row for row, key in enumerate(keys)}
+
+            known = [(row, self._slots[key]) for row, key in enumerate(keys) if key in self._slots]
+            known_rows = np.array([row for row, _ in known], dtype=int)
+            known_slots = np.array([slot for _, slot in known], dtype=int)
+            moved = np.any(self._coords[known_slots] != coords[known_rows], axis=1)
+            stale = [key for key in self._slots if key not in rows]
+            stale.extend(keys[row] for row in known_rows[moved])
+
+            affected = set()
+            touched = set()
+            for key in stale:
+                neighbors, labels = self._remove(key)
+                affected |= neighbors
+                touched |= labels
+
+            added = [self._add(key, coords[row]) for key, row in rows.items() if key not in self._slots]
+
+            if added:
+                # sklearn takes about a second to import; only pay for it when clustering
+                from sklearn.neighbors import BallTree
+
+                active = np.fromiter(self._slots.values(), dtype=int, count=len(self._slots))
+                tree = BallTree(self._coords[active], metric="haversine")
+                hits = tree.query_radius(self._coords[added], r=self.eps_km / EARTH_RADIUS_KM)
+                for slot, hit in zip(added, hits):
+                    for other in active[hit]:
+                        if other != slot:
+                            self._neighbors[slot].add(other)
+                            self._neighbors[other].add(slot)
+                    affected.add(slot)
+                    affected |= self._neighbors[slot]
+
+            self._relabel(affected, touched)
+            return self.labels(keys)
+
+    def _relabel(self, affected, touched):
+        affected = {slot for slot in affected if self._keys[slot] is not None}
+        touched |= {self._labels[slot] for slot in affected if self._labels[slot] >= 0}
+
+        pending = list(affected)
+        for label in touched:
+            pending.extend(self._members.get(label, ()))
+        for slot in pending:
+            self._set_label(slot, -1)
+        for label in touched:
+            self._members.pop(label, None)
+
+        i = 0
+        while i < len(pending):
+            start = pending[i]
+            i += 1
+            if self._labels[start] != -1 or not self._is_core(start):
+                continue
+            label = self._next_label
+            self._next_label += 1
+            self._set_label(start, label)
+            stack = [start]
+            while stack:
+                slot = stack.pop()
+                for other in self._neighbors[slot]:
+                    other_label = self._labels[other]
+                    if other_label == label:
+                        continue
+                    if other_label >= 0:
+                        if not self._is_core(other):
+                            # Border point already claimed by another cluster
+                            continue
+                        # Core point of an untouched cluster that now connects
+                        # to this one: absorb the whole cluster
+                        absorbed = self._members.pop(other_label)
+                        for member in absorbed:
+                            self._labels[member] = -1
+                        pending.extend(absorbed)
+                    self._set_label(other, label)
+                    if self._is_core(other):
+                        stack.append(other)
+
+        # Reset border points that no new cluster reached may still border a
+        # core point of an untouched cluster
+        for slot in pending:
+            if self._labels[slot] == -1 and self._keys[slot] is not None:
+                for other in self._neighbors[slot]:
+                    if self._labels[other] >= 0 and self._is_core(other):
+                        self._set_label(slot, self._labels[other])
+                        break
+
+    def labels(self, keys):
+        return np.array([self._labels[self._slots[key]] if key in self._slots else -1 for key in keys], dtype=int)
+
+    @property
+    def n_clusters(self):
+        return len(self._members)
+
+
+def full_dbscan(coordinates, eps_km=10.0, min_samples=3):
+    """
+    Non-incremental reference: sklearn DBSCAN with the same haversine metric.
+    """
+    from sklearn.cluster import DBSCAN
+    coords = np.radians(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+    db = DBSCAN(eps=eps_km / EARTH_RADIUS_KM, min_samples=min_samples,
+                metric="haversine", algorithm="ball_tree").fit(coords)
+    return db.labels_
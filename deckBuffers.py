@@ -0,0 +1,104 @@
+# deckBuffers.py
+
+import json
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+import timing
+from geometryKernel import flatten_rings
+
+
+class CompactDeck(pdk.Deck):
+    """
+    pdk.Deck that serializes without indentation.
+
+    pydeck's own to_json uses indent=2, which puts every coordinate on its own
+    line and forces json onto its pure-Python encoder. st.pydeck_chart only
+    calls to_json, so this is a drop-in replacement.
+    """
+
+    def to_json(self):
+        with timing.span("pydeck_serialize") as span:
+            payload = json.dumps(self, sort_keys=True, default=default_serialize, separators=(",", ":"))
+            span.add(bytes=len(payload))
+        return payload
+
+
+class PolygonBuffers(NamedTuple):
+    """
+    Polygons flattened into contiguous arrays.
+
+    positions: (V, 2) float64 lon/lat of every vertex, ring after ring
+    ring_offsets: (R + 1,) index into positions where each ring starts
+    feature_offsets: (F + 1,) index into ring_offsets where each feature starts
+    colors: (F, 3) uint8 fill colour per feature
+    labels: F tooltip labels
+    """
+    positions: np.ndarray
+    ring_offsets: np.ndarray
+    feature_offsets: np.ndarray
+    colors: np.ndarray
+    labels: list
+
+
+def polygon_buffers(entries, palette, color_key="dm"):
+    """
+    Build PolygonBuffers from entries with "rings", "label" and a colour index.
+
+    palette is an (N, 3) array; each feature's colour is palette[entry[color_key]],
+    looked up for all features at once. Unknown indices get grey.
+    """
+    positions, ring_offsets, feature_offsets = flatten_rings([entry["rings"] for entry in entries])
+    palette = np.asarray(palette, dtype=np.uint8)
+    codes = np.array([entry.get(color_key) if entry.get(color_key) is not None else -1 for entry in entries],
+                     dtype=np.int64)
+    known = (codes >= 0) & (codes < len(palette))
+    colors = np.full((len(entries), 3), 128, dtype=np.uint8)
+    colors[known] = palette[codes[known]]
+    return PolygonBuffers(positions, ring_offsets, feature_offsets, colors, [entry["label"] for entry in entries])
+
+
+def polygon_layer_data(buffers):
+    """
+    Per-feature records for a PolygonLayer with position_format="XY".
+
+    Each polygon is sent in deck.gl's flat form, {"positions": [x0, y0, x1, ...],
+    "holeIndices": [...]}, so there is one float list per feature rather than a
+    list object per vertex. Use get_polygon="polygon", get_fill_color="color".
+    """
+    flat = buffers.positions.ravel()
+    ring_offsets = buffers.ring_offsets
+    colors = buffers.colors.tolist()
+    data = []
+    for i in range(len(buffers.labels)):
+        first_ring, last_ring = buffers.feature_offsets[i], buffers.feature_offsets[i + 1]
+        start, end = ring_offsets[first_ring], ring_offsets[last_ring]
+        polygon = {"positions": flat[2 * start:2 * end].tolist()}
+        if last_ring - first_ring > 1:
+            # Offsets into the flat positions list where each hole starts
+            polygon["holeIndices"] = (2 * (ring_offsets[first_ring + 1:last_ring] - start)).tolist()
+        data.append({"polygon": polygon, "color": colors[i], "label": buffers.labels[i]})
+    return data
+
+
+def point_layer_data(latitudes, longitudes, codes, palette):
+    """
+    Columnar point records for a ScatterplotLayer.
+
+    Colours are looked up from palette by categorical code in one step and
+    stored as r/g/b columns, so use get_fill_color="[r, g, b]" instead of a
+    per-row colour list.
+    """
+    palette = np.asarray(palette, dtype=np.uint8)
+    colors = palette[np.asarray(codes, dtype=np.int64)]
+    return pd.DataFrame({
+        "longitude": np.asarray(longitudes, dtype=float),
+        "latitude": np.asarray(latitudes, dtype=float),
+        "r": colors[:, 0],
+        "g": colors[:, 1],
+        "b": colors[:, 2],
+    })
@@ -1,110 +1,400 @@
+import os
 import requests
 import pydeck as pdk
 import streamlit as st
 import json
+import hashlib
+import threading
+from typing import NamedTuple
+import pandas as pd
+from geometryLod import build_lod_level, pick_level
+from geometryKernel import rings_stats
+from deckBuffers import CompactDeck, polygon_buffers, polygon_layer_data
+from featureQuery import out_fields, query_band
+from featureSync import FeatureLayerSync
+from featureCache import get_cache
+import timing
+from ingestService import FIRST_LOAD_TIMEOUT, latest_snapshot, register_source
+from tileServer import MAX_ZOOM, TileSource, esri_polygon, get_tile_server
 
-url = "https://services9.arcgis.com/RHVPKKiFTONKtxq3/arcgis/rest/services/US_Drought_Intensity_v1/FeatureServer/3/query"
+url = os.getenv("FARMVIS_DROUGHT_URL", "https://services9.arcgis.com/RHVPKKiFTONKtxq3/arcgis/rest/services/US_Drought_Intensity_v1/FeatureServer/3/query")
+
+# The attributes anything reads: the parser, both renderers and risk scoring.
+# Areas, centroids and bounds are computed from the rings (add_geometry_stats)
+FIELDS = ['period', 'dm']
 
 params = {
     'where': '1=1',
-    'outFields': '*',
+    'outFields': out_fields(FIELDS),
     'returnGeometry': 'true',
-    'returnCentroid': 'true',
     'f': 'json',
-    'resultRecordCount': 1000,
     'outSR': 4326
 }
 
+drought_categories = {
+    'd0': {'color': [255, 255, 0], 'label': 'D0 (Abnormally Dry)'},
+    'd1': {'color': [255, 165, 0], 'label': 'D1 (Moderate Drought)'},
+    'd2': {'color': [255, 0, 0], 'label': 'D2 (Severe Drought)'},
+    'd3': {'color': [139, 0, 0], 'label': 'D3 (Extreme Drought)'},
+    'd4': {'color': [128, 0, 128], 'label': 'D4 (Exceptional Drought)'},
+}
+
+# Fill colours of the folium choropleth (YlOrRd), indexed by drought level
+CHOROPLETH_COLORS = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"]
+
+# Drought maps change weekly, so cached parses can live for an hour
+CACHE_TTL = 3600
+# How often the ingest service re-syncs the drought layer (seconds)
+INGEST_INTERVAL = 3600
+
+# Initial zoom of the pydeck drought map; also selects the geometry LOD level
+MAP_ZOOM = 1
+# Initial zoom of the folium drought map (views.droughtMap)
+FOLIUM_ZOOM = 4
+# Zooms at which a renderer embeds the whole layer instead of loading tiles;
+# their generalized views are built as each snapshot is loaded
+VIEW_ZOOMS = [FOLIUM_ZOOM]
+
 def write_to_file(data, file_name):
     with open(file_name, 'w') as f:
         json.dump(data, f, indent=4)
 
 def extract_centroid(rings):
-    x_coords = [point[0] for ring in rings for point in ring]
-    y_coords = [point[1] for ring in rings for point in ring]
+    lon, lat = rings_stats([rings]).centroids[0].tolist()
+    if lon != lon:
+        return {"longitude": None, "latitude": None}
     centroid = {
-        "longitude": sum(x_coords) / len(x_coords),
-        "latitude": sum(y_coords) / len(y_coords)
+        "longitude": lon,
+        "latitude": lat
     }
     return centroid
 
+def add_geometry_stats(entries):
+    """
+    Fill in the area (square degrees, holes subtracted), area-weighted
+    centroid and bounding box of every entry that doesn't have them yet, for
+    the whole batch in one vectorized pass.
+    """
+    pending = [entry for entry in entries if entry["centroid"] is None]
+    if not pending:
+        return
+    with timing.span("geometry_build", "drought") as span:
+        stats = rings_stats([entry["rings"] for entry in pending])
+        span.add(features=len(pending))
+    for entry, area, (lon, lat), bbox in zip(pending, stats.area.tolist(), stats.centroids.tolist(),
+                                             stats.bounds.tolist()):
+        entry["area"] = area
+        if lon != lon:
+            # NaN: no vertices
+            entry["centroid"] = {"longitude": None, "latitude": None}
+            entry["bbox"] = None
+        else:
+            entry["centroid"] = {"longitude": lon, "latitude": lat}
+            entry["bbox"] = bbox
+
+_sync = None
+# Parsed entries by OBJECTID, filled in as features arrive from the sync
+_processed = {}
+# Generalized DroughtLayer of the latest snapshot, by zoom band
+_views = {}
+_views_lock = threading.Lock()
+
+def get_drought_sync():
+    """
+    Local copy of the drought layer, refreshed by OBJECTID delta on each fetch.
+    """
+    global _sync
+    if _sync is None:
+        extra = {key: value for key, value in params.items()
+                 if key not in ('where', 'outFields', 'returnGeometry', 'f')}
+        _sync = FeatureLayerSync(url, where=params['where'], out_fields=params['outFields'],
+                                 fmt=params['f'], extra_params=extra, source="drought")
+    return _sync
+
+def process_feature(feature):
+    attributes = feature.get('attributes', {})
+    geometry = feature.get('geometry', {})
+    rings = geometry.get('rings', [])
+    return {
+        "OBJECTID": attributes.get("OBJECTID"),
+        "period": attributes.get("period"),
+        "dm": attributes.get("dm"),
+        # Filled in for the whole snapshot at once by add_geometry_stats
+        "centroid": None,
+        "bbox": None,
+        "area": None,
+        "rings": rings,
+        "label": drought_categories.get(f'd{attributes.get("dm")}', {}).get("label", "Unknown")
+    }
+
+class DroughtLayer(NamedTuple):
+    """
+    Everything both drought renderers need, built once per ingest snapshot
+    and shared by every session. Treat it as read-only.
+
+    entries: parsed features, as published by the ingest service
+    key: snapshot_id of entries, for caches of derived data
+    table: one row per feature with OBJECTID, period, dm, label, centroid
+        longitude/latitude, r/g/b (pydeck) and fill (choropleth hex colour)
+    geojson: FeatureCollection of the features with rings, sharing the
+        entries' coordinate lists, with OBJECTID, dm, label and fill properties
+    """
+    version: int
+    key: str
+    entries: list
+    table: pd.DataFrame
+    geojson: dict
+
 def fetch_drought_data():
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        features = data.get('features', [])
-        drought_categories = {
-            'd0': {'color': [255, 255, 0], 'label': 'D0 (Abnormally Dry)'},
-            'd1': {'color': [255, 165, 0], 'label': 'D1 (Moderate Drought)'},
-            'd2': {'color': [255, 0, 0], 'label': 'D2 (Severe Drought)'},
-            'd3': {'color': [139, 0, 0], 'label': 'D3 (Extreme Drought)'},
-            'd4': {'color': [128, 0, 128], 'label': 'D4 (Exceptional Drought)'},
-        }
-        processed_data = []
-        for feature in features:
-            attributes = feature.get('attributes', {})
-            geometry = feature.get('geometry', {})
-            rings = geometry.get('rings', [])
-            centroid = extract_centroid(rings) if rings else {"longitude": None, "latitude": None}
-            processed_data.append({
-                "OBJECTID": attributes.get("OBJECTID"),
-                "period": attributes.get("period"),
-                "dm": attributes.get("dm"),
-                "centroid": centroid,
-                "rings": rings,
-                "area": attributes.get("Shape__Area"),
-                "length": attributes.get("Shape__Length"),
-                "label": drought_categories.get(f'd{attributes.get("dm")}', {}).get("label", "Unknown")
-            })
-        #write_to_file(processed_data, "processed_drought_data.json")
-        return processed_data, drought_categories
+    """
+    Parsed drought features from the latest ingest snapshot. Only blocks on
+    the first load, before any snapshot exists.
+    """
+    layer = get_drought_layer()
+    if layer:
+        return layer.entries, drought_categories
     else:
-        print(f"Error fetching data: {response.status_code}")
         return [], {}
 
-def display_drought_map():
-    st.title("Drought Intensity Visualization")
-    drought_data, drought_key = fetch_drought_data()
+_layer = None
+_layer_lock = threading.Lock()
 
-    if drought_data:
-        polygons = [
+def get_drought_layer(timeout=FIRST_LOAD_TIMEOUT):
+    """
+    The DroughtLayer of the latest snapshot, or None before the first one
+    (after waiting up to timeout seconds for it).
+    """
+    global _layer
+    snapshot = latest_snapshot("drought", timeout)
+    if not snapshot:
+        return None
+    with _layer_lock:
+        if _layer is None or _layer.version != snapshot.version:
+            _layer = build_drought_layer(snapshot.data, snapshot.version)
+        return _layer
+
+def build_drought_layer(entries, version=0):
+    with timing.span("dataframe_build", "drought") as span:
+        layer = _build_drought_layer(entries, version)
+        span.add(features=len(entries))
+    return layer
+
+def _build_drought_layer(entries, version):
+    levels = [entry["dm"] if entry["dm"] is not None else -1 for entry in entries]
+    colors = [drought_categories.get(f'd{level}', {}).get("color", [128, 128, 128]) for level in levels]
+    fills = [CHOROPLETH_COLORS[level] if 0 <= level < len(CHOROPLETH_COLORS) else "#999999" for level in levels]
+    centroids = [entry["centroid"] or {} for entry in entries]
+
+    table = pd.DataFrame({
+        "OBJECTID": [entry["OBJECTID"] for entry in entries],
+        "period": [entry["period"] for entry in entries],
+        "dm": pd.array([entry["dm"] for entry in entries], dtype="Int64"),
+        "label": [entry["label"] for entry in entries],
+        "longitude": pd.array([c.get("longitude") for c in centroids], dtype="Float64"),
+        "latitude": pd.array([c.get("latitude") for c in centroids], dtype="Float64"),
+        "r": pd.array([color[0] for color in colors], dtype="uint8"),
+        "g": pd.array([color[1] for color in colors], dtype="uint8"),
+        "b": pd.array([color[2] for color in colors], dtype="uint8"),
+        "fill": fills,
+    })
+
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
             {
-                "rings": entry["rings"], 
-                "label": entry["label"]
+                "type": "Feature",
+                # A unique id, so folium never writes its own into the shared features
+                "id": entry["OBJECTID"],
+                "geometry": {"type": "Polygon", "coordinates": entry["rings"]},
+                "properties": {
+                    "OBJECTID": entry["OBJECTID"],
+                    "dm": entry["dm"],
+                    "label": entry["label"],
+                    "fill": fill
+                }
             }
-            for entry in drought_data if entry["rings"]
+            for entry, fill in zip(entries, fills) if entry["rings"]
         ]
-        #write_to_file(polygons, "polygons_for_pydeck.json")
-
-        def assign_colors(polygons, drought_key):
-            for polygon in polygons:
-                for key, category in drought_key.items():
-                    if category['label'] == polygon['label']:
-                        polygon["color"] = category["color"]
-                        break
-
-        assign_colors(polygons, drought_key)
-
-        polygon_layer = pdk.Layer(
-            "PolygonLayer",
-            data=polygons,
-            get_polygon="rings",
-            get_fill_color="color",
-            get_line_color=[0, 0, 0],
-            line_width_min_pixels=1,
-            pickable=True,
-            auto_highlight=True,
-        )
+    }
+    return DroughtLayer(version, snapshot_id(entries), entries, table, geojson)
+
+def load_drought_data():
+    global _processed
+    sync = get_drought_sync()
+
+    def on_feature(feature):
+        # Runs while later pages are still downloading
+        _processed[sync.object_id(feature)] = process_feature(feature)
+
+    try:
+        sync.refresh(on_feature)
+        ok = True
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error fetching data: {e}")
+        ok = bool(sync.features)
+    if ok:
+        features = sync.snapshot()
+        processed = {}
+        for feature in features:
+            oid = sync.object_id(feature)
+            processed[oid] = _processed.get(oid) or process_feature(feature)
+        _processed = processed
+        processed_data = list(processed.values())
+        add_geometry_stats(processed_data)
+        publish_drought_views(processed_data)
+        #write_to_file(processed_data, "processed_drought_data.json")
+        return processed_data
+    else:
+        return []
+
+register_source("drought", load_drought_data, INGEST_INTERVAL)
+
+def build_drought_view(entries, band):
+    """
+    Copies of entries with their rings generalized for a zoom band:
+    simplified to half a pixel at the band's zoom and rounded to match, as a
+    maxAllowableOffset/geometryPrecision query would return them. Areas,
+    centroids and bounds keep their full-precision values.
+    """
+    with timing.span("geometry_build", "drought", target=f"z{band}") as span:
+        view = build_lod_level(entries, band)
+        span.add(features=len(view))
+    return view
+
+def view_key(snapshot, band):
+    return "drought/band", {"snapshot": snapshot, "band": band}
+
+def publish_drought_views(entries, zooms=VIEW_ZOOMS):
+    """
+    Build the generalized views of a snapshot as it is loaded, from the same
+    synced entries, and keep them in the feature cache, so no page builds one
+    on its first render.
+    """
+    snapshot = snapshot_id(entries)
+    for band in {query_band(zoom) for zoom in zooms} - {None}:
+        get_cache().set(*view_key(snapshot, band), build_drought_view(entries, band), ttl=CACHE_TTL)
+
+def get_drought_view(layer, zoom):
+    """
+    The features of a DroughtLayer snapshot as a DroughtLayer for drawing
+    the whole layer at zoom, with geometry generalized for zoom's band
+    (visually identical at that zoom, a fraction of the bytes in the page).
+    The view published with the snapshot is used; one that has left the
+    cache is rebuilt from layer.entries. layer itself is returned past the
+    finest band; risk scoring and the vector tiles always use the
+    full-precision layer.
+    """
+    band = query_band(zoom)
+    if band is None:
+        return layer
+    key = f"{layer.key}/z{band}"
+    with _views_lock:
+        view = _views.get(band)
+        if view is not None and view.key == key:
+            return view
+    entries = get_cache().get_or_fetch(*view_key(layer.key, band),
+                                       lambda: build_drought_view(layer.entries, band), ttl=CACHE_TTL)
+    if not entries:
+        return layer
+    view = build_drought_layer(entries, layer.version)._replace(key=key)
+    with _views_lock:
+        _views[band] = view
+    return view
+
+def snapshot_id(drought_data):
+    """
+    Identify a drought snapshot by its features, so derived data can be cached per snapshot.
+    """
+    keys = sorted((str(entry["OBJECTID"]), str(entry["period"])) for entry in drought_data)
+    return hashlib.sha1(repr(keys).encode()).hexdigest()
+
+def get_lod_buffers(layer, zoom):
+    """
+    Drought polygons simplified for the pyramid level that fits zoom and
+    flattened into PolygonBuffers, built once per snapshot and level and kept
+    in the feature cache.
+    """
+    level = pick_level(zoom)
+    polygons = [
+        {
+            "rings": entry["rings"],
+            "label": entry["label"],
+            "dm": entry["dm"]
+        }
+        for entry in layer.entries if entry["rings"]
+    ]
+    palette = [drought_categories[f'd{dm}']['color'] for dm in range(len(drought_categories))]
+    return get_cache().get_or_fetch(
+        "drought/lod", {"snapshot": layer.key, "zoom": level},
+        lambda: polygon_buffers(build_lod_level(polygons, level), palette), ttl=CACHE_TTL
+    )
+
+def publish_drought_tiles(layer):
+    """
+    Publish the drought polygons to the local vector tile server and return
+    the tile URL template, or None when tiles are unavailable.
+    """
+    server = get_tile_server()
+    if server is None:
+        return None
+
+    def build():
+        located = [i for i, entry in enumerate(layer.entries) if entry["rings"]]
+        table = layer.table.iloc[located]
+        properties = table[["OBJECTID", "dm", "label", "r", "g", "b"]].astype(object).to_dict("records")
+        with timing.span("geometry_build", "drought", target="tiles") as span:
+            geometries = [esri_polygon(layer.entries[i]["rings"]) for i in located]
+            source = TileSource("drought", geometries, properties)
+            span.add(features=len(geometries))
+        return source
+
+    server.publish("drought", layer.key, build)
+    return server.tile_url("drought")
+
+def display_drought_map():
+    st.title("Drought Intensity Visualization")
+    layer = get_drought_layer()
+
+    if layer and layer.entries:
+        tile_url = publish_drought_tiles(layer)
+        if tile_url:
+            # Only the tiles in view are loaded, whatever the size of the dataset
+            polygon_layer = pdk.Layer(
+                "MVTLayer",
+                data=tile_url,
+                max_zoom=MAX_ZOOM,
+                get_fill_color="[properties.r, properties.g, properties.b]",
+                get_line_color=[0, 0, 0],
+                line_width_min_pixels=1,
+                pickable=True,
+                auto_highlight=True,
+            )
+        else:
+            buffers = get_lod_buffers(layer, MAP_ZOOM)
+            polygons = polygon_layer_data(buffers)
+            #write_to_file(polygons, "polygons_for_pydeck.json")
+
+            polygon_layer = pdk.Layer(
+                "PolygonLayer",
+                data=polygons,
+                get_polygon="polygon",
+                position_format="XY",
+                get_fill_color="color",
+                get_line_color=[0, 0, 0],
+                line_width_min_pixels=1,
+                pickable=True,
+                auto_highlight=True,
+            )
 
         view_state = pdk.ViewState(
             latitude=0,
             longitude=0,
-            zoom=1,
+            zoom=MAP_ZOOM,
             bearing=0, 
             pitch=0
         )
 
-        r = pdk.Deck(
+        r = CompactDeck(
             layers=[polygon_layer],
             initial_view_state=view_state,
             tooltip={"text": "{label}"}
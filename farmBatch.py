@@ -0,0 +1,159 @@
+# farmBatch.py
+#
+# Score many farm locations in one pass: drought category, distance to the
+# nearest active warning and that warning's cluster, from the same per-snapshot
+# RiskIndex the dashboard uses. Input is a CSV with latitude/longitude columns
+# or a GeoParquet file of points (WGS84).
+#
+#   python -m farmBatch farms.csv -o scored.csv [--workers 4]
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from droughtData import drought_categories
+
+LATITUDE_COLUMNS = ("latitude", "lat", "y")
+LONGITUDE_COLUMNS = ("longitude", "lon", "lng", "long", "x")
+# Below this many farms per worker, starting a process pool costs more than it saves
+POOL_MIN_FARMS = 25_000
+
+RESULT_COLUMNS = ["drought_level", "drought_label", "nearest_warning_km", "nearest_warning_event", "cluster_id"]
+
+
+def find_column(columns, candidates):
+    lowered = {column.lower(): column for column in columns}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def read_farms(path):
+    """
+    Farms as a DataFrame with latitude and longitude columns (plus whatever
+    else the file holds), and the file's GeoParquet metadata, if any.
+    """
+    if path.endswith((".parquet", ".geoparquet")):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        geo = (table.schema.metadata or {}).get(b"geo")
+        farms = table.to_pandas()
+        if geo is not None:
+            column = json.loads(geo)["primary_column"]
+            # Points give their own coordinates; other shapes a point inside them
+            points = shapely.point_on_surface(shapely.from_wkb(farms[column].to_numpy()))
+            farms["longitude"] = shapely.get_x(points)
+            farms["latitude"] = shapely.get_y(points)
+            return farms, geo
+    else:
+        farms = pd.read_csv(path)
+
+    lat = find_column(farms.columns, LATITUDE_COLUMNS)
+    lon = find_column(farms.columns, LONGITUDE_COLUMNS)
+    if lat is None or lon is None:
+        raise ValueError(f"{path} needs latitude and longitude columns (got {', '.join(farms.columns)})")
+    farms = farms.rename(columns={lat: "latitude", lon: "longitude"})
+    farms["latitude"] = pd.to_numeric(farms["latitude"], errors="coerce")
+    farms["longitude"] = pd.to_numeric(farms["longitude"], errors="coerce")
+    return farms, None
+
+
+def write_farms(farms, path, geo=None):
+    if path.endswith((".parquet", ".geoparquet")):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(farms, preserve_index=False)
+        if geo is not None:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"geo": geo})
+        pq.write_table(table, path)
+    else:
+        farms.to_csv(path, index=False)
+
+
+_worker_index = None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _score_chunk(chunk):
+    lats, lons = chunk
+    return _worker_index.assess_points(lats, lons)
+
+
+def score_points(index, lats, lons, workers=1):
+    """
+    index.assess_points, split over a process pool when there are enough
+    points to make it worthwhile. The index is sent to each worker once.
+    """
+    workers = max(1, min(workers, len(lats) // POOL_MIN_FARMS))
+    if workers == 1:
+        return index.assess_points(lats, lons)
+    size = math.ceil(len(lats) / workers)
+    chunks = [(lats[i:i + size], lons[i:i + size]) for i in range(0, len(lats), size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as executor:
+        parts = list(executor.map(_score_chunk, chunks))
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def score_farms(farms, index, workers=1):
+    """
+    farms with the RESULT_COLUMNS added.
+    """
+    result = score_points(index, farms["latitude"].to_numpy(dtype=float),
+                          farms["longitude"].to_numpy(dtype=float), workers)
+    levels = result["drought_level"]
+    labels = np.array(["None"] + [drought_categories[f"d{level}"]["label"] for level in range(5)], dtype=object)
+    nearest = result["nearest_warning"]
+    events = np.append(index.events, None)
+
+    farms = farms.copy()
+    farms["drought_level"] = pd.array(np.where(levels >= 0, levels, None), dtype="Int64")
+    farms["drought_label"] = labels[levels + 1]
+    farms["nearest_warning_km"] = result["nearest_warning_km"]
+    farms["nearest_warning_event"] = events[nearest]
+    farms["cluster_id"] = result["cluster_id"]
+    return farms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score farm locations against the current drought and warnings data.")
+    parser.add_argument("farms", help="CSV with latitude/longitude columns, or GeoParquet of points")
+    parser.add_argument("-o", "--output", help="CSV or Parquet to write (default: <farms>_scored.csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for the spatial join (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    from riskEngine import get_risk_index
+
+    farms, geo = read_farms(args.farms)
+    print("Loading drought and warnings data...")
+    index = get_risk_index()
+    if index is None:
+        print("Drought or warnings data is unavailable; try again later.")
+        return 1
+
+    start = time.perf_counter()
+    scored = score_farms(farms, index, args.workers)
+    seconds = time.perf_counter() - start
+    output = args.output or f"{os.path.splitext(args.farms)[0]}_scored.csv"
+    write_farms(scored, output, geo)
+
+    in_drought = int((scored["drought_level"].fillna(-1) >= 0).sum())
+    print(f"Scored {len(scored)} farms in {seconds:.2f}s: {in_drought} in drought areas; wrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
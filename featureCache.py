@@ -0,0 +1,180 @@
+# featureCache.py
+
+import gc
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+CACHE_PATH = os.getenv(
+    "FARMVIS_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "features.sqlite")
+)
+# Default time-to-live (seconds) and total payload budget (bytes)
+CACHE_TTL = int(os.getenv("FARMVIS_CACHE_TTL", 600))
+CACHE_MAX_BYTES = int(os.getenv("FARMVIS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    layer TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _loads(payload):
+    # Unpickling large nested feature lists triggers repeated GC passes that
+    # cost more than the decode itself
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(zlib.decompress(payload))
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def make_key(layer, params):
+    """
+    Stable cache key for a layer and its query parameters.
+    """
+    blob = json.dumps([str(layer), params], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class FeatureCache:
+    """
+    On-disk cache of query results (any picklable value), stored in SQLite.
+
+    The database runs in WAL mode so several Streamlit worker processes can
+    read and write it at once. Each entry carries its own TTL and counts as a
+    miss once it has expired; when the total payload size passes max_bytes the
+    least recently used entries are evicted. Hit and miss counts are kept both per process
+    and in the database, where they add up across processes.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        self._connect().execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, layer, params):
+        """
+        Return the cached value, or None on a miss or an expired entry.
+        """
+        key = make_key(layer, params)
+        conn = self._connect()
+        row = conn.execute("SELECT expires, payload FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or row[0] < now:
+            self.misses += 1
+            self._count("misses")
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        self._count("hits")
+        return _loads(row[1])
+
+    def set(self, layer, params, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO entries (key, layer, created, expires, accessed, size, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (make_key(layer, params), str(layer), now, now + ttl, now, len(payload), payload)
+        )
+        self.evict()
+
+    def get_or_fetch(self, layer, params, fetch, ttl=None):
+        """
+        Return the cached value, or call fetch() and cache a non-empty result.
+        """
+        value = self.get(layer, params)
+        if value is None:
+            value = fetch()
+            if value:
+                self.set(layer, params, value, ttl)
+        return value
+
+    def evict(self):
+        """
+        Drop expired entries, then the least recently used ones until the
+        cache fits in max_bytes.
+        """
+        conn = self._connect()
+        conn.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        self._connect().execute("DELETE FROM entries")
+
+    def stats(self):
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "hits": counts.get("hits", 0),
+            "misses": counts.get("misses", 0),
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Process-wide cache instance backed by CACHE_PATH.
+    """
+    global _cache
+    if _cache is None:
+        _cache = FeatureCache()
+    return _cache
@@ -0,0 +1,54 @@
+# featureQuery.py
+#
+# FeatureServer query parameters for data that is drawn at a known map zoom.
+# Zooms are grouped into bands, one per geometryLod level: a query for a band
+# asks the server to generalize geometry to half a screen pixel at the band's
+# zoom (maxAllowableOffset) and to round coordinates to match
+# (geometryPrecision), and names only the fields the caller reads instead of
+# outFields=*. Results should be cached per band, not per zoom.
+
+from geometryLod import LOD_ZOOMS, level_params
+
+# Spatial reference of the generalization parameters (degrees)
+QUERY_SR = 4326
+
+
+def query_band(zoom, bands=LOD_ZOOMS):
+    """
+    The band to query for a view at zoom: the least detailed band that is
+    still at least as detailed as the view, so the generalization stays
+    under half a pixel. None (full precision) for zoom None or past the
+    finest band.
+    """
+    if zoom is None:
+        return None
+    candidates = [band for band in bands if band >= zoom]
+    return min(candidates) if candidates else None
+
+
+def generalization_params(band):
+    """
+    maxAllowableOffset and geometryPrecision for a band, or nothing for None.
+    """
+    if band is None:
+        return {}
+    tolerance, decimals = level_params(band)
+    return {"maxAllowableOffset": tolerance, "geometryPrecision": decimals, "outSR": QUERY_SR}
+
+
+def out_fields(fields, object_id_field="OBJECTID"):
+    """
+    outFields naming the OBJECTID field and fields, each once.
+    """
+    return ",".join(dict.fromkeys([object_id_field, *fields]))
+
+
+def build_query(where, fields, zoom=None, object_id_field="OBJECTID", **extra):
+    """
+    Query parameters for the features matching where, with only fields and
+    geometry generalized for zoom. Returns (params, band); key caches on band.
+    """
+    band = query_band(zoom)
+    params = {"where": where, "outFields": out_fields(fields, object_id_field), "returnGeometry": "true", **extra}
+    params.update(generalization_params(band))
+    return params, band
@@ -0,0 +1,348 @@
+# featureReader.py
+
+import codecs
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+import pbfDecoder
+import timing
+
+# Features requested per page and pages in flight at once
+PAGE_SIZE = 1000
+PAGE_WORKERS = 4
+PAGE_TIMEOUT = 30
+# Bytes read from the socket at a time while decoding a response
+STREAM_CHUNK_SIZE = 64 * 1024
+# Set FARMVIS_PBF=1 to ask for feature pages in f=pbf, falling back to JSON
+# where the server doesn't support it. Off by default: a pbf answer is
+# decoded from the whole body in memory where JSON is streamed feature by
+# feature, and its coordinates come back quantized
+PBF = os.getenv("FARMVIS_PBF", "0") == "1"
+GEOJSON_FORMATS = ("geojson", "pgeojson")
+
+_WHITESPACE = re.compile(r"\s*")
+_decoder = json.JSONDecoder()
+
+
+class FeatureStream:
+    """
+    The features of a FeatureServer query response (Esri JSON or GeoJSON),
+    decoded one at a time as the body arrives.
+
+    response.json() holds the body as bytes, then as a str, then as a whole
+    object tree before the first feature can be used. Iterating a
+    FeatureStream instead keeps only the undecoded text of the current
+    feature: each one is decoded as soon as it is complete, and the text
+    before it is dropped. The response should be requested with
+    stream=True.
+
+    Afterwards meta holds the response's other top-level members
+    (exceededTransferLimit, properties, error, ...), and bytes and
+    features the size of the body and the number of features. The
+    json_decode span recorded at the end includes the time spent waiting
+    for the body.
+    """
+
+    def __init__(self, response, source=None, chunk_size=STREAM_CHUNK_SIZE):
+        self.response = response
+        self.source = source
+        self.meta = {}
+        self.bytes = 0
+        self.features = 0
+        self._chunks = response.iter_content(chunk_size)
+        self._text = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # Text read since the buffer was last joined, and its length
+        self._pending = []
+        self._pending_length = 0
+        self._eof = False
+
+    def __iter__(self):
+        elapsed = 0.0
+        start = time.perf_counter()
+        try:
+            for feature in self._decode():
+                elapsed += time.perf_counter() - start
+                self.features += 1
+                yield feature
+                start = time.perf_counter()
+            elapsed += time.perf_counter() - start
+        finally:
+            self.response.close()
+            timing.observe("json_decode", elapsed, self.source, bytes=self.bytes, features=self.features)
+
+    def _read(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            text = self._text.decode(b"", final=True)
+            self._eof = True
+        else:
+            self.bytes += len(chunk)
+            text = self._text.decode(chunk)
+        if text:
+            self._pending.append(text)
+            self._pending_length += len(text)
+
+    def _join(self):
+        if self._pending:
+            # Drops the text already decoded
+            self._buffer = self._buffer[self._pos:] + "".join(self._pending)
+            self._pos = 0
+            self._pending = []
+            self._pending_length = 0
+
+    def _next(self):
+        """
+        The next character after any whitespace, without consuming it.
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                raise ValueError("FeatureServer response ended early")
+            self._read()
+            self._join()
+
+    def _expect(self, characters):
+        character = self._next()
+        if character not in characters:
+            raise ValueError(f"Expected one of {characters!r} at byte {self.bytes}, got {character!r}")
+        self._pos += 1
+        return character
+
+    def _value(self):
+        """
+        Decode the JSON value starting at the next character. A failed attempt
+        (the value isn't all here yet) is only retried once the text has
+        doubled, so a value spanning many chunks is decoded in linear time.
+        """
+        self._next()
+        wanted = 0
+        while True:
+            if self._eof or len(self._buffer) - self._pos + self._pending_length >= wanted:
+                self._join()
+                try:
+                    value, end = _decoder.raw_decode(self._buffer, self._pos)
+                except ValueError:
+                    if self._eof:
+                        raise
+                else:
+                    # A number or literal that ends with the text may continue in the next chunk
+                    if end < len(self._buffer) or self._eof:
+                        self._pos = end
+                        return value
+                wanted = 2 * (len(self._buffer) - self._pos)
+            self._read()
+
+    def _decode(self):
+        self._expect("{")
+        if self._next() == "}":
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected a member name at byte {self.bytes}")
+            self._expect(":")
+            if key == "features" and self._next() == "[":
+                self._pos += 1
+                if self._next() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.meta[key] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+class PbfPage:
+    """
+    The features of a decoded f=pbf response, converted to the shape the
+    JSON format fmt returns. Iterates like a FeatureStream, with the same
+    meta, bytes and features attributes.
+    """
+
+    def __init__(self, result, fmt, size):
+        self.result = result
+        self.fmt = fmt
+        self.meta = {"exceededTransferLimit": result.exceeded_transfer_limit}
+        self.bytes = size
+        self.features = result.size
+
+    def __iter__(self):
+        if self.fmt in GEOJSON_FORMATS:
+            return pbfDecoder.geojson_features(self.result)
+        return pbfDecoder.esri_features(self.result)
+
+
+# Query URLs whose server said it doesn't support f=pbf; they get JSON from then on
+_pbf_unsupported = set()
+
+
+def _get_json(session, url, params, timeout, source=None):
+    response = timing.request(session, "GET", url, source, params=params, timeout=timeout)
+    response.raise_for_status()
+    data = timing.decode_json(response, source)
+    if "error" in data:
+        raise requests.HTTPError(f"{url}: {data['error']}")
+    return data
+
+
+def pbf_format_error(error):
+    """
+    Whether an error answer to f=pbf rejects the format itself, rather than
+    something about this one query.
+    """
+    text = " ".join([str(error.get("message", "")), *map(str, error.get("details") or [])]).lower()
+    return "format" in text or "pbf" in text
+
+
+def fetch_pbf(session, method, url, params, timeout, source=None):
+    """
+    One query in f=pbf, decoded from the whole body at once. Returns None if
+    the server answered in another format, so the query should be repeated in
+    JSON. Only a server that doesn't support pbf at all (it answers with
+    JSON features, or with an error about the format) is marked as such; an
+    error about the query or a one-off failure just falls back this once.
+    """
+    key = "data" if method == "POST" else "params"
+    response = timing.request(session, method, url, source, timeout=timeout, **{key: dict(params, f="pbf")})
+    if "json" in response.headers.get("Content-Type", ""):
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        error = data.get("error") if isinstance(data, dict) else None
+        if not isinstance(error, dict) or pbf_format_error(error):
+            print(f"{url} doesn't answer in pbf, using f={params.get('f')}")
+            _pbf_unsupported.add(url)
+        return None
+    if response.status_code == 400:
+        return None
+    response.raise_for_status()
+    try:
+        with timing.span("pbf_decode", source) as span:
+            result = pbfDecoder.decode(response.content)
+            span.add(bytes=len(response.content), features=result.size)
+    except ValueError:
+        return None
+    return PbfPage(result, params.get("f"), len(response.content))
+
+
+def stream_features(session, method, url, params, timeout, source=None, pbf=None):
+    """
+    The features of one query: a FeatureStream, or with pbf (default PBF)
+    a PbfPage, converted to the shape of params' f format. A query that
+    doesn't get a pbf answer is repeated in that JSON format, and a server
+    that doesn't support pbf isn't asked for it again (see fetch_pbf).
+    params go in the query string for GET, in the form body for POST.
+    """
+    if (PBF if pbf is None else pbf) and url not in _pbf_unsupported and pbfDecoder.available():
+        page = fetch_pbf(session, method, url, params, timeout, source)
+        if page is not None:
+            return page
+
+    key = "data" if method == "POST" else "params"
+    response = timing.request(session, method, url, source, timeout=timeout, stream=True, **{key: params})
+    response.raise_for_status()
+    return FeatureStream(response, source)
+
+
+def check_stream(stream, url):
+    """
+    Raise for an error the server reported in place of features.
+    """
+    if "error" in stream.meta:
+        raise requests.HTTPError(f"{url}: {stream.meta['error']}")
+
+
+def exceeded_transfer_limit(meta):
+    return bool(meta.get("exceededTransferLimit") or (meta.get("properties") or {}).get("exceededTransferLimit"))
+
+
+def count_features(query_url, params, session=None, timeout=PAGE_TIMEOUT, source=None):
+    """
+    Ask the server how many features match params, or None if it can't say.
+    """
+    session = session or requests.Session()
+    count_params = {"where": params.get("where", "1=1"), "returnCountOnly": "true", "f": "json"}
+    for key in ("geometry", "geometryType", "spatialRel", "inSR", "objectIds"):
+        if key in params:
+            count_params[key] = params[key]
+    try:
+        return _get_json(session, query_url, count_params, timeout, source).get("count")
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def iter_features(query_url, params, page_size=PAGE_SIZE, max_workers=PAGE_WORKERS,
+                  session=None, timeout=PAGE_TIMEOUT, order_by="OBJECTID", source=None, pbf=None):
+    """
+    Yield every feature matching params, paging with resultOffset.
+
+    When the server reports a count, up to max_workers pages are fetched
+    concurrently and features are yielded page by page as each page arrives,
+    so the caller's parsing overlaps with the remaining downloads and at most
+    max_workers pages are held in memory. Pages come back in arrival order,
+    not offset order. A page cut short by the server's maxRecordCount is
+    followed up from where it stopped. Without a count the reader falls back
+    to sequential paging on exceededTransferLimit, yielding each feature as
+    soon as it is decoded. source labels the requests' timing spans and pbf
+    selects the transport as for stream_features.
+    """
+    session = session or requests.Session()
+    base = {key: value for key, value in params.items() if key not in ("resultOffset", "resultRecordCount")}
+    if order_by and "orderByFields" not in base:
+        base["orderByFields"] = order_by
+
+    def open_page(offset, size):
+        page = dict(base, resultOffset=offset, resultRecordCount=size)
+        return stream_features(session, "GET", query_url, page, timeout, source, pbf)
+
+    def fetch(offset, size):
+        stream = open_page(offset, size)
+        features = list(stream)
+        check_stream(stream, query_url)
+        return features
+
+    total = count_features(query_url, base, session, timeout, source)
+
+    if total is None:
+        offset = 0
+        while True:
+            # Features are handed over as they are decoded
+            stream = open_page(offset, page_size)
+            yield from stream
+            check_stream(stream, query_url)
+            offset += stream.features
+            if not stream.features or not exceeded_transfer_limit(stream.meta):
+                return
+
+    pages = [(offset, min(page_size, total - offset)) for offset in range(0, total, page_size)]
+    pages.reverse()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = {}
+    try:
+        while pages or in_flight:
+            while pages and len(in_flight) < max_workers:
+                offset, size = pages.pop()
+                in_flight[executor.submit(timing.bind(fetch), offset, size)] = (offset, size)
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset, size = in_flight.pop(future)
+                features = future.result()
+                if 0 < len(features) < size:
+                    pages.append((offset + len(features), size - len(features)))
+                yield from features
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
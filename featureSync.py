@@ -0,0 +1,210 @@
+# featureSync.py
+
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+import timing
+from featureReader import check_stream, iter_features, stream_features
+
+# Number of OBJECTIDs requested per geometry query
+ID_BATCH_SIZE = 100
+SYNC_TIMEOUT = 30
+
+
+def layer_url_from_query_url(url):
+    """
+    Strip a trailing /query so the same constant can be used for metadata requests.
+    """
+    return url[:-len("/query")] if url.rstrip("/").endswith("/query") else url.rstrip("/")
+
+
+def arcgis_timestamp(epoch_ms):
+    """
+    A SQL timestamp literal for epoch_ms, keeping the milliseconds: cut to
+    whole seconds, "edited > last_edit" would match the last edits again on
+    every refresh.
+    """
+    moment = datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+    return f"TIMESTAMP '{moment:%Y-%m-%d %H:%M:%S}.{int(epoch_ms) % 1000:03d}'"
+
+
+class FeatureLayerSync:
+    """
+    Keep a local copy of one FeatureServer layer and refresh it by delta.
+
+    The first refresh pages through the whole layer with iter_features. After
+    that, each refresh asks the server for the current OBJECTID set (returnIdsOnly),
+    plus the IDs edited since the last refresh when the layer exposes an edit
+    date field, and then downloads attributes and geometry only for new or
+    edited features. Features whose IDs disappeared are dropped.
+
+    fmt is the query format used for feature downloads ('json' or 'pgeojson');
+    features are kept exactly as the server returns them in that format.
+    Narrowed out_fields always get the OBJECTID and edit-date fields added,
+    since the sync reads them.
+    With pbf (default featureReader.PBF) they are downloaded in f=pbf where
+    the server supports it and converted to fmt's shape. source labels the
+    requests' timing spans.
+    """
+
+    def __init__(self, layer_url, where="1=1", out_fields="*", fmt="json", session=None,
+                 timeout=SYNC_TIMEOUT, batch_size=ID_BATCH_SIZE, extra_params=None, source=None, pbf=None):
+        self.layer_url = layer_url_from_query_url(layer_url)
+        self.where = where
+        self.out_fields = out_fields
+        self.fmt = fmt
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.extra_params = extra_params or {}
+        self.source = source
+        self.pbf = pbf
+
+        self.features = {}
+        self.object_id_field = None
+        self.edit_field = None
+        self.last_edit = None
+        self.bytes_received = 0
+        self._described = False
+        self._lock = threading.Lock()
+
+    def _request(self, url, params, method="get"):
+        if method == "post":
+            response = timing.request(self.session, "POST", url, self.source, data=params, timeout=self.timeout)
+        else:
+            response = timing.request(self.session, "GET", url, self.source, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        self.bytes_received += len(response.content)
+        data = timing.decode_json(response, self.source)
+        if "error" in data:
+            raise requests.HTTPError(f"{self.layer_url}: {data['error']}")
+        return data
+
+    def _describe(self):
+        if self._described:
+            return
+        info = self._request(self.layer_url, {"f": "json"})
+        self.object_id_field = info.get("objectIdField") or "OBJECTID"
+        edit_info = info.get("editFieldsInfo") or {}
+        self.edit_field = edit_info.get("editDateField")
+        self._described = True
+
+    def _out_fields(self):
+        """
+        out_fields with the OBJECTID and edit-date fields, which the sync reads
+        whatever the caller asked for.
+        """
+        names = [name.strip() for name in self.out_fields.split(",") if name.strip()]
+        if "*" in names:
+            return "*"
+        return ",".join(dict.fromkeys([self.object_id_field, *names, *filter(None, [self.edit_field])]))
+
+    def _query_ids(self, where):
+        data = self._request(self.layer_url + "/query", {"where": where, "returnIdsOnly": "true", "f": "json"})
+        return set(data.get("objectIds") or [])
+
+    def _fetch_all(self):
+        params = dict(self.extra_params)
+        params.update({"where": self.where, "outFields": self._out_fields(), "returnGeometry": "true", "f": self.fmt})
+        return iter_features(self.layer_url + "/query", params, session=self.session,
+                             timeout=self.timeout, order_by=self.object_id_field, source=self.source,
+                             pbf=self.pbf)
+
+    def _fetch(self, object_ids):
+        # Kept whole until every batch is in, so a failed refresh stores nothing
+        # and last_edit can't move past edits that weren't fetched
+        features = []
+        object_ids = sorted(object_ids)
+        for i in range(0, len(object_ids), self.batch_size):
+            params = dict(self.extra_params)
+            params.update({
+                "objectIds": ",".join(str(oid) for oid in object_ids[i:i + self.batch_size]),
+                "outFields": self._out_fields(),
+                "returnGeometry": "true",
+                "f": self.fmt,
+            })
+            stream = stream_features(self.session, "POST", self.layer_url + "/query", params,
+                                     self.timeout, self.source, self.pbf)
+            features.extend(stream)
+            self.bytes_received += stream.bytes
+            check_stream(stream, self.layer_url)
+        return features
+
+    def object_id(self, feature):
+        if "attributes" in feature:
+            return feature["attributes"].get(self.object_id_field)
+        return feature.get("id", feature.get("properties", {}).get(self.object_id_field))
+
+    def _edit_date(self, feature):
+        values = feature.get("attributes") or feature.get("properties") or {}
+        return values.get(self.edit_field)
+
+    def snapshot(self):
+        """
+        Return the local copy as a list of features.
+        """
+        with self._lock:
+            return list(self.features.values())
+
+    def refresh(self, on_feature=None):
+        """
+        Bring the local copy up to date. Returns a summary of what changed.
+
+        on_feature, if given, is called with each new or edited feature as soon
+        as it has been downloaded.
+        """
+        with self._lock:
+            return self._refresh(on_feature)
+
+    def _store(self, feature, on_feature):
+        self.features[self.object_id(feature)] = feature
+        if self.edit_field:
+            edited_at = self._edit_date(feature)
+            if edited_at is not None and (self.last_edit is None or edited_at > self.last_edit):
+                self.last_edit = edited_at
+        if on_feature is not None:
+            on_feature(feature)
+
+    def _refresh(self, on_feature):
+        start = time.perf_counter()
+        bytes_before = self.bytes_received
+        self._describe()
+
+        if not self.features:
+            for feature in self._fetch_all():
+                self._store(feature, on_feature)
+            return {
+                "added": len(self.features),
+                "updated": 0,
+                "removed": 0,
+                "total": len(self.features),
+                "bytes": self.bytes_received - bytes_before,
+                "seconds": time.perf_counter() - start,
+            }
+
+        current = self._query_ids(self.where)
+        removed = self.features.keys() - current
+        for oid in removed:
+            del self.features[oid]
+
+        wanted = current - self.features.keys()
+        updated = set()
+        if self.edit_field and self.last_edit is not None and self.features:
+            edited = self._query_ids(f"({self.where}) AND {self.edit_field} > {arcgis_timestamp(self.last_edit)}")
+            updated = (edited & current) - wanted
+            wanted |= updated
+
+        for feature in self._fetch(wanted):
+            self._store(feature, on_feature)
+
+        return {
+            "added": len(wanted) - len(updated),
+            "updated": len(updated),
+            "removed": len(removed),
+            "total": len(self.features),
+            "bytes": self.bytes_received - bytes_before,
+            "seconds": time.perf_counter() - start,
+        }
@@ -0,0 +1,339 @@
+# gazetteer.py
+#
+# Offline geocoding of populated places. The table is loaded once into numpy
+# arrays, with a dict from normalized names to rows for forward lookups and a
+# KD-tree for reverse lookups. Names the table doesn't know fall back to
+# Nominatim, rate limited and cached in the feature cache.
+#
+# The bundled assets/gazetteer.tsv is a seed list of larger US places. Build
+# a full table from a GeoNames dump (https://download.geonames.org/export/dump/)
+# with
+#
+#   python -m gazetteer build cities1000.txt [assets/gazetteer.tsv.gz]
+#
+# and point FARMVIS_GAZETTEER at it if it lives elsewhere.
+
+import gzip
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from typing import NamedTuple
+
+import numpy as np
+
+from clusterEngine import EARTH_RADIUS_KM
+from featureCache import get_cache
+
+GAZETTEER_PATH = os.getenv(
+    "FARMVIS_GAZETTEER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "gazetteer.tsv")
+)
+# Set FARMVIS_REMOTE_GEOCODER=0 to never leave the process (unknown names then fail)
+REMOTE_GEOCODER = os.getenv("FARMVIS_REMOTE_GEOCODER", "1") == "1"
+# Nominatim's usage policy allows one request per second
+REMOTE_MIN_INTERVAL = 1.0
+REMOTE_TIMEOUT = 10
+# Remote answers, including "not found", are kept this long (seconds)
+REMOTE_CACHE_TTL = 30 * 24 * 3600
+
+COUNTRY_NAMES = {"us": "US", "usa": "US", "united states": "US", "united states of america": "US"}
+STATE_NAMES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC", "south dakota": "SD",
+    "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT", "virginia": "VA",
+    "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+# Leading abbreviations spelled out, so "St. Louis" and "Saint Louis" match
+ABBREVIATIONS = {"st": "saint", "ste": "sainte", "ft": "fort", "mt": "mount"}
+
+_DROPPED = re.compile(r"[.'’]")
+_SEPARATORS = re.compile(r"[^\w,]+")
+
+
+def normalize(name):
+    """
+    Lookup form of a place name: accents stripped, case folded, punctuation
+    and extra whitespace removed, leading abbreviations spelled out.
+    Commas are kept so qualifiers ("Springfield, IL") can be split off.
+    """
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = "".join(c for c in name if not unicodedata.combining(c))
+    name = name.casefold()
+    name = _SEPARATORS.sub(" ", _DROPPED.sub("", name))
+    parts = []
+    for part in name.split(","):
+        words = part.split()
+        if words and words[0] in ABBREVIATIONS:
+            words[0] = ABBREVIATIONS[words[0]]
+        if words:
+            parts.append(" ".join(words))
+    return ", ".join(parts)
+
+
+class Place(NamedTuple):
+    name: str
+    admin1: str
+    country: str
+    latitude: float
+    longitude: float
+    population: int
+
+
+def read_table(path):
+    """
+    Rows of a gazetteer TSV (optionally gzipped): name, admin1, country,
+    latitude, longitude, population, comma-separated alternate names.
+    Lines starting with # are comments.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            name, admin1, country, lat, lon, population, *rest = line.rstrip("\n").split("\t")
+            alternates = [alt for alt in (rest[0] if rest else "").split(",") if alt]
+            yield name, admin1, country, float(lat), float(lon), int(population or 0), alternates
+
+
+def unit_vectors(lat, lon):
+    """
+    (N, 3) points on the unit sphere, so Euclidean nearest neighbours are
+    great-circle nearest neighbours, across the antimeridian too.
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class Gazetteer:
+    """
+    Array-backed table of populated places.
+
+    Rows are sorted by population, largest first, so the first row an index
+    entry lists is the most likely meaning of an ambiguous name.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: -row[5])
+        self.names = np.array([row[0] for row in rows], dtype=str)
+        self.admin1 = np.array([row[1] for row in rows], dtype=str)
+        self.country = np.array([row[2] for row in rows], dtype=str)
+        self.latitude = np.array([row[3] for row in rows], dtype=np.float32)
+        self.longitude = np.array([row[4] for row in rows], dtype=np.float32)
+        self.population = np.array([row[5] for row in rows], dtype=np.int64)
+
+        # Normalized name -> slot; slot -> its rows as a slice of name_rows
+        self.index = {}
+        slots = []
+        row_ids = []
+        for i, row in enumerate(rows):
+            for name in {normalize(row[0]), *(normalize(alt) for alt in row[6])}:
+                slots.append(self.index.setdefault(name, len(self.index)))
+                row_ids.append(i)
+        slots = np.array(slots, dtype=np.int32)
+        # Stable, so each name's rows stay in population order
+        order = np.argsort(slots, kind="stable")
+        self.name_rows = np.array(row_ids, dtype=np.int32)[order]
+        self.name_offsets = np.concatenate([[0], np.cumsum(np.bincount(slots, minlength=len(self.index)))])
+        self._tree = None
+        self._tree_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        return cls(read_table(path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def rows(self, name):
+        """
+        Rows whose name or an alternate normalizes to name, largest first, or None.
+        """
+        slot = self.index.get(name)
+        if slot is None:
+            return None
+        return self.name_rows[self.name_offsets[slot]:self.name_offsets[slot + 1]]
+
+    def place(self, i):
+        return Place(str(self.names[i]), str(self.admin1[i]), str(self.country[i]),
+                     round(float(self.latitude[i]), 5), round(float(self.longitude[i]), 5),
+                     int(self.population[i]))
+
+    def lookup(self, query):
+        """
+        Best match for a place name, optionally qualified by state and/or
+        country ("Springfield, IL", "Portland, Oregon, USA"), or None.
+        """
+        key = normalize(query)
+        ids = self.rows(key)
+        if ids is not None:
+            return self.place(ids[0])
+
+        name, *qualifiers = key.split(", ")
+        ids = self.rows(name)
+        if ids is None:
+            return None
+        for qualifier in qualifiers:
+            country = COUNTRY_NAMES.get(qualifier, qualifier.upper())
+            admin1 = STATE_NAMES.get(qualifier, qualifier.upper())
+            matches = ids[(self.admin1[ids] == admin1) | (self.country[ids] == country)]
+            if len(matches) == 0:
+                return None
+            ids = matches
+        return self.place(ids[0])
+
+    def tree(self):
+        with self._tree_lock:
+            if self._tree is None:
+                from scipy.spatial import cKDTree
+                self._tree = cKDTree(unit_vectors(self.latitude.astype(float), self.longitude.astype(float)))
+            return self._tree
+
+    def nearest(self, lat, lon, k=1):
+        """
+        The k places nearest to (lat, lon), closest first, as (Place, km) pairs.
+        """
+        k = min(k, len(self))
+        if k == 0:
+            return []
+        chord, ids = self.tree().query(unit_vectors([lat], [lon])[0], k=k)
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.atleast_1d(chord) / 2, 1.0))
+        return [(self.place(i), float(d)) for i, d in zip(np.atleast_1d(ids), km)]
+
+
+class RemoteGeocoder:
+    """
+    Nominatim, for names the gazetteer doesn't have. Calls are spaced at
+    least min_interval apart across threads and answers are cached in the
+    feature cache, so a name costs at most one request per REMOTE_CACHE_TTL.
+    """
+
+    def __init__(self, min_interval=REMOTE_MIN_INTERVAL, timeout=REMOTE_TIMEOUT):
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self._geolocator = None
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+
+    def geocode(self, query):
+        """
+        (lat, lon) for query, or (None, None) when it can't be found.
+        """
+        key = normalize(query)
+        cached = get_cache().get("geocode/nominatim", {"query": key})
+        if cached is not None:
+            return cached
+
+        from geopy.exc import GeopyError
+        try:
+            location = self._call(query)
+        except GeopyError as e:
+            # Not cached, so the next rerun tries again
+            print(f"Geocoding {query!r} failed: {e}")
+            return (None, None)
+        coords = (location.latitude, location.longitude) if location else (None, None)
+        get_cache().set("geocode/nominatim", {"query": key}, coords, ttl=REMOTE_CACHE_TTL)
+        return coords
+
+    def _call(self, query):
+        with self._lock:
+            if self._geolocator is None:
+                from geopy.geocoders import Nominatim
+                self._geolocator = Nominatim(user_agent="streamlit_app")
+            time.sleep(max(0.0, self._next_call - time.monotonic()))
+            try:
+                return self._geolocator.geocode(query, timeout=self.timeout)
+            finally:
+                self._next_call = time.monotonic() + self.min_interval
+
+
+_gazetteer = None
+_remote = None
+_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """
+    Process-wide gazetteer, loaded on first use.
+    """
+    global _gazetteer
+    with _lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer.load()
+        return _gazetteer
+
+
+def get_remote_geocoder():
+    global _remote
+    with _lock:
+        if _remote is None:
+            _remote = RemoteGeocoder()
+        return _remote
+
+
+def geocode(query):
+    """
+    (lat, lon) of a place name, or (None, None). Looks in the gazetteer
+    first and only asks the remote geocoder about names it doesn't know.
+    """
+    if not query or not query.strip():
+        return (None, None)
+    place = get_gazetteer().lookup(query)
+    if place is not None:
+        return (place.latitude, place.longitude)
+    if not REMOTE_GEOCODER:
+        return (None, None)
+    return get_remote_geocoder().geocode(query)
+
+
+def reverse_geocode(lat, lon):
+    """
+    Nearest populated place to (lat, lon) and its distance in km, or (None, None).
+    """
+    nearest = get_gazetteer().nearest(lat, lon)
+    return nearest[0] if nearest else (None, None)
+
+
+def build(source, target):
+    """
+    Convert a GeoNames dump (cities1000.txt and the like) to gazetteer TSV.
+    """
+    count = 0
+    opener = gzip.open if target.endswith(".gz") else open
+    with open(source, encoding="utf-8") as src, opener(target, "wt", encoding="utf-8") as out:
+        out.write(f"# Built from {os.path.basename(source)} (GeoNames, CC BY 4.0)\n")
+        for line in src:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15 or fields[6] != "P":
+                continue
+            name, ascii_name = fields[1], fields[2]
+            alternates = ascii_name if ascii_name and ascii_name != name else ""
+            out.write("\t".join([name, fields[10], fields[8], fields[4], fields[5], fields[14] or "0",
+                                 alternates]) + "\n")
+            count += 1
+    print(f"Wrote {count} places to {target}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) in (2, 3) and argv[0] == "build":
+        build(argv[1], argv[2] if len(argv) == 3 else GAZETTEER_PATH)
+    else:
+        print("usage: python -m gazetteer build <geonames dump> [output.tsv[.gz]]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# geometryKernel.py
+
+import itertools
+from typing import NamedTuple
+
+import numpy as np
+
+
+class PolygonStats(NamedTuple):
+    """
+    Per-feature measures of a batch of polygons, in the units of the input
+    coordinates (planar lon/lat degrees for the Esri layers).
+
+    area: (F,) unsigned area, holes subtracted
+    centroids: (F, 2) area-weighted x/y; NaN for features without vertices
+    bounds: (F, 4) xmin, ymin, xmax, ymax; NaN for features without vertices
+    """
+    area: np.ndarray
+    centroids: np.ndarray
+    bounds: np.ndarray
+
+
+def _ring_array(ring):
+    coords = np.asarray(ring, dtype=float)
+    return coords[:, :2] if coords.ndim == 2 else np.empty((0, 2))
+
+
+def flatten_rings(rings_per_feature):
+    """
+    Flatten [[ring, ...], ...] into (positions, ring_offsets, feature_offsets).
+
+    positions is (V, 2) with every ring's vertices back to back; ring_offsets
+    (R + 1,) indexes positions where each ring starts and feature_offsets
+    (F + 1,) indexes ring_offsets where each feature starts.
+    """
+    ring_lengths = np.fromiter((len(ring) for feature in rings_per_feature for ring in feature), dtype=np.int64)
+    rings_per = np.fromiter((len(feature) for feature in rings_per_feature), dtype=np.int64,
+                            count=len(rings_per_feature))
+
+    # Fast path for plain [x, y] vertices: stream every number into one array
+    chain = itertools.chain.from_iterable
+    flat = np.fromiter(chain(chain(chain(rings_per_feature))), dtype=float)
+    if len(flat) == 2 * ring_lengths.sum():
+        positions = flat.reshape(-1, 2)
+    else:
+        # Vertices carry z or m values
+        rings = [_ring_array(ring) for feature in rings_per_feature for ring in feature]
+        positions = np.concatenate(rings) if rings else np.empty((0, 2))
+    ring_offsets = np.concatenate([[0], np.cumsum(ring_lengths)])
+    feature_offsets = np.concatenate([[0], np.cumsum(rings_per)])
+    return positions, ring_offsets, feature_offsets
+
+
+def _segment_sums(values, offsets):
+    """
+    Sums of values over consecutive segments [offsets[i], offsets[i + 1]),
+    with 0 for empty segments (which np.add.reduceat gets wrong).
+    """
+    lengths = np.diff(offsets)
+    sums = np.zeros((len(lengths),) + values.shape[1:])
+    nonempty = lengths > 0
+    if nonempty.any():
+        sums[nonempty] = np.add.reduceat(values, offsets[:-1][nonempty], axis=0)
+    return sums
+
+
+def ring_moments(positions, ring_offsets):
+    """
+    Signed area and first moments (sum of A_i * centroid_i) of every ring,
+    by the shoelace formula.
+
+    Rings may be closed (first vertex repeated) or open. Each ring is shifted
+    to its first vertex before the cross products, which keeps the sums
+    accurate far from the origin. Returns (signed_area, moment_x, moment_y),
+    each (R,).
+    """
+    lengths = np.diff(ring_offsets)
+    n_rings = len(lengths)
+    if len(positions) == 0:
+        zeros = np.zeros(n_rings)
+        return zeros, zeros.copy(), zeros.copy()
+
+    starts = ring_offsets[:-1]
+    nonempty = lengths > 0
+    origin = np.zeros((n_rings, 2))
+    origin[nonempty] = positions[starts[nonempty]]
+    local = positions - np.repeat(origin, lengths, axis=0)
+
+    # Next vertex of each vertex, wrapping at the end of each ring
+    following = np.roll(local, -1, axis=0)
+    following[ring_offsets[1:][nonempty] - 1] = 0  # the ring's first vertex, shifted to the origin
+
+    x0, y0 = local[:, 0], local[:, 1]
+    x1, y1 = following[:, 0], following[:, 1]
+    cross = x0 * y1 - x1 * y0
+    terms = np.column_stack([cross, (x0 + x1) * cross, (y0 + y1) * cross])
+    sums = _segment_sums(terms, ring_offsets)
+
+    signed_area = sums[:, 0] / 2
+    # Undo the shift: each ring's moment about the origin
+    moment_x = sums[:, 1] / 6 + signed_area * origin[:, 0]
+    moment_y = sums[:, 2] / 6 + signed_area * origin[:, 1]
+    return signed_area, moment_x, moment_y
+
+
+def polygon_stats(positions, ring_offsets, feature_offsets):
+    """
+    Areas, area-weighted centroids and bounding boxes of every feature.
+
+    Holes are handled through the winding order: a hole winds opposite to its
+    exterior ring, so its signed area and moments cancel out part of the
+    exterior's when the rings of a feature are summed (Esri rings: exteriors
+    clockwise, holes counter-clockwise). Features whose rings enclose no
+    area fall back to the mean of their vertices.
+    """
+    n_features = len(feature_offsets) - 1
+    signed_area, moment_x, moment_y = ring_moments(positions, ring_offsets)
+
+    rings = np.column_stack([signed_area, moment_x, moment_y])
+    area, sum_x, sum_y = _segment_sums(rings, feature_offsets).T
+
+    vertex_offsets = ring_offsets[feature_offsets]
+    vertex_counts = np.diff(vertex_offsets)
+    has_vertices = vertex_counts > 0
+
+    centroids = np.full((n_features, 2), np.nan)
+    bounds = np.full((n_features, 4), np.nan)
+    if has_vertices.any():
+        starts = vertex_offsets[:-1][has_vertices]
+        bounds[has_vertices, :2] = np.minimum.reduceat(positions, starts, axis=0)
+        bounds[has_vertices, 2:] = np.maximum.reduceat(positions, starts, axis=0)
+
+        means = _segment_sums(positions, vertex_offsets) / np.maximum(vertex_counts, 1)[:, None]
+        # Relative tolerance, so tiny but real polygons keep their true centroid
+        scale = np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+        weighted = has_vertices & (np.abs(area) > 1e-12 * np.nan_to_num(scale) ** 2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centroids[:, 0] = np.where(weighted, sum_x / area, means[:, 0])
+            centroids[:, 1] = np.where(weighted, sum_y / area, means[:, 1])
+        centroids[~has_vertices] = np.nan
+
+    return PolygonStats(np.abs(area), centroids, bounds)
+
+
+def rings_stats(rings_per_feature):
+    """
+    polygon_stats for features given as nested ring lists.
+    """
+    return polygon_stats(*flatten_rings(rings_per_feature))
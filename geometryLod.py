@@ -0,0 +1,87 @@
+# geometryLod.py
+
+import math
+
+import numpy as np
+import shapely
+
+# Zoom levels that get their own simplified copy of the geometry. A map view
+# uses the finest level at or below its own zoom.
+LOD_ZOOMS = [1, 3, 5, 7, 9]
+# Simplification tolerance as a fraction of a screen pixel
+PIXEL_TOLERANCE = 0.5
+
+
+def degrees_per_pixel(zoom):
+    """
+    Width of one 256px-tile pixel in degrees of longitude at the given zoom.
+    """
+    return 360 / (256 * 2 ** zoom)
+
+
+def level_params(zoom):
+    """
+    Simplification tolerance (degrees) and coordinate decimals for a zoom level.
+    """
+    tolerance = degrees_per_pixel(zoom) * PIXEL_TOLERANCE
+    decimals = max(0, math.ceil(-math.log10(tolerance)))
+    return tolerance, decimals
+
+
+def pick_level(zoom, levels=LOD_ZOOMS):
+    """
+    The finest pyramid level that is not more detailed than the view needs.
+    """
+    candidates = [level for level in levels if level <= zoom]
+    return max(candidates) if candidates else min(levels)
+
+
+def simplify_rings(rings, zoom):
+    """
+    Simplify and quantize a list of rings for one zoom level.
+
+    Each ring is simplified on its own with topology preservation, so rings stay
+    valid (no self-intersections); rings that collapse to nothing are dropped.
+    Coordinates are rounded to the level's precision and repeated points removed.
+    """
+    if not rings:
+        return []
+    tolerance, decimals = level_params(zoom)
+    polygons = [shapely.Polygon(np.asarray(ring, dtype=float)[:, :2]) for ring in rings if len(ring) >= 4]
+    if not polygons:
+        return []
+    simplified = shapely.simplify(np.array(polygons, dtype=object), tolerance, preserve_topology=True)
+
+    out = []
+    for geom in simplified:
+        for part in getattr(geom, "geoms", [geom]):
+            if part.is_empty or part.geom_type != "Polygon":
+                continue
+            coords = np.round(np.asarray(part.exterior.coords), decimals)
+            keep = np.ones(len(coords), dtype=bool)
+            keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+            coords = coords[keep]
+            if len(coords) >= 4:
+                out.append(coords.tolist())
+    return out
+
+
+def build_lod_level(entries, zoom, rings_key="rings"):
+    """
+    Copies of entries with their rings simplified for one zoom level.
+
+    Entries whose rings disappear entirely at this level are left out.
+    """
+    level = []
+    for entry in entries:
+        rings = simplify_rings(entry[rings_key], zoom)
+        if rings:
+            level.append(dict(entry, **{rings_key: rings}))
+    return level
+
+
+def build_lod_pyramid(entries, zooms=LOD_ZOOMS, rings_key="rings"):
+    """
+    Build {zoom: simplified entries} for every pyramid level.
+    """
+    return {zoom: build_lod_level(entries, zoom, rings_key) for zoom in zooms}
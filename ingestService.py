@@ -0,0 +1,283 @@
+# ingestService.py
+#
+# Background ingestion: each registered source is polled on its own schedule
+# and its parsed result is published as an immutable, versioned snapshot.
+# Pages only read the latest snapshot, so a rerun never waits on upstream
+# services (except for the very first load of a source).
+#
+# Runs as threads inside the Streamlit process by default. To run it as its
+# own process instead, start
+#
+#   python -m ingestService
+#
+# and set FARMVIS_INGEST=external for the app; pages then read the snapshots
+# that process persists to the shared feature cache.
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+
+from featureCache import get_cache
+
+# "thread" runs the sources in this process; "external" reads snapshots
+# published by a separate `python -m ingestService` process
+INGEST_MODE = os.getenv("FARMVIS_INGEST", "thread")
+# How long a page waits for the first snapshot of a source (seconds)
+FIRST_LOAD_TIMEOUT = 60
+# Delay before retrying a failed load; doubles per failure up to the interval
+RETRY_DELAY = 15
+# How often external-mode readers look for a newer persisted snapshot
+SNAPSHOT_POLL = 5
+# Persisted snapshots outlive their schedule so a restart starts warm
+SNAPSHOT_TTL = 7 * 24 * 3600
+# Threads for loads pages request but never wait on (see submit_load)
+LOAD_WORKERS = 2
+
+
+class Snapshot(NamedTuple):
+    """
+    One published result of a source. data must be treated as read-only:
+    every page rendering this version shares the same object.
+    """
+    name: str
+    version: int
+    data: Any
+    fetched_at: float
+    seconds: float
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class Source(NamedTuple):
+    name: str
+    load: Any
+    interval: float
+
+
+_sources = {}
+
+
+def register_source(name, load, interval):
+    """
+    Declare a source: load() returns the parsed data (falsy means nothing
+    usable yet) and is called every interval seconds.
+    """
+    _sources[name] = Source(name, load, interval)
+
+
+class IngestService:
+    """
+    Polls registered sources on background threads and publishes snapshots.
+
+    A source's thread starts the first time the source is read (or on
+    start()), so sources registered by lazily imported modules are picked up
+    too. Publishing swaps the snapshot reference under a lock, so readers see
+    either the previous or the new version, never a partial one. Failed loads
+    keep the previous snapshot and are retried with backoff. Snapshots are
+    also persisted to the feature cache, which seeds the service after a
+    restart and lets external-mode processes read them.
+    """
+
+    def __init__(self, sources=None, persist=True):
+        # Defaults to the live registry, so later registrations are visible
+        self.sources = _sources if sources is None else sources
+        self.persist = persist
+        self._snapshots = {}
+        self._published = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = {}
+
+    def start(self, names=None):
+        for name in list(self.sources) if names is None else names:
+            self._ensure(name)
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _ensure(self, name):
+        with self._published:
+            if name in self._threads or name not in self.sources:
+                return
+            persisted = read_persisted(name) if self.persist else None
+            if persisted is not None:
+                self._snapshots[name] = persisted
+            thread = threading.Thread(target=self._run, args=(name,), name=f"ingest-{name}", daemon=True)
+            self._threads[name] = thread
+        thread.start()
+
+    def _run(self, name):
+        source = self.sources[name]
+        failures = 0
+        while not self._stop.is_set():
+            snapshot = self._snapshots.get(name)
+            due = 0 if snapshot is None else snapshot.fetched_at + source.interval - time.time()
+            if failures:
+                due = min(RETRY_DELAY * 2 ** (failures - 1), source.interval)
+            if due > 0 and self._stop.wait(due):
+                return
+            failures = 0 if self.refresh(name) else failures + 1
+
+    def refresh(self, name):
+        """
+        Load a source now and publish the result. Returns True on success.
+        """
+        source = self.sources[name]
+        start = time.time()
+        try:
+            data = source.load()
+        except Exception:
+            print(f"Ingest of {name} failed:")
+            traceback.print_exc()
+            return False
+        if not data:
+            print(f"Ingest of {name} returned no data; keeping the previous snapshot")
+            return False
+        self.publish(name, data, start, time.time() - start)
+        return True
+
+    def publish(self, name, data, fetched_at=None, seconds=0.0):
+        # Only the source's own thread publishes it, so the version can't race
+        previous = self._snapshots.get(name)
+        snapshot = Snapshot(name, previous.version + 1 if previous else 1, data,
+                            time.time() if fetched_at is None else fetched_at, seconds)
+        if self.persist:
+            # Persist first, so other processes never lag behind this one
+            write_persisted(snapshot)
+        with self._published:
+            self._snapshots[name] = snapshot
+            self._published.notify_all()
+        return snapshot
+
+    def latest(self, name, timeout=FIRST_LOAD_TIMEOUT):
+        """
+        Latest snapshot of a source. Only waits (up to timeout) when nothing
+        has been published yet; returns None if it is still not there.
+        """
+        self._ensure(name)
+        with self._published:
+            self._published.wait_for(lambda: name in self._snapshots, timeout)
+            return self._snapshots.get(name)
+
+
+def _meta_key(name):
+    return f"snapshot/{name}", {}
+
+
+def _data_key(snapshot):
+    return f"snapshot/{snapshot.name}/data", {"version": snapshot.version}
+
+
+def write_persisted(snapshot):
+    cache = get_cache()
+    cache.set(*_data_key(snapshot), snapshot.data, ttl=SNAPSHOT_TTL)
+    # The small metadata entry goes last so readers never see a version
+    # whose data isn't stored yet
+    cache.set(*_meta_key(snapshot.name), snapshot._replace(data=None), ttl=SNAPSHOT_TTL)
+
+
+def read_persisted(name, current=None):
+    """
+    Persisted snapshot of a source, or None. When current already holds the
+    persisted version it is returned as is, without loading the data again.
+    """
+    cache = get_cache()
+    meta = cache.get(*_meta_key(name))
+    if meta is None:
+        return None
+    if current is not None and current.version == meta.version and current.fetched_at == meta.fetched_at:
+        return current
+    data = cache.get(*_data_key(meta))
+    return None if data is None else meta._replace(data=data)
+
+
+class SnapshotReader:
+    """
+    Reader for snapshots published by an external ingest process.
+    """
+
+    def __init__(self, poll=SNAPSHOT_POLL):
+        self.poll = poll
+        self._snapshots = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def latest(self, name, timeout=FIRST_LOAD_TIMEOUT):
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                if time.time() - self._checked.get(name, 0) >= self.poll:
+                    snapshot = read_persisted(name, self._snapshots.get(name))
+                    if snapshot is not None:
+                        self._snapshots[name] = snapshot
+                    self._checked[name] = time.time()
+                snapshot = self._snapshots.get(name)
+            if snapshot is not None or time.time() >= deadline:
+                return snapshot
+            time.sleep(min(self.poll, max(0, deadline - time.time())))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ingest_service():
+    """
+    Process-wide snapshot provider: a running IngestService in thread mode,
+    or a SnapshotReader in external mode.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SnapshotReader() if INGEST_MODE == "external" else IngestService()
+        return _service
+
+
+def latest_snapshot(name, timeout=FIRST_LOAD_TIMEOUT):
+    return get_ingest_service().latest(name, timeout)
+
+
+_load_pool = ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix="ingest-load")
+
+
+def submit_load(load, *args):
+    """
+    Run load(*args) on the ingest threads and return its Future, for data a
+    page shows once it is in rather than waiting for it. The Future's result
+    is None if load raised.
+    """
+    def run():
+        try:
+            return load(*args)
+        except Exception:
+            print(f"Load {getattr(load, '__name__', load)} failed:")
+            traceback.print_exc()
+            return None
+    return _load_pool.submit(run)
+
+
+def main():
+    # Importing the data modules registers their sources
+    import droughtData  # noqa: F401
+    import warningsData  # noqa: F401
+
+    service = IngestService().start()
+    print(f"Ingesting {', '.join(service.sources)}; Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(60)
+            for name in service.sources:
+                snapshot = service.latest(name, timeout=0)
+                if snapshot:
+                    print(f"{name}: v{snapshot.version}, {snapshot.age:.0f}s old, loaded in {snapshot.seconds:.1f}s")
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
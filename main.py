@@ -1,37 +1,63 @@
 # main_app.py
 
+import importlib
+
 import streamlit as st
-from views.prefs import farm_information_form
-from views.dashboard import main
-from views.about import main as a_main
-from views.warningsMap import display_event_map, display_event_key
-from views.droughtMap import display_drought_map, display_drought_key
-from views.soilMoistureMap import embed_arcgis_map
-from PIL import Image
-st.sidebar.image(Image.open('assets/icon-min.png'))
+
+import timing
+
+st.set_page_config(
+    layout='wide'
+)
+
+# Each page is a list of "module:function" targets. Modules are imported only
+# when their page is opened, so a rerun never pays for the dependencies of
+# pages that aren't shown
+PAGES = {
+    "Preferences": ["views.prefs:farm_information_form"],
+    "Dashboard": ["views.dashboard:main"],
+    "About": ["views.about:main"],
+}
+MAP_PAGES = {
+    "Event Map": ["views.warningsMap:display_saved_event_map", "views.warningsMap:display_event_key"],
+    "Drought Map": ["views.droughtMap:display_drought_map", "views.droughtMap:display_drought_key"],
+    "Soil Moisture Map": ["views.soilMoistureMap:embed_arcgis_map"],
+}
+
+
+def load_view(target):
+    """
+    Import a view's module on first use and return the named function.
+    """
+    module_name, _, function_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def show_page(targets):
+    for target in targets:
+        load_view(target)()
+
+
+st.sidebar.image('assets/icon-min.png')
 st.sidebar.title("Navigation & Personalization")
 options = st.sidebar.radio("Go to", ("Preferences", "Dashboard", "Maps", "About"))
 
-if options == "Dashboard":
-    main()
-elif options == "About":
-    a_main()
-elif options == "Preferences":
-    farm_information_form()
+if options in PAGES:
+    with timing.collect(options) as spans:
+        show_page(PAGES[options])
 elif options == "Maps":
     st.subheader("Choose a Map to Display")
-    map_options = st.radio("Select Map", ("Event Map", "Drought Map", "Soil Moisture Map"))
+    map_options = st.radio("Select Map", tuple(MAP_PAGES))
+
+    if map_options == "Soil Moisture Map":
+        st.markdown("This map shows soil moisture data.")
+
+    with timing.collect(map_options) as spans:
+        show_page(MAP_PAGES[map_options])
 
     if map_options == "Event Map":
-        display_event_map()
-        display_event_key()
-        
         st.markdown("This map shows warnings for different events.")
-    elif map_options == "Drought Map":
-        display_drought_map()
-        display_drought_key()
-        
-    elif map_options == "Soil Moisture Map":
-        st.markdown("This map shows soil moisture data.")
-        embed_arcgis_map()
-        
+
+# Per-stage timings of this rerun, with FARMVIS_DEBUG=1 or ?debug=1
+if timing.DEBUG_PANEL or st.query_params.get("debug") == "1":
+    load_view("views.debugPanel:display_timings")(spans)
@@ -0,0 +1,332 @@
+# pbfDecoder.py
+#
+# Decoder for ArcGIS FeatureServer query results in f=pbf, the quantized
+# Protocol Buffer FeatureCollection format. A result is decoded straight into
+# a vertex array with ring/part offsets (the layout geometryKernel works on)
+# and one list per attribute field, without building a dict per feature.
+# esri_features and geojson_features turn a result back into the features
+# the f=json and f=geojson queries return, for code that works on those.
+#
+# The message classes are built at runtime from the schema below with the
+# protobuf package (a Streamlit dependency); without it, available() is
+# False and callers should query in JSON.
+
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from geometryKernel import ring_moments
+
+GEOMETRY_TYPES = {
+    0: "esriGeometryPoint",
+    1: "esriGeometryMultipoint",
+    2: "esriGeometryPolyline",
+    3: "esriGeometryPolygon",
+    4: "esriGeometryMultipatch",
+    127: "esriGeometryNone",
+}
+# Transform.quantizeOriginPostion: y grows downwards from the origin unless lowerLeft
+LOWER_LEFT = 1
+
+# esriPBuffer.FeatureCollectionPBuffer, as {message: [(field, number, type, label)]}.
+# Enums are read as plain integers, which is the same on the wire. Fields
+# sharing a oneof are listed in ONEOFS.
+SCHEMA = {
+    "SpatialReference": [("wkid", 1, "uint32"), ("lastestWkid", 2, "uint32"), ("vcsWkid", 3, "uint32"),
+                         ("latestVcsWkid", 4, "uint32"), ("wkt", 5, "string")],
+    "Field": [("name", 1, "string"), ("fieldType", 2, "int32"), ("alias", 3, "string"), ("sqlType", 4, "int32"),
+              ("domain", 5, "string"), ("defaultValue", 6, "string")],
+    "Value": [("string_value", 1, "string"), ("float_value", 2, "float"), ("double_value", 3, "double"),
+              ("sint_value", 4, "sint32"), ("uint_value", 5, "uint32"), ("int64_value", 6, "int64"),
+              ("uint64_value", 7, "uint64"), ("sint64_value", 8, "sint64"), ("bool_value", 9, "bool")],
+    "Geometry": [("lengths", 2, "uint32", "repeated"), ("coords", 3, "sint64", "repeated")],
+    "esriShapeBuffer": [("bytes", 1, "bytes")],
+    "Feature": [("attributes", 1, "Value", "repeated"), ("geometry", 2, "Geometry"),
+                ("shapeBuffer", 3, "esriShapeBuffer"), ("centroid", 4, "Geometry")],
+    "UniqueIdField": [("name", 1, "string"), ("isSystemMaintained", 2, "bool")],
+    "GeometryProperties": [("shapeAreaFieldName", 1, "string"), ("shapeLengthFieldName", 2, "string"),
+                           ("units", 3, "string")],
+    "ServerGens": [("minServerGen", 1, "uint64"), ("serverGen", 2, "uint64")],
+    "Scale": [("xScale", 1, "double"), ("yScale", 2, "double"), ("mScale", 3, "double"), ("zScale", 4, "double")],
+    "Translate": [("xTranslate", 1, "double"), ("yTranslate", 2, "double"), ("mTranslate", 3, "double"),
+                  ("zTranslate", 4, "double")],
+    "Transform": [("quantizeOriginPostion", 1, "int32"), ("scale", 2, "Scale"), ("translate", 3, "Translate")],
+    "FeatureResult": [("objectIdFieldName", 1, "string"), ("uniqueIdField", 2, "UniqueIdField"),
+                      ("globalIdFieldName", 3, "string"), ("geohashFieldName", 4, "string"),
+                      ("geometryProperties", 5, "GeometryProperties"), ("serverGens", 6, "ServerGens"),
+                      ("geometryType", 7, "int32"), ("spatialReference", 8, "SpatialReference"),
+                      ("exceededTransferLimit", 9, "bool"), ("hasZ", 10, "bool"), ("hasM", 11, "bool"),
+                      ("transform", 12, "Transform"), ("fields", 13, "Field", "repeated"),
+                      ("values", 14, "Value", "repeated"), ("features", 15, "Feature", "repeated")],
+    "CountResult": [("count", 1, "uint64")],
+    "ObjectIdsResult": [("objectIdFieldName", 1, "string"), ("serverGens", 2, "ServerGens"),
+                        ("objectIds", 3, "uint64", "repeated")],
+    "QueryResult": [("featureResult", 1, "FeatureResult"), ("countResult", 2, "CountResult"),
+                    ("idsResult", 3, "ObjectIdsResult")],
+}
+ONEOFS = {
+    "Value": ("value_type", {"string_value", "float_value", "double_value", "sint_value", "uint_value",
+                             "int64_value", "uint64_value", "sint64_value", "bool_value"}),
+    "Feature": ("compressed_geometry", {"geometry", "shapeBuffer"}),
+    "QueryResult": ("Results", {"featureResult", "countResult", "idsResult"}),
+}
+
+_message_class = None
+_message_lock = threading.Lock()
+
+
+def _build_message_class():
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+    field = descriptor_pb2.FieldDescriptorProto
+    scalars = {
+        "string": field.TYPE_STRING, "bytes": field.TYPE_BYTES, "bool": field.TYPE_BOOL,
+        "float": field.TYPE_FLOAT, "double": field.TYPE_DOUBLE, "int32": field.TYPE_INT32,
+        "uint32": field.TYPE_UINT32, "sint32": field.TYPE_SINT32, "int64": field.TYPE_INT64,
+        "uint64": field.TYPE_UINT64, "sint64": field.TYPE_SINT64,
+    }
+    file = descriptor_pb2.FileDescriptorProto(name="FeatureCollection.proto", package="esriPBuffer",
+                                              syntax="proto3")
+    root = file.message_type.add(name="FeatureCollectionPBuffer")
+    root.field.add(name="version", number=1, type=field.TYPE_STRING, label=field.LABEL_OPTIONAL)
+    root.field.add(name="queryResult", number=2, type=field.TYPE_MESSAGE, label=field.LABEL_OPTIONAL,
+                   type_name=".esriPBuffer.FeatureCollectionPBuffer.QueryResult")
+    for name, fields in SCHEMA.items():
+        message = root.nested_type.add(name=name)
+        oneof, members = ONEOFS.get(name, (None, ()))
+        if oneof:
+            message.oneof_decl.add(name=oneof)
+        for field_name, number, kind, *label in fields:
+            added = message.field.add(name=field_name, number=number,
+                                      label=field.LABEL_REPEATED if label else field.LABEL_OPTIONAL)
+            if kind in scalars:
+                added.type = scalars[kind]
+            else:
+                added.type = field.TYPE_MESSAGE
+                added.type_name = f".esriPBuffer.FeatureCollectionPBuffer.{kind}"
+            if field_name in members:
+                added.oneof_index = 0
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName("esriPBuffer.FeatureCollectionPBuffer"))
+
+
+def message_class():
+    """
+    The FeatureCollectionPBuffer message class, built on first use. Raises
+    ImportError without the protobuf package.
+    """
+    global _message_class
+    with _message_lock:
+        if _message_class is None:
+            _message_class = _build_message_class()
+        return _message_class
+
+
+def available():
+    try:
+        message_class()
+    except ImportError:
+        return False
+    return True
+
+
+class PbfFeatures(NamedTuple):
+    """
+    One decoded f=pbf query result, feature i spanning
+    part_offsets[feature_offsets[i]:feature_offsets[i + 1] + 1].
+
+    geometry_type: Esri geometry type name, e.g. esriGeometryPolygon
+    object_id_field: name of the OBJECTID field
+    columns: {field name: [value per feature]}, None where a value is missing
+    positions: (V, 2) x/y of every vertex back to back, in the output
+        spatial reference (z and m values are dropped)
+    part_offsets: (P + 1,) where each ring, path or point set starts in
+        positions (ring_offsets for geometryKernel.polygon_stats)
+    feature_offsets: (F + 1,) where each feature's parts start in part_offsets
+    centroids: (F, 2) centroids sent with returnCentroid, NaN where missing;
+        None if the response has none
+    exceeded_transfer_limit: more features match than the response holds
+    """
+    geometry_type: str
+    object_id_field: str
+    columns: dict
+    positions: np.ndarray
+    part_offsets: np.ndarray
+    feature_offsets: np.ndarray
+    centroids: np.ndarray
+    exceeded_transfer_limit: bool
+
+    @property
+    def size(self):
+        return len(self.feature_offsets) - 1
+
+
+def _value(value):
+    kind = value.WhichOneof("value_type")
+    return getattr(value, kind) if kind else None
+
+
+def _dequantize(quantized, transform):
+    """
+    x/y of quantized vertices ((V, 2+) integers) under the result's transform.
+    """
+    positions = quantized[:, :2].astype(float)
+    if transform is None:
+        return positions
+    scale, translate = transform.scale, transform.translate
+    positions[:, 0] = translate.xTranslate + scale.xScale * positions[:, 0]
+    if transform.quantizeOriginPostion == LOWER_LEFT:
+        positions[:, 1] = translate.yTranslate + scale.yScale * positions[:, 1]
+    else:
+        positions[:, 1] = translate.yTranslate - scale.yScale * positions[:, 1]
+    return positions
+
+
+def decode(data):
+    """
+    Decode the body of an f=pbf feature query. Raises ValueError if it isn't
+    one (an ids-only or count-only result, or not a FeatureCollection).
+    """
+    from google.protobuf.message import DecodeError
+
+    message = message_class()()
+    try:
+        message.ParseFromString(data)
+    except DecodeError as e:
+        raise ValueError(f"Not a pbf FeatureCollection: {e}") from e
+    if not message.queryResult.HasField("featureResult"):
+        raise ValueError("The pbf response holds no features")
+    result = message.queryResult.featureResult
+    features = result.features
+    dims = 2 + result.hasZ + result.hasM
+
+    # Vertex counts of every part; a geometry without lengths is one part
+    part_lengths = []
+    parts_per_feature = np.zeros(len(features), dtype=np.int64)
+    coords = []
+    for i, feature in enumerate(features):
+        geometry = feature.geometry
+        lengths = list(geometry.lengths) or ([len(geometry.coords) // dims] if geometry.coords else [])
+        part_lengths.extend(lengths)
+        parts_per_feature[i] = len(lengths)
+        coords.append(geometry.coords)
+    flat = np.fromiter((c for geometry_coords in coords for c in geometry_coords), dtype=np.int64)
+    part_offsets = np.concatenate([[0], np.cumsum(part_lengths, dtype=np.int64)])
+    feature_offsets = np.concatenate([[0], np.cumsum(parts_per_feature)])
+
+    # Coordinates are deltas from the previous vertex of the same geometry
+    quantized = np.cumsum(flat.reshape(-1, dims), axis=0)
+    vertex_offsets = part_offsets[feature_offsets]
+    starts = vertex_offsets[:-1]
+    counts = np.diff(vertex_offsets)
+    before = np.zeros((len(features), dims), dtype=np.int64)
+    later = starts > 0
+    before[later] = quantized[starts[later] - 1]
+    quantized -= np.repeat(before, counts, axis=0)
+    transform = result.transform if result.HasField("transform") else None
+    positions = _dequantize(quantized, transform)
+
+    centroids = None
+    if any(feature.HasField("centroid") for feature in features):
+        centroid = np.zeros((len(features), dims), dtype=np.int64)
+        present = np.zeros(len(features), dtype=bool)
+        for i, feature in enumerate(features):
+            if len(feature.centroid.coords) >= 2:
+                centroid[i, :2] = feature.centroid.coords[:2]
+                present[i] = True
+        centroids = _dequantize(centroid, transform)
+        centroids[~present] = np.nan
+
+    names = [field.name for field in result.fields]
+    columns = {name: [None] * len(features) for name in names}
+    lists = [columns[name] for name in names]
+    for i, feature in enumerate(features):
+        for column, value in zip(lists, feature.attributes):
+            column[i] = _value(value)
+
+    return PbfFeatures(GEOMETRY_TYPES.get(result.geometryType, "esriGeometryNone"), result.objectIdFieldName,
+                       columns, positions, part_offsets, feature_offsets, centroids,
+                       result.exceededTransferLimit)
+
+
+def _feature_parts(result):
+    """
+    Yield (attributes, [part vertex lists]) per feature.
+    """
+    positions = result.positions.tolist()
+    parts = result.part_offsets.tolist()
+    features = result.feature_offsets.tolist()
+    names = list(result.columns)
+    columns = [result.columns[name] for name in names]
+    for i in range(result.size):
+        attributes = dict(zip(names, (column[i] for column in columns)))
+        yield attributes, [positions[parts[p]:parts[p + 1]] for p in range(features[i], features[i + 1])]
+
+
+def esri_features(result):
+    """
+    Yield the result's features as f=json returns them.
+    """
+    key = {"esriGeometryPolygon": "rings", "esriGeometryPolyline": "paths"}.get(result.geometry_type)
+    centroids = result.centroids.tolist() if result.centroids is not None else None
+    for i, (attributes, parts) in enumerate(_feature_parts(result)):
+        feature = {"attributes": attributes}
+        if parts:
+            if result.geometry_type == "esriGeometryPoint":
+                x, y = parts[0][0]
+                feature["geometry"] = {"x": x, "y": y}
+            elif result.geometry_type == "esriGeometryMultipoint":
+                feature["geometry"] = {"points": [point for part in parts for point in part]}
+            elif key:
+                feature["geometry"] = {key: parts}
+        if centroids is not None and centroids[i][0] == centroids[i][0]:
+            feature["centroid"] = {"x": centroids[i][0], "y": centroids[i][1]}
+        yield feature
+
+
+def _geojson_polygon(rings, signed_areas):
+    """
+    GeoJSON geometry for Esri rings: each clockwise ring starts a polygon and
+    the counter-clockwise rings after it are its holes.
+    """
+    if all(area >= 0 for area in signed_areas):
+        # Rings with the opposite winding; treat them all as exteriors
+        signed_areas = [-1] * len(rings)
+    polygons = []
+    for ring, area in zip(rings, signed_areas):
+        if area < 0 or not polygons:
+            polygons.append([ring])
+        else:
+            polygons[-1].append(ring)
+    if len(polygons) == 1:
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def geojson_features(result):
+    """
+    Yield the result's features as f=geojson returns them, except that rings
+    keep the Esri winding (exteriors clockwise).
+    """
+    signed_areas = None
+    if result.geometry_type == "esriGeometryPolygon":
+        signed_areas = ring_moments(result.positions, result.part_offsets)[0].tolist()
+    feature_offsets = result.feature_offsets.tolist()
+    for i, (properties, parts) in enumerate(_feature_parts(result)):
+        geometry = None
+        if parts:
+            if result.geometry_type == "esriGeometryPoint":
+                geometry = {"type": "Point", "coordinates": parts[0][0]}
+            elif result.geometry_type == "esriGeometryMultipoint":
+                geometry = {"type": "MultiPoint", "coordinates": [point for part in parts for point in part]}
+            elif result.geometry_type == "esriGeometryPolyline":
+                geometry = ({"type": "LineString", "coordinates": parts[0]} if len(parts) == 1
+                            else {"type": "MultiLineString", "coordinates": parts})
+            elif signed_areas is not None:
+                areas = signed_areas[feature_offsets[i]:feature_offsets[i + 1]]
+                geometry = _geojson_polygon(parts, areas)
+        yield {"type": "Feature", "id": properties.get(result.object_id_field), "geometry": geometry,
+               "properties": properties}
@@ -0,0 +1,252 @@
+# riskEngine.py
+#
+# Flood and drought risk for a location, from the latest drought and warnings
+# snapshots. Both datasets are indexed once per snapshot pair and the index is
+# shared by every session, so a lookup is a couple of STRtree queries.
+
+import math
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+from clusterEngine import EARTH_RADIUS_KM
+from droughtData import drought_categories, get_drought_layer
+from ingestService import FIRST_LOAD_TIMEOUT, latest_snapshot
+from gazetteer import unit_vectors
+from tileServer import esri_polygon
+import timing
+import warningsData  # noqa: F401 (registers the "warnings" source)
+
+# Warnings within this distance (km) count towards the flood score
+RISK_RADIUS_KM = 50.0
+# A warning's contribution halves every FLOOD_HALF_DISTANCE_KM from the location
+FLOOD_HALF_DISTANCE_KM = 15.0
+
+# Probability of flooding implied by a warning of each type at the location.
+# Priors from the NWS product definitions (warning: occurring or imminent,
+# watch: possible, advisory/statement: minor or ongoing), to be tuned against
+# observed outcomes. Events not listed don't affect the flood score.
+FLOOD_EVENT_WEIGHTS = {
+    "Flash Flood Warning": 0.9,
+    "Flood Warning": 0.8,
+    "Flash Flood Watch": 0.5,
+    "Flood Watch": 0.45,
+    "Flash Flood Statement": 0.35,
+    "Flood Advisory": 0.3,
+    "Flood Statement": 0.25,
+    "Hydrologic Advisory": 0.15,
+    "Low Water Advisory": 0.1,
+    "Hydrologic Outlook": 0.1,
+}
+# Drought score for each USDM category containing the location (index = dm);
+# outside every drought area the score is DROUGHT_BASELINE
+DROUGHT_LEVEL_SCORES = [0.3, 0.5, 0.7, 0.85, 0.95]
+DROUGHT_BASELINE = 0.05
+
+
+class RiskAssessment(NamedTuple):
+    """
+    flood_score, drought_score: probabilities in [0, 1]
+    drought_level: highest USDM category (0-4) containing the location, or None
+    drought_label: label of that category, or "None"
+    nearest_warning_km: distance to the nearest warning, or None if none is
+        within the radius
+    warnings: (event, km, cluster_id) of warnings within the radius, nearest first
+    clusters: number of distinct warning clusters within the radius
+    """
+    flood_score: float
+    drought_score: float
+    drought_level: object
+    drought_label: str
+    nearest_warning_km: object
+    warnings: list
+    clusters: int
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def km_envelope(lat, lon, radius_km):
+    """
+    Lon/lat box containing every point within radius_km of (lat, lon).
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    dlon = min(180.0, dlat / cos_lat)
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+def flood_score(events, distances, clusters):
+    """
+    Combine nearby warnings into one probability.
+
+    Each warning is an independent chance of flooding (noisy-OR), weighted by
+    its event type and decayed with distance. Warnings in the same DBSCAN
+    cluster describe the same storm system, so each cluster only counts its
+    strongest warning; unclustered warnings (-1) count individually.
+    """
+    weights = np.array([FLOOD_EVENT_WEIGHTS.get(event, 0.0) for event in events])
+    chances = weights * 0.5 ** (np.asarray(distances) / FLOOD_HALF_DISTANCE_KM)
+    strongest = {}
+    for i, (chance, cluster) in enumerate(zip(chances, clusters)):
+        key = ("noise", i) if cluster < 0 else cluster
+        strongest[key] = max(strongest.get(key, 0.0), chance)
+    return float(1 - np.prod([1 - chance for chance in strongest.values()]))
+
+
+class RiskIndex:
+    """
+    STRtrees over the drought polygons of one drought snapshot and the
+    warning locations of one warnings snapshot. Read-only once built.
+    """
+
+    def __init__(self, drought_entries, warnings, key=None):
+        with timing.span("geometry_build", "risk") as span:
+            self._build(drought_entries, warnings, key)
+            span.add(features=len(drought_entries) + len(warnings))
+
+    def _build(self, drought_entries, warnings, key):
+        self.key = key
+        located = [entry for entry in drought_entries if entry["rings"]]
+        self.drought_levels = np.array(
+            [entry["dm"] if entry["dm"] is not None else -1 for entry in located], dtype=int)
+        self.drought_polygons = np.array([esri_polygon(entry["rings"]) for entry in located], dtype=object)
+        # Prepared, so point-in-polygon tests don't rescan every edge
+        shapely.prepare(self.drought_polygons)
+        self.drought_tree = shapely.STRtree(self.drought_polygons)
+
+        self.latitudes = warnings["latitude"].to_numpy(dtype=float)
+        self.longitudes = warnings["longitude"].to_numpy(dtype=float)
+        self.events = warnings["event_type"].astype(object).to_numpy()
+        if "cluster_id" in warnings:
+            self.clusters = warnings["cluster_id"].to_numpy(dtype=int)
+        else:
+            self.clusters = np.full(len(warnings), -1)
+        self.warning_tree = shapely.STRtree(shapely.points(self.longitudes, self.latitudes))
+        # Nearest-warning searches run on unit-sphere vectors, where straight
+        # line order is great-circle order (planar lon/lat or Mercator
+        # distances pick the wrong warning over several degrees of latitude)
+        self.warning_kdtree = cKDTree(unit_vectors(self.latitudes, self.longitudes))
+
+    def __setstate__(self, state):
+        # Preparation doesn't survive pickling (e.g. into a process pool)
+        self.__dict__.update(state)
+        shapely.prepare(self.drought_polygons)
+
+    def drought_level(self, lat, lon):
+        """
+        Highest drought category (0-4) whose polygon contains the point, or None.
+        """
+        idx = self.drought_tree.query(shapely.Point(lon, lat))
+        idx = idx[shapely.intersects_xy(self.drought_polygons[idx], lon, lat)]
+        levels = self.drought_levels[idx]
+        levels = levels[levels >= 0]
+        return int(levels.max()) if len(levels) else None
+
+    def warnings_within(self, lat, lon, radius_km):
+        """
+        Row indices of warnings within radius_km of the point and their
+        distances, nearest first.
+        """
+        idx = self.warning_tree.query(shapely.box(*km_envelope(lat, lon, radius_km)))
+        distances = haversine_km(lat, lon, self.latitudes[idx], self.longitudes[idx])
+        keep = distances <= radius_km
+        idx, distances = idx[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return idx[order], distances[order]
+
+    def assess_points(self, lats, lons):
+        """
+        Bulk lookups for many locations at once, as arrays matching lats/lons:
+
+        drought_level: highest drought category containing each point, -1 if none
+        nearest_warning: row of the nearest warning, -1 if there are none
+        nearest_warning_km: distance to it, NaN if there are none
+        cluster_id: DBSCAN cluster of that warning, -1 for noise or none
+
+        Rows with missing coordinates get the "none" values.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        n = len(lats)
+        drought_level = np.full(n, -1)
+        nearest = np.full(n, -1)
+        nearest_km = np.full(n, np.nan)
+        valid = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        lats, lons = lats[valid], lons[valid]
+
+        # Bounding-box candidates from the tree, then one bulk point-in-polygon
+        # test against the prepared polygons
+        farm, polygon = self.drought_tree.query(shapely.points(lons, lats))
+        inside = shapely.intersects_xy(self.drought_polygons[polygon], lons[farm], lats[farm])
+        levels = np.full(len(valid), -1)
+        np.maximum.at(levels, farm[inside], self.drought_levels[polygon[inside]])
+        drought_level[valid] = levels
+
+        if len(self.latitudes):
+            chord, warning = self.warning_kdtree.query(unit_vectors(lats, lons))
+            nearest[valid] = warning
+            nearest_km[valid] = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+
+        cluster_id = np.where(nearest >= 0, self.clusters[np.maximum(nearest, 0)] if len(self.clusters) else -1, -1)
+        return {
+            "drought_level": drought_level,
+            "nearest_warning": nearest,
+            "nearest_warning_km": nearest_km,
+            "cluster_id": cluster_id,
+        }
+
+    def assess(self, lat, lon, radius_km=RISK_RADIUS_KM):
+        level = self.drought_level(lat, lon)
+        idx, distances = self.warnings_within(lat, lon, radius_km)
+        events = self.events[idx]
+        clusters = self.clusters[idx]
+        return RiskAssessment(
+            flood_score=flood_score(events, distances, clusters),
+            drought_score=DROUGHT_BASELINE if level is None else DROUGHT_LEVEL_SCORES[level],
+            drought_level=level,
+            drought_label="None" if level is None else drought_categories[f"d{level}"]["label"],
+            nearest_warning_km=float(distances[0]) if len(distances) else None,
+            warnings=[(event, float(km), int(cluster)) for event, km, cluster in zip(events, distances, clusters)],
+            clusters=len({int(c) for c in clusters if c >= 0}),
+        )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_risk_index(timeout=FIRST_LOAD_TIMEOUT):
+    """
+    The RiskIndex of the latest drought and warnings snapshots, rebuilt only
+    when either snapshot changes. None until both have been published
+    (waiting up to timeout seconds in all).
+    """
+    global _index
+    deadline = time.monotonic() + timeout
+    layer = get_drought_layer(timeout)
+    # The warnings wait only gets what is left, so timeout bounds both
+    snapshot = latest_snapshot("warnings", max(0.0, deadline - time.monotonic()))
+    if not layer or not snapshot:
+        return None
+    key = (layer.version, snapshot.version)
+    with _index_lock:
+        if _index is None or _index.key != key:
+            warnings, properties = snapshot.data
+            _index = RiskIndex(layer.entries, warnings, key)
+        return _index
+
+
+def assess_risk(lat, lon, radius_km=RISK_RADIUS_KM, timeout=FIRST_LOAD_TIMEOUT):
+    """
+    RiskAssessment of a location, or None while the data is still loading.
+    """
+    index = get_risk_index(timeout)
+    return None if index is None else index.assess(lat, lon, radius_km)
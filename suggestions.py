@@ -0,0 +1,195 @@
+# suggestions.py
+#
+# Farming suggestions from the chat completions API. Answers are cached under
+# a key of bucketed conditions (conditions_key), so farms in the same grid
+# cell with similar weather and the same farm details share one cached
+# answer; the prompt itself carries the farm's real values. Every answer
+# reports its time to first token and throughput.
+#
+# Set OPENAI_BASE_URL to point the client at another server (e.g. the stub in
+# benchmarks/openaiServerStub.py).
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import timing
+from featureCache import get_cache
+
+SUGGESTION_MODEL = os.getenv("FARMVIS_SUGGESTION_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+OPENAI_TIMEOUT = 60
+# Answers are reused this long (seconds) for the same normalized prompt
+SUGGESTION_CACHE_TTL = 6 * 3600
+# Buckets for the conditions in the cache key
+COORD_GRID_DEGREES = 0.1
+TEMP_STEP = 1.0
+HUMIDITY_STEP = 5
+WIND_STEP = 1.0
+# Metrics of the most recent answers, newest last
+METRICS_HISTORY = 100
+
+
+class SuggestionMetrics(NamedTuple):
+    """
+    cached: served from the response cache
+    ttft: seconds from the request to the first content
+    total: seconds from the request to the end of the answer
+    tokens: completion tokens (usage reported by the server, else chunks)
+    """
+    cached: bool
+    ttft: float
+    total: float
+    tokens: int
+
+    @property
+    def tokens_per_second(self):
+        # Generation rate after the first token
+        generating = self.total - self.ttft
+        return self.tokens / generating if generating > 0 else 0.0
+
+
+def bucket(value, step):
+    """
+    value rounded to a multiple of step, or value unchanged if it isn't a number.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    return round(round(value / step) * step, 6)
+
+
+def normalize_info(info):
+    """
+    Farm details from the preferences form ([crops, purpose, type, acres,
+    pests]) in a canonical form, so reordered crops or stray whitespace
+    don't change the cache key.
+    """
+    crops, purpose, farm_type, size, pests = info
+    pests = " ".join(str(pests).split()).casefold()
+    return [sorted(crops), purpose, farm_type, bucket(size, 1.0), pests]
+
+
+def conditions_key(coords, city, temp, humidity, windspd, aqi, info):
+    """
+    The conditions of a build_prompt call bucketed and normalized, for the
+    response cache. Farms with the same key share an answer.
+    """
+    return {
+        "coords": [bucket(c, COORD_GRID_DEGREES) for c in coords],
+        "city": " ".join(city.split()).casefold(),
+        "conditions": [bucket(temp, TEMP_STEP), bucket(humidity, HUMIDITY_STEP), bucket(windspd, WIND_STEP), aqi],
+        "info": normalize_info(info),
+    }
+
+
+def build_prompt(coords, city, temp, humidity, windspd, aqi, info):
+    lat, lon = coords
+    return f'You are an extremely skilled and experienced farming assistant designed to aid new and inexperienced farmers make better decisions using environmental data. Data will be provided to you in the following form: (latitude, longtitude) - [temperature, humidity, windspeed, air quality index]. This is the data for the farmer\'s farm. ({lat}, {lon}) - [{temp}, {humidity}, {windspd}, {aqi}]. Additionally, the farmer has supplied the following data about their location and surroundings. {str(info)}. Also, note that the user lives near {city}. Based on the provided data, generate a list of 2-5 precautions and advice that the farmer could use, being sure to cite data that was supplied to you. Make sure to speak in a conversational dialect, addressing the user directly'
+
+
+def prompt_key(prompt, model=SUGGESTION_MODEL, conditions=None):
+    """
+    Cache key of an answer: the conditions_key it was asked for, or the
+    exact prompt without one.
+    """
+    if conditions is not None:
+        return {"model": model, "conditions": conditions}
+    return {"model": model, "prompt": hashlib.sha1(prompt.encode()).hexdigest()}
+
+
+_client = None
+_client_lock = threading.Lock()
+_metrics = deque(maxlen=METRICS_HISTORY)
+
+
+def get_client():
+    """
+    Process-wide OpenAI client. It keeps a pool of open connections, so only
+    the first answer pays for the TLS handshake.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            import openai
+            _client = openai.OpenAI(api_key=os.getenv("OPENAI_KEY"), base_url=OPENAI_BASE_URL,
+                                    timeout=OPENAI_TIMEOUT)
+        return _client
+
+
+def recent_metrics():
+    return list(_metrics)
+
+
+def record(metrics, size=0):
+    _metrics.append(metrics)
+    source = "cache" if metrics.cached else SUGGESTION_MODEL
+    timing.observe("llm_first_token", metrics.ttft, source)
+    timing.observe("llm_stream", metrics.total, source, bytes=size, features=metrics.tokens)
+    print(f"Suggestion from {source}: first token {metrics.ttft * 1000:.0f}ms, "
+          f"{metrics.total:.2f}s total, {metrics.tokens} tokens, {metrics.tokens_per_second:.0f} tokens/s")
+
+
+class SuggestionStream:
+    """
+    Iterate to get the answer's text in pieces as they arrive. Afterwards
+    text holds the whole answer and metrics its timings. Complete answers
+    are cached under conditions (a conditions_key) or else the prompt, so
+    asking again for the same conditions replays the answer at once.
+    """
+
+    def __init__(self, prompt, model=SUGGESTION_MODEL, client=None, conditions=None):
+        self.prompt = prompt
+        self.model = model
+        self.client = client
+        self.conditions = conditions
+        self.text = ""
+        self.metrics = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        key = prompt_key(self.prompt, self.model, self.conditions)
+        cached = get_cache().get("suggestions", key)
+        if cached is not None:
+            self.text = cached["text"]
+            elapsed = time.perf_counter() - start
+            self.metrics = SuggestionMetrics(True, elapsed, elapsed, cached["tokens"])
+            record(self.metrics, len(self.text))
+            yield self.text
+            return
+
+        client = self.client or get_client()
+        stream = client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "assistant", "content": self.prompt}],
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        first = None
+        chunks = 0
+        usage = None
+        pieces = []
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage.completion_tokens
+            if not chunk.choices or chunk.choices[0].delta.content is None:
+                continue
+            if first is None:
+                first = time.perf_counter()
+            chunks += 1
+            pieces.append(chunk.choices[0].delta.content)
+            yield pieces[-1]
+
+        end = time.perf_counter()
+        self.text = "".join(pieces)
+        tokens = usage if usage is not None else chunks
+        self.metrics = SuggestionMetrics(False, (first or end) - start, end - start, tokens)
+        record(self.metrics, len(self.text))
+        if self.text:
+            get_cache().set("suggestions", key, {"text": self.text, "tokens": tokens}, ttl=SUGGESTION_CACHE_TTL)
+
+
+def suggest(prompt, model=SUGGESTION_MODEL, conditions=None):
+    return SuggestionStream(prompt, model, conditions=conditions)
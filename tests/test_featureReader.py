@@ -0,0 +1,133 @@
+# test_featureReader.py
+#
+# featureReader against the stub FeatureServer in benchmarks/.
+
+import json
+
+import pytest
+import requests
+
+import featureReader
+import pbfDecoder
+from benchmarks.featureServerStub import StubFeatureServer, feature_id, make_polygon_features
+
+LAYER = 3
+
+needs_pbf = pytest.mark.skipif(not pbfDecoder.available(), reason="needs the protobuf package")
+
+
+@pytest.fixture(autouse=True)
+def forget_pbf_support():
+    featureReader._pbf_unsupported.clear()
+    yield
+    featureReader._pbf_unsupported.clear()
+
+
+def query(stub, **params):
+    return stub.url + f"{LAYER}/query", dict({"where": "1=1", "outFields": "*", "f": "json"}, **params)
+
+
+class CannedSession(requests.Session):
+    """
+    Answers the requests whose parameters match with a fixed JSON error and
+    passes the rest on.
+    """
+
+    def __init__(self, matches, error, status=400):
+        super().__init__()
+        self.matches = matches
+        self.error = error
+        self.status = status
+
+    def request(self, method, url, **kwargs):
+        sent = kwargs.get("params") or kwargs.get("data") or {}
+        if not self.matches(sent):
+            return super().request(method, url, **kwargs)
+        response = requests.Response()
+        response.status_code = self.status
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps({"error": self.error}).encode()
+        response._content_consumed = True
+        return response
+
+
+@needs_pbf
+def test_pbf_answers_are_decoded():
+    with StubFeatureServer({LAYER: make_polygon_features(5)}) as stub:
+        url, params = query(stub)
+        page = featureReader.stream_features(requests.Session(), "GET", url, params, 10, pbf=True)
+        assert isinstance(page, featureReader.PbfPage)
+        assert [f["attributes"]["OBJECTID"] for f in page] == [1, 2, 3, 4, 5]
+
+
+@needs_pbf
+def test_server_without_pbf_is_asked_in_json_from_then_on():
+    with StubFeatureServer({LAYER: make_polygon_features(5)}, pbf=False) as stub:
+        url, params = query(stub)
+        stream = featureReader.stream_features(requests.Session(), "GET", url, params, 10, pbf=True)
+        assert isinstance(stream, featureReader.FeatureStream)
+        assert len(list(stream)) == 5
+        assert url in featureReader._pbf_unsupported
+
+
+@needs_pbf
+def test_query_error_in_pbf_does_not_disable_pbf():
+    with StubFeatureServer({LAYER: make_polygon_features(5)}) as stub:
+        url, params = query(stub)
+        session = CannedSession(lambda sent: sent.get("f") == "pbf",
+                                {"code": 400, "message": "Cannot perform query. Invalid query parameters.",
+                                 "details": ["'where' parameter is invalid"]})
+        stream = featureReader.stream_features(session, "GET", url, params, 10, pbf=True)
+        # Repeated in JSON this once, without giving up on pbf for the layer
+        assert len(list(stream)) == 5
+        assert url not in featureReader._pbf_unsupported
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_pages_cut_short_by_max_record_count_are_followed_up(workers):
+    layer = make_polygon_features(437, vertices=6)
+    # The server caps pages below the reader's page size
+    with StubFeatureServer({LAYER: layer}, max_record_count=80) as stub:
+        url, params = query(stub)
+        ids = [feature_id(f) for f in featureReader.iter_features(url, params, page_size=100,
+                                                                   max_workers=workers, pbf=False)]
+    assert sorted(ids) == list(range(1, 438))
+
+
+def test_without_a_count_pages_follow_exceeded_transfer_limit():
+    layer = make_polygon_features(250, vertices=6)
+    with StubFeatureServer({LAYER: layer}, max_record_count=60) as stub:
+        url, params = query(stub)
+        session = CannedSession(lambda sent: sent.get("returnCountOnly") == "true",
+                                {"code": 400, "message": "Unable to count features."}, status=200)
+        assert featureReader.count_features(url, params, session=session) is None
+        ids = [feature_id(f) for f in featureReader.iter_features(url, params, page_size=100, session=session,
+                                                                   pbf=False)]
+    assert ids == list(range(1, 251))
+
+
+def test_empty_layer_yields_nothing():
+    with StubFeatureServer({LAYER: []}) as stub:
+        url, params = query(stub)
+        assert list(featureReader.iter_features(url, params, pbf=False)) == []
+
+
+def test_error_in_a_page_is_raised():
+    with StubFeatureServer({LAYER: make_polygon_features(30, vertices=6)}) as stub:
+        url, params = query(stub)
+        session = CannedSession(lambda sent: "resultOffset" in sent,
+                                {"code": 500, "message": "Unable to complete operation."}, status=200)
+        with pytest.raises(requests.HTTPError):
+            list(featureReader.iter_features(url, params, page_size=10, session=session, pbf=False))
+
+
+def test_stream_decodes_features_across_chunks():
+    layer = make_polygon_features(20, vertices=30)
+    with StubFeatureServer({LAYER: layer}) as stub:
+        url, params = query(stub)
+        response = requests.get(url, params=params, stream=True)
+        stream = featureReader.FeatureStream(response, chunk_size=97)
+        features = list(stream)
+    assert features == json.loads(json.dumps(layer))
+    assert stream.features == 20
+    assert stream.meta["exceededTransferLimit"] is False
@@ -0,0 +1,106 @@
+# test_featureSync.py
+#
+# FeatureLayerSync delta refreshes against the stub FeatureServer in
+# benchmarks/, with features added, edited and deleted between refreshes.
+
+import copy
+import time
+
+import pytest
+
+from benchmarks.featureServerStub import StubFeatureServer, feature_id, make_polygon_features
+from featureSync import FeatureLayerSync, arcgis_timestamp
+
+LAYER = 3
+EDIT_FIELD = "EditDate"
+
+
+@pytest.fixture
+def stub():
+    layer = make_polygon_features(50, vertices=8, edit_field=EDIT_FIELD)
+    with StubFeatureServer({LAYER: layer}, edit_field=EDIT_FIELD) as server:
+        yield server
+
+
+def make_sync(stub, **kwargs):
+    return FeatureLayerSync(stub.url + f"{LAYER}/query", pbf=False, **kwargs)
+
+
+def edit(stub, oid, dm):
+    feature = copy.deepcopy(next(f for f in stub.layers[LAYER] if feature_id(f) == oid))
+    feature["attributes"]["dm"] = dm
+    stub.upsert(LAYER, feature)
+
+
+def assert_in_sync(sync, stub):
+    served = {feature_id(f): f for f in stub.layers[LAYER]}
+    assert sync.features == served
+
+
+def test_cold_sync_downloads_the_layer(stub):
+    sync = make_sync(stub)
+    summary = sync.refresh()
+    assert (summary["added"], summary["updated"], summary["removed"], summary["total"]) == (50, 0, 0, 50)
+    assert sync.object_id_field == "OBJECTID"
+    assert sync.edit_field == EDIT_FIELD
+    assert_in_sync(sync, stub)
+
+
+def test_refresh_applies_adds_edits_and_deletes(stub):
+    sync = make_sync(stub)
+    sync.refresh()
+    time.sleep(0.01)
+
+    stub.delete(LAYER, 1)
+    stub.delete(LAYER, 2)
+    added = make_polygon_features(1, vertices=8, seed=1)[0]
+    added["attributes"]["OBJECTID"] = 100
+    stub.upsert(LAYER, added)
+    edit(stub, 10, 4)
+
+    summary = sync.refresh()
+    assert (summary["added"], summary["updated"], summary["removed"]) == (1, 1, 2)
+    assert summary["total"] == 49
+    assert sync.features[10]["attributes"]["dm"] == 4
+    assert_in_sync(sync, stub)
+
+
+def test_unchanged_layer_downloads_nothing(stub):
+    sync = make_sync(stub)
+    sync.refresh()
+    time.sleep(0.01)
+    edit(stub, 5, 1)
+    assert sync.refresh()["updated"] == 1
+
+    # The last edit is not matched again by the edit-date filter
+    summary = sync.refresh()
+    assert (summary["added"], summary["updated"], summary["removed"]) == (0, 0, 0)
+
+
+def test_on_feature_sees_new_and_edited_features(stub):
+    sync = make_sync(stub)
+    seen = []
+    sync.refresh(on_feature=lambda feature: seen.append(feature_id(feature)))
+    assert len(seen) == 50
+    time.sleep(0.01)
+    edit(stub, 7, 2)
+    seen.clear()
+    sync.refresh(on_feature=lambda feature: seen.append(feature_id(feature)))
+    assert seen == [7]
+
+
+def test_arcgis_timestamp_keeps_milliseconds():
+    assert arcgis_timestamp(1_700_000_000_123) == "TIMESTAMP '2023-11-14 22:13:20.123'"
+
+
+def test_narrowed_out_fields_still_track_edits(stub):
+    sync = make_sync(stub, out_fields="dm")
+    sync.refresh()
+    assert set(sync.features[3]["attributes"]) == {"OBJECTID", "dm", EDIT_FIELD}
+    dm = (sync.features[3]["attributes"]["dm"] + 1) % 5
+    time.sleep(0.01)
+    edit(stub, 3, dm)
+
+    summary = sync.refresh()
+    assert summary["updated"] == 1
+    assert sync.features[3]["attributes"]["dm"] == dm
@@ -0,0 +1,72 @@
+# test_pbfDecoder.py
+#
+# The f=pbf decoder against a FeatureServer answer in fixtures/:
+# drought_query.pbf and drought_query.json are the same drought query in
+# f=pbf and f=json (polygons with a hole and a second part, a null
+# attribute, returnCentroid, exceededTransferLimit).
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import pbfDecoder
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+# pbf coordinates are quantized; the fixture's step is 1e-8 degrees
+TOLERANCE = 1e-7
+
+pytestmark = pytest.mark.skipif(not pbfDecoder.available(), reason="needs the protobuf package")
+
+
+@pytest.fixture(scope="module")
+def answers():
+    with open(os.path.join(FIXTURES, "drought_query.pbf"), "rb") as f:
+        body = f.read()
+    with open(os.path.join(FIXTURES, "drought_query.json")) as f:
+        twin = json.load(f)
+    return pbfDecoder.decode(body), twin
+
+
+def test_decode_reads_the_result(answers):
+    result, twin = answers
+    assert result.geometry_type == twin["geometryType"]
+    assert result.object_id_field == twin["objectIdFieldName"]
+    assert result.exceeded_transfer_limit is twin["exceededTransferLimit"]
+    assert result.size == len(twin["features"])
+    assert list(result.columns) == [field["name"] for field in twin["fields"]]
+    assert result.feature_offsets.tolist() == [0, 2, 4, 5]
+
+
+def test_esri_features_match_the_json_answer(answers):
+    result, twin = answers
+    decoded = list(pbfDecoder.esri_features(result))
+    assert len(decoded) == len(twin["features"])
+    for actual, expected in zip(decoded, twin["features"]):
+        assert actual["attributes"] == expected["attributes"]
+        rings, expected_rings = actual["geometry"]["rings"], expected["geometry"]["rings"]
+        assert [len(ring) for ring in rings] == [len(ring) for ring in expected_rings]
+        for ring, expected_ring in zip(rings, expected_rings):
+            np.testing.assert_allclose(ring, expected_ring, rtol=0, atol=TOLERANCE)
+        if "centroid" in expected:
+            assert actual["centroid"] == pytest.approx(expected["centroid"], abs=TOLERANCE)
+        else:
+            assert "centroid" not in actual
+
+
+def test_geojson_features_group_holes_and_parts(answers):
+    result, twin = answers
+    decoded = list(pbfDecoder.geojson_features(result))
+    assert [feature["id"] for feature in decoded] == [f["attributes"]["OBJECTID"] for f in twin["features"]]
+    # A clockwise exterior with a counter-clockwise hole, then two exteriors
+    assert decoded[0]["geometry"]["type"] == "Polygon"
+    assert len(decoded[0]["geometry"]["coordinates"]) == 2
+    assert decoded[1]["geometry"]["type"] == "MultiPolygon"
+    assert len(decoded[1]["geometry"]["coordinates"]) == 2
+    assert decoded[2]["properties"]["dm"] is None
+
+
+def test_decode_rejects_other_bodies():
+    with pytest.raises(ValueError):
+        pbfDecoder.decode(b'{"error": {"code": 400}}')
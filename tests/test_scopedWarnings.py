@@ -0,0 +1,71 @@
+# test_scopedWarnings.py
+#
+# Scoped Event Map loads: grid levels per envelope radius, the snapshot
+# envelope shown while a scoped load runs, and loads shared in the background.
+
+import threading
+
+import pandas as pd
+import pytest
+
+import warningsData
+from warningsData import SCOPE_CELL_DEGREES, SCOPE_RADII_KM, envelope_warnings, scope_cells, start_scoped_warnings
+
+# Kansas City
+LAT, LON = 39.1, -94.6
+
+
+@pytest.fixture(autouse=True)
+def fresh_loads(monkeypatch):
+    monkeypatch.setattr(warningsData, "_scoped_loads", {})
+
+
+def test_each_radius_has_its_own_grid_level():
+    for radius in SCOPE_RADII_KM:
+        cells = scope_cells(LAT, LON, radius)
+        assert {cell[0] for cell in cells} == {SCOPE_CELL_DEGREES[radius]}
+    local = scope_cells(LAT, LON, SCOPE_RADII_KM[0])
+    # Local cells are 1 degree, so the envelope isn't padded to a Regional area
+    assert len(local) <= 20
+    assert max(cell[1] for cell in local) - min(cell[1] for cell in local) <= 4
+
+
+def test_envelope_warnings_cuts_the_national_snapshot():
+    warnings = pd.DataFrame({
+        "latitude": [39.0, 39.5, 45.0, 30.0],
+        "longitude": [-94.5, -95.0, -94.6, -80.0],
+        "prop_idx": [0, 1, 2, 3],
+    })
+    properties = [{"OBJECTID": i} for i in range(4)]
+    inside, shared = envelope_warnings((warnings, properties), LAT, LON, SCOPE_RADII_KM[0])
+    assert list(inside["prop_idx"]) == [0, 1]
+    assert shared is properties
+
+
+def test_scoped_loads_run_in_the_background_and_are_shared(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def load(lat, lon, radius_km, zoom=None):
+        calls.append((lat, lon, radius_km, zoom))
+        release.wait(5)
+        return "scoped"
+
+    monkeypatch.setattr(warningsData, "load_scoped_warnings", load)
+    first = start_scoped_warnings(LAT, LON, 150, 7)
+    # A second session on the same envelope doesn't start another load
+    assert start_scoped_warnings(LAT, LON, 150, 7) is first
+    assert not first.done()
+
+    release.set()
+    assert first.result(timeout=5) == "scoped"
+    assert start_scoped_warnings(LAT, LON, 150, 7) is first
+    assert len(calls) == 1
+
+
+def test_failed_scoped_loads_are_retried(monkeypatch):
+    monkeypatch.setattr(warningsData, "load_scoped_warnings", lambda *args: None)
+    monkeypatch.setattr(warningsData, "RETRY_DELAY", 0)
+    first = start_scoped_warnings(LAT, LON, 150, 7)
+    assert first.result(timeout=5) is None
+    assert start_scoped_warnings(LAT, LON, 150, 7) is not first
@@ -0,0 +1,67 @@
+# test_suggestions.py
+#
+# Suggestion streaming and its response cache against the stub chat
+# completions server in benchmarks/.
+
+import pytest
+
+import featureCache
+import suggestions
+from benchmarks.openaiServerStub import StubChatServer
+
+openai = pytest.importorskip("openai")
+
+INFO = [["Wheat", "Corn"], "Commercial", "Conventional", 0.4, "Aphids"]
+FARM = ((39.123, -94.6), "Kansas City", 21.3, 61, 4.1, 2, INFO)
+# The same farm with its conditions moved within their buckets
+NEARBY = ((39.12, -94.58), " kansas city", 21.1, 62, 3.9, 2, [["Corn", "Wheat"], *INFO[1:4], " aphids"])
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.setattr(featureCache, "_cache", featureCache.FeatureCache(str(tmp_path / "features.sqlite")))
+    with StubChatServer(tokens=5, ttft=0.01, token_delay=0) as server:
+        monkeypatch.setattr(suggestions, "_client", openai.OpenAI(api_key="stub", base_url=f"{server.url}/v1"))
+        yield server
+
+
+def ask(conditions):
+    answer = suggestions.suggest(suggestions.build_prompt(*conditions),
+                                 conditions=suggestions.conditions_key(*conditions))
+    text = "".join(answer)
+    return text, answer.metrics
+
+
+def test_answer_streams_with_metrics(stub):
+    text, metrics = ask(FARM)
+    assert text == "".join(f"word{i} " for i in range(5))
+    assert not metrics.cached
+    assert metrics.tokens == 5
+    assert 0 < metrics.ttft <= metrics.total
+    assert suggestions.recent_metrics()[-1] == metrics
+
+
+def test_nearby_farm_hits_the_cache(stub):
+    text, _ = ask(FARM)
+    again, metrics = ask(NEARBY)
+    assert metrics.cached
+    assert again == text
+    assert stub.requests_served == 1
+
+
+def test_other_conditions_miss_the_cache(stub):
+    ask(FARM)
+    _, metrics = ask(((39.123, -94.6), "Kansas City", 30.0, 61, 4.1, 2, INFO))
+    assert not metrics.cached
+    assert stub.requests_served == 2
+
+
+def test_prompt_keeps_the_real_values():
+    prompt = suggestions.build_prompt(*FARM)
+    assert "(39.123, -94.6) - [21.3, 61, 4.1, 2]" in prompt
+    assert "0.4" in prompt
+
+
+def test_conditions_key_buckets_and_normalizes():
+    assert suggestions.conditions_key(*FARM) == suggestions.conditions_key(*NEARBY)
+    assert suggestions.conditions_key(*FARM)["coords"] == [39.1, -94.6]
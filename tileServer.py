@@ -0,0 +1,285 @@
+# tileServer.py
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import shapely
+
+from geometryLod import LOD_ZOOMS, PIXEL_TOLERANCE
+
+TILE_HOST = os.getenv("FARMVIS_TILE_HOST", "127.0.0.1")
+TILE_PORT = int(os.getenv("FARMVIS_TILE_PORT", 8765))
+# Base URL the browser uses to reach the tile server. The default only works
+# when the browser runs on the same machine as the app; a deployment should
+# proxy the tile server under the app's own origin and set this to that path
+# (e.g. https://farmvis.example.org/tiles), or the maps load blank
+TILE_URL = os.getenv("FARMVIS_TILE_URL", f"http://localhost:{TILE_PORT}")
+# Set FARMVIS_VECTOR_TILES=1 to serve the maps as tiles from TILE_URL instead
+# of embedding the full datasets in the page
+VECTOR_TILES = os.getenv("FARMVIS_VECTOR_TILES", "0") == "1"
+
+TILE_EXTENT = 4096
+# Geometry kept beyond each tile edge, in tile units, so strokes don't show seams
+TILE_BUFFER = 64
+TILE_CACHE_SIZE = 4096
+MAX_ZOOM = 14
+
+MERCATOR_ORIGIN = 20037508.342789244
+MAX_LATITUDE = 85.0511287798
+
+TILE_PATH = re.compile(r"^/(?P<name>[\w-]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.pbf$")
+
+
+def lonlat_to_mercator(coords):
+    """
+    Project an (N, 2) array of lon/lat degrees to Web Mercator metres.
+    """
+    lon = coords[:, 0]
+    lat = np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE)
+    x = np.radians(lon) * 6378137.0
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * 6378137.0
+    return np.column_stack([x, y])
+
+
+def tile_bounds(z, x, y):
+    """
+    Web Mercator bounds (minx, miny, maxx, maxy) of tile z/x/y.
+    """
+    size = 2 * MERCATOR_ORIGIN / 2 ** z
+    minx = -MERCATOR_ORIGIN + x * size
+    maxy = MERCATOR_ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def esri_polygon(rings):
+    """
+    Shapely geometry for Esri JSON rings: clockwise rings are exteriors and
+    counter-clockwise rings are holes of the exterior that contains them.
+    """
+    exteriors = []
+    holes = []
+    for ring in rings:
+        if len(ring) < 4:
+            continue
+        linear_ring = shapely.LinearRing(np.asarray(ring, dtype=float)[:, :2])
+        (holes if linear_ring.is_ccw else exteriors).append(linear_ring)
+    if not exteriors:
+        # Rings with the opposite winding; treat them all as exteriors
+        exteriors, holes = holes, []
+
+    polygons = []
+    for exterior in exteriors:
+        shell = shapely.Polygon(exterior)
+        inner = [hole for hole in holes if shell.contains(shapely.Point(hole.coords[0]))]
+        polygons.append(shapely.Polygon(exterior, inner))
+    if len(polygons) == 1:
+        return polygons[0]
+    return shapely.MultiPolygon(polygons)
+
+
+class TileSource:
+    """
+    One named layer of features, indexed for tile cutting.
+
+    geometries are shapely geometries in lon/lat; properties is a matching list
+    of dicts holding scalar values only (MVT can't carry lists).
+    """
+
+    def __init__(self, name, geometries, properties, key=None):
+        self.name = name
+        self.key = key
+        self.geometries = shapely.transform(np.asarray(geometries, dtype=object), lonlat_to_mercator)
+        self.properties = properties
+        self.tree = shapely.STRtree(self.geometries)
+        self._levels = {}
+
+    def level(self, z):
+        """
+        All geometries pre-simplified for the next LOD pyramid level at or
+        above z, built on first use, so cutting a low-zoom tile doesn't
+        simplify full-resolution outlines again for every tile.
+        """
+        finer = [level for level in LOD_ZOOMS if level >= z]
+        if not finer:
+            return self.geometries
+        level = min(finer)
+        if level not in self._levels:
+            tolerance = 2 * MERCATOR_ORIGIN / 2 ** level / 256 * PIXEL_TOLERANCE
+            self._levels[level] = shapely.simplify(self.geometries, tolerance, preserve_topology=True)
+        return self._levels[level]
+
+    def render(self, z, x, y):
+        """
+        Encode tile z/x/y, or return None when no feature touches it.
+        """
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        pad = (maxx - minx) * TILE_BUFFER / TILE_EXTENT
+        idx = self.tree.query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad))
+        if len(idx) == 0:
+            return None
+        idx.sort()
+
+        # Drop detail finer than the LOD pyramid keeps at this zoom (a fraction
+        # of a 256px screen pixel) before clipping
+        tolerance = (maxx - minx) / 256 * PIXEL_TOLERANCE
+        geoms = shapely.simplify(self.level(z)[idx], tolerance, preserve_topology=True)
+        geoms = shapely.clip_by_rect(geoms, minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+        # Move into tile units and snap to the integer grid here, in bulk, so
+        # the pure-Python encoder only walks the vertices that survive
+        scale = np.array([TILE_EXTENT / (maxx - minx), TILE_EXTENT / (maxy - miny)])
+        origin = np.array([minx, miny])
+        geoms = shapely.transform(geoms, lambda coords: (coords - origin) * scale)
+        geoms = shapely.set_precision(geoms, 1.0)
+
+        features = [
+            {"geometry": geom, "properties": self.properties[i]}
+            for geom, i in zip(geoms, idx) if not geom.is_empty
+        ]
+        if not features:
+            return None
+        import mapbox_vector_tile
+        return mapbox_vector_tile.encode(
+            [{"name": self.name, "features": features}],
+            default_options={"extents": TILE_EXTENT}
+        )
+
+
+class TileServer:
+    """
+    Serves /<source>/<z>/<x>/<y>.pbf from published sources over HTTP, with
+    an LRU cache of encoded tiles. Publishing a new version of a source drops
+    its cached tiles.
+    """
+
+    def __init__(self, host=TILE_HOST, port=TILE_PORT, cache_size=TILE_CACHE_SIZE):
+        self.sources = {}
+        self.versions = {}
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def publish(self, name, key, build):
+        """
+        Make build() -> TileSource the current version of name, unless key
+        matches what is already published.
+        """
+        if name in self.sources and self.sources[name].key == key:
+            return
+        source = build()
+        source.key = key
+        with self._lock:
+            self.sources[name] = source
+            self.versions[name] = self.versions.get(name, 0) + 1
+            for cached in [k for k in self._cache if k[0] == name]:
+                del self._cache[cached]
+
+    def tile_url(self, name, base_url=TILE_URL):
+        """
+        URL template for map layers, versioned so browsers refetch after a publish.
+        """
+        return f"{base_url}/{name}/{{z}}/{{x}}/{{y}}.pbf?v={self.versions.get(name, 0)}"
+
+    def get_tile(self, name, z, x, y):
+        key = (name, z, x, y)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            source = self.sources.get(name)
+        if source is None:
+            return None
+
+        tile = source.render(z, x, y)
+        with self._lock:
+            self.misses += 1
+            if self.sources.get(name) is source:
+                self._cache[key] = tile
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return tile
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                match = TILE_PATH.match(self.path.split("?", 1)[0])
+                if not match or match["name"] not in server.sources or int(match["z"]) > MAX_ZOOM:
+                    self.send_error(404)
+                    return
+                tile = server.get_tile(match["name"], int(match["z"]), int(match["x"]), int(match["y"]))
+
+                self.send_response(200 if tile else 204)
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.send_header("Cache-Control", "max-age=300")
+                if tile:
+                    self.send_header("Content-Type", "application/x-protobuf")
+                    self.send_header("Content-Length", str(len(tile)))
+                self.end_headers()
+                if tile:
+                    self.wfile.write(tile)
+
+        return Handler
+
+
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def get_tile_server():
+    """
+    Start the process-wide tile server on first use. Returns None when vector
+    tiles are disabled or the port can't be bound, so callers can fall back to
+    embedding the data.
+    """
+    global _server, _server_failed
+    if not VECTOR_TILES or _server_failed:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = TileServer().start()
+            except OSError as e:
+                print(f"Tile server unavailable on port {TILE_PORT}: {e}")
+                _server_failed = True
+                return None
+        return _server
+
+
+def features_key(*columns):
+    """
+    Cheap fingerprint of a dataset, used to skip republishing unchanged sources.
+    """
+    digest = hashlib.sha1()
+    for column in columns:
+        digest.update(repr(list(column)).encode())
+    return digest.hexdigest()
@@ -0,0 +1,280 @@
+# timing.py
+#
+# Timing spans around the stages of a page: HTTP fetch, JSON/pbf decode,
+# geometry build, DBSCAN, DataFrame build, map serialization and LLM
+# streaming. Spans carry byte and feature counts.
+#
+# Every span is added to process-wide Prometheus histograms. Spans recorded
+# while a page renders (including on worker threads started with bind) are
+# also collected for that rerun, for the debug panel (FARMVIS_DEBUG=1 or
+# ?debug=1). Metrics are exported in the Prometheus text format to
+# FARMVIS_METRICS_FILE after every rerun (for node_exporter's textfile
+# collector) and/or served on FARMVIS_METRICS_PORT at /metrics.
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_FILE = os.getenv("FARMVIS_METRICS_FILE")
+METRICS_HOST = os.getenv("FARMVIS_METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("FARMVIS_METRICS_PORT", 0))
+DEBUG_PANEL = os.getenv("FARMVIS_DEBUG", "0") == "1"
+
+# Histogram bucket upper bounds (seconds), from cache hits to cold national loads
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span:
+    """
+    One timed stage. source names the dataset or service involved (it is
+    a Prometheus label, so keep it to a handful of values); detail holds
+    anything else worth showing in the debug panel.
+    """
+    __slots__ = ("stage", "source", "detail", "start", "seconds", "bytes", "features")
+
+    def __init__(self, stage, source=None, detail=None):
+        self.stage = stage
+        self.source = source
+        self.detail = detail or {}
+        self.start = time.time()
+        self.seconds = 0.0
+        self.bytes = 0
+        self.features = 0
+
+    def add(self, bytes=0, features=0):
+        self.bytes += bytes
+        self.features += features
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _escape(value):
+    # Prometheus label values escape backslashes, quotes and newlines
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items() if value not in (None, "")) + "}"
+
+
+class Registry:
+    """
+    Process-wide stage and page histograms plus byte and feature counters.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.bytes = {}
+        self.features = {}
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    def observe_span(self, span):
+        key = (span.stage, span.source or "")
+        with self._lock:
+            self.stages.setdefault(key, Histogram()).observe(span.seconds)
+            self.bytes[key] = self.bytes.get(key, 0) + span.bytes
+            self.features[key] = self.features.get(key, 0) + span.features
+
+    def observe_page(self, page, seconds):
+        with self._lock:
+            self.pages.setdefault(page, Histogram()).observe(seconds)
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def histogram(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+                lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {hist.count}')
+                lines.append(f"{name}_sum{_labels(**labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+        def counter(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, source), value in sorted(values.items()):
+                lines.append(f"{name}{_labels(stage=stage, source=source)} {value}")
+
+        with self._lock:
+            histogram("farmvis_page_seconds", "Time to render a page, per rerun.",
+                      [({"page": page}, hist) for page, hist in sorted(self.pages.items())])
+            histogram("farmvis_stage_seconds", "Time spent in each stage.",
+                      [({"stage": stage, "source": source}, hist) for (stage, source), hist in sorted(self.stages.items())])
+            counter("farmvis_stage_bytes_total", "Bytes handled by each stage.", self.bytes)
+            counter("farmvis_stage_features_total", "Features handled by each stage.", self.features)
+        return "\n".join(lines) + "\n"
+
+
+_registry = Registry()
+# Spans of the rerun being collected in this context, or None
+_collected = contextvars.ContextVar("farmvis_spans", default=None)
+
+
+def get_registry():
+    return _registry
+
+
+def record(span):
+    _registry.observe_span(span)
+    spans = _collected.get()
+    if spans is not None:
+        spans.append(span)
+
+
+@contextmanager
+def span(stage, source=None, **detail):
+    """
+    Time the body as one stage; count bytes and features on the yielded Span.
+    The span is recorded even if the body raises.
+    """
+    current = Span(stage, source, detail)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        record(current)
+
+
+def observe(stage, seconds, source=None, bytes=0, features=0, **detail):
+    """
+    Record a stage that was timed elsewhere.
+    """
+    current = Span(stage, source, detail)
+    current.start -= seconds
+    current.seconds = seconds
+    current.add(bytes, features)
+    record(current)
+
+
+def bind(fn):
+    """
+    fn wrapped to run in a copy of the caller's context, so spans recorded
+    on executor threads are collected with the rerun that submitted them.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def collect(page):
+    """
+    Collect the spans of one page render into the yielded list, and record
+    the page's total time.
+    """
+    spans = []
+    token = _collected.set(spans)
+    start = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        _collected.reset(token)
+        _registry.observe_page(page, time.perf_counter() - start)
+        start_metrics_server()
+        write_metrics_file()
+
+
+def request(session, method, url, source=None, **kwargs):
+    """
+    session.request inside an http_fetch span counting the response bytes.
+    With stream=True the body is left unread and the span only covers the
+    headers; its bytes are the Content-Length, if the server sent one.
+    """
+    with span("http_fetch", source) as current:
+        response = session.request(method, url, **kwargs)
+        if kwargs.get("stream"):
+            current.add(bytes=int(response.headers.get("Content-Length") or 0))
+        else:
+            current.add(bytes=len(response.content))
+    return response
+
+
+def decode_json(response, source=None):
+    """
+    The response body parsed as JSON, inside a json_decode span that also
+    counts the features of FeatureServer responses.
+    """
+    with span("json_decode", source) as current:
+        content = response.content
+        data = json.loads(content)
+        features = data.get("features") if isinstance(data, dict) else None
+        current.add(bytes=len(content), features=len(features) if isinstance(features, list) else 0)
+    return data
+
+
+def write_metrics_file(path=METRICS_FILE):
+    if not path:
+        return
+    # Written aside and renamed, so scrapers never read half a file
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as f:
+        f.write(_registry.render())
+    os.replace(temp, path)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serve /metrics on port, once per process. Does nothing when port is 0.
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            class Handler(BaseHTTPRequestHandler):
+                def log_message(self, format, *args):
+                    pass
+
+                def do_GET(self):
+                    if self.path.split("?", 1)[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = _registry.render().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            try:
+                _server = ThreadingHTTPServer((host, port), Handler)
+            except OSError as e:
+                print(f"Metrics endpoint unavailable on port {port}: {e}")
+                _server = False
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server or None
@@ -1,15 +1,10 @@
 import streamlit as st
-from PIL import Image
-import pandas as pd
-
-st.set_page_config(
-    layout='wide'
-)
 
 def load_image(image_path):
     """
     Load an image from a given path.
     """
+    from PIL import Image
     return Image.open(image_path)
 
 def header_section():
@@ -136,4 +131,7 @@ def main():
     load_page()
 
 if __name__ == "__main__":
+    st.set_page_config(
+        layout='wide'
+    )
     main()
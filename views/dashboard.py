@@ -1,69 +1,112 @@
 import time
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
 import requests
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-import random
-from dotenv import load_dotenv
 import os
-import openai as oa
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+import timing
 
 # ---------------------------
 # Configuration and Constants
 # ---------------------------
 
-# Load environment variables from the .env file
-load_dotenv()
+# plotly, openai, python-dotenv, the gazetteer and the risk engine are imported
+# where they are used, so loading this module (e.g. for get_coordinates) stays
+# cheap and side-effect free
+
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5")
+# Weather is looked up per grid cell (degrees), so nearby farms share a cache entry
+WEATHER_GRID_DEGREES = float(os.getenv("FARMVIS_WEATHER_GRID", 0.1))
+# Current conditions are cached this long (seconds), for up to WEATHER_CACHE_SIZE cells
+WEATHER_TTL = 600
+WEATHER_CACHE_SIZE = 1024
+WEATHER_TIMEOUT = 10
+# Longest the dashboard waits for the first drought and warnings snapshots
+RISK_WAIT = 15
+# Minimum seconds between redraws of a streaming suggestion
+SUGGESTION_REDRAW = 0.05
+
+_env_loaded = False
+_session = None
+_weather_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="weather")
+
+
+def load_env():
+    """
+    Load environment variables from the .env file, once per process.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
 
-# Fetch the API key from the environment variable
-API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+def get_api_key():
+    """
+    The OpenWeatherMap API key.
+    """
+    load_env()
+    return os.getenv("OPENWEATHERMAP_API_KEY")
 
-if not API_KEY:
-    st.error("API Key for OpenWeatherMap is missing. Please set it in the .env file.")
-    st.stop()
 
-# Initialize Geolocator
-geolocator = Nominatim(user_agent="streamlit_app")
+def get_session(pool_size=8):
+    """
+    Shared keep-alive session for OpenWeatherMap requests.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
 
 
 # ---------------------------
 # Helper Functions
 # ---------------------------
-@st.cache_data
 def get_coordinates(city_name):
     """
     Convert a city name to its latitude and longitude.
     """
-    try:
-        location = geolocator.geocode(city_name, timeout=10)
-        if location:
-            return (location.latitude, location.longitude)
-        else:
-            return (None, None)
-    except GeocoderTimedOut:
-        return (None, None)
+    from gazetteer import geocode
+    return geocode(city_name)
 
 
-@st.cache_data
-def fetch_weather_data(lat, lon):
+def snap_to_grid(lat, lon, grid=WEATHER_GRID_DEGREES):
     """
-    Fetch current weather and AQI data from OpenWeatherMap APIs.
+    Centre of the grid cell holding (lat, lon).
     """
-    # OpenWeatherMap API endpoints
-    weather_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
-    aqi_url = f"https://api.openweathermap.org/data/2.5/air_pollution?lat={lat}&lon={lon}&appid={API_KEY}"
+    return (round(round(lat / grid) * grid, 6), round(round(lon / grid) * grid, 6))
+
+
+def get_json(url, params):
+    response = timing.request(get_session(), "GET", url, "openweathermap", params=params, timeout=WEATHER_TIMEOUT)
+    response.raise_for_status()
+    return timing.decode_json(response, "openweathermap")
+
 
-    # Fetch weather data
-    weather_response = requests.get(weather_url)
-    weather_data = weather_response.json()
+@st.cache_data(ttl=WEATHER_TTL, max_entries=WEATHER_CACHE_SIZE, show_spinner=False)
+def fetch_weather_cell(lat, lon):
+    """
+    Fetch current weather and AQI for a grid cell centre, both requests in
+    flight at once. Failed requests raise, so they aren't cached.
+    """
+    params = {"lat": lat, "lon": lon, "appid": get_api_key()}
+    weather = _weather_pool.submit(timing.bind(get_json), f"{OPENWEATHER_URL}/weather", {**params, "units": "metric"})
+    aqi = _weather_pool.submit(timing.bind(get_json), f"{OPENWEATHER_URL}/air_pollution", params)
+    return weather.result(), aqi.result()
 
-    # Fetch AQI data
-    aqi_response = requests.get(aqi_url)
-    aqi_data = aqi_response.json()
 
-    return weather_data, aqi_data
+def fetch_weather_data(lat, lon):
+    """
+    Fetch current weather and AQI data from OpenWeatherMap APIs.
+    """
+    return fetch_weather_cell(*snap_to_grid(lat, lon))
 
 
 def display_donut_chart(title, probability):
@@ -71,6 +114,8 @@ def display_donut_chart(title, probability):
     Create and display a donut chart for a given probability.
     The remaining portion of the chart is blank without any labels.
     """
+    import plotly.graph_objects as go
+
     fig = go.Figure(
         data=[
             go.Pie(
@@ -112,6 +157,10 @@ def main():
     - First renow: Temperature, Humidity, Wind Speed, AQI (4 columns)
     - Second row: Flood Probability and Drought Probability (2 columns)
     """
+    if not get_api_key():
+        st.error("API Key for OpenWeatherMap is missing. Please set it in the .env file.")
+        st.stop()
+
     city = st.sidebar.text_input(
         "City",
         value=st.session_state.get("city", "New York"),
@@ -120,11 +169,14 @@ def main():
     st.session_state["city"] = city
     coords = get_coordinates(city)
     st.session_state["coords"] = coords
-    weather_data, aqi_data = fetch_weather_data(coords[0], coords[1])
-    # Generate random probabilities
-    flood_probability = round(random.uniform(0, 100), 2)
-    drought_probability = round(random.uniform(0, 100), 2)
-
+    if coords[0] is None:
+        st.error(f"Couldn't find {city}. Try the name of a nearby town.")
+        return
+    try:
+        weather_data, aqi_data = fetch_weather_data(coords[0], coords[1])
+    except requests.RequestException as e:
+        st.error(f"Couldn't load weather data from OpenWeatherMap: {e}")
+        return
     # First Row: Temperature, Humidity, Wind Speed, AQI
     st.markdown("## Environmental Conditions")
     env_cols = st.columns(4)
@@ -161,15 +213,26 @@ def main():
 
     # Second Row: Flood and Drought Probabilities
     st.markdown("## Environmental Probabilities")
-    prob_cols = st.columns(2)
+    from riskEngine import RISK_RADIUS_KM, assess_risk
+    risk = assess_risk(coords[0], coords[1], timeout=RISK_WAIT)
+    if risk is None:
+        st.info("Flood and drought data is still loading; check back in a minute.")
+    else:
+        prob_cols = st.columns(2)
 
-    with prob_cols[0]:
-        st.markdown("### 🌊 Flood Probability")
-        display_donut_chart("🌊 Flood Probability", flood_probability)
+        with prob_cols[0]:
+            st.markdown("### 🌊 Flood Probability")
+            display_donut_chart("🌊 Flood Probability", round(risk.flood_score * 100, 2))
+            if risk.warnings:
+                st.caption(f"{len(risk.warnings)} active warnings within {RISK_RADIUS_KM:.0f} km "
+                           f"({risk.clusters} clusters), nearest {risk.nearest_warning_km:.0f} km away")
+            else:
+                st.caption(f"No active warnings within {RISK_RADIUS_KM:.0f} km")
 
-    with prob_cols[1]:
-        st.markdown("### 🌵 Drought Probability")
-        display_donut_chart("🌵 Drought Probability", drought_probability)
+        with prob_cols[1]:
+            st.markdown("### 🌵 Drought Probability")
+            display_donut_chart("🌵 Drought Probability", round(risk.drought_score * 100, 2))
+            st.caption(f"Drought Monitor category: {risk.drought_label}")
 
     st.button("What can I do?", on_click=gen_response, type="primary")
 
@@ -179,24 +242,28 @@ def gen_response():
         if st.session_state.get("info") is not None:
             print(st.session_state)
             if st.session_state.get("coords") is not None:
-                client = oa.OpenAI(api_key=os.getenv("OPENAI_KEY"))
-                request = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "assistant",
-                            "content": f'You are an extremely skilled and experienced farming assistant designed to aid new and inexperienced farmers make better decisions using environmental data. Data will be provided to you in the following form: (latitude, longtitude) - [temperature, humidity, windspeed, air quality index]. This is the data for the farmer\'s farm. ({st.session_state["coords"][0]}, {st.session_state["coords"][1]}) - [{st.session_state["temp"]}, {st.session_state["humidity"]}, {st.session_state["windspd"]}, {st.session_state["aqi"]}]. Additionally, the farmer has supplied the following data about their location and surroundings. {str(st.session_state["info"])}. Also, note that the user lives near {st.session_state["city"]}. Based on the provided data, generate a list of 2-5 precautions and advice that the farmer could use, being sure to cite data that was supplied to you. Make sure to speak in a conversational dialect, addressing the user directly',
-                        }
-                    ],
-                    stream=True,
-                )
+                from suggestions import build_prompt, conditions_key, suggest
+
+                load_env()
+                state = st.session_state
+                conditions = (state["coords"], state["city"], state["temp"], state["humidity"],
+                              state["windspd"], state["aqi"], state["info"])
+                answer = suggest(build_prompt(*conditions), conditions=conditions_key(*conditions))
                 placeholder = st.empty()
                 typed = ""
-                for chunk in request:
-                    if chunk.choices[0].delta.content is not None:
-                        typed += chunk.choices[0].delta.content
+                shown = 0.0
+                for piece in answer:
+                    typed += piece
+                    # Redraw at most every SUGGESTION_REDRAW seconds; each
+                    # redraw resends the whole text to the browser
+                    if time.perf_counter() - shown >= SUGGESTION_REDRAW:
                         placeholder.markdown(typed)
-                    time.sleep(0.1)
+                        shown = time.perf_counter()
+                placeholder.markdown(typed)
+                metrics = answer.metrics
+                st.caption(f"{'Cached answer' if metrics.cached else 'First words'} in "
+                           f"{metrics.ttft * 1000:.0f} ms"
+                           + ("" if metrics.cached else f", {metrics.tokens_per_second:.0f} tokens/s"))
             else:
                 st.warning("Please enter the city closest to your farm in the sidebar!")
 
@@ -0,0 +1,22 @@
+import pandas as pd
+import streamlit as st
+
+
+def display_timings(spans):
+    """
+    Sidebar table of the stages timed while the page rendered, slowest first.
+    """
+    with st.sidebar.expander("Timings", expanded=True):
+        if not spans:
+            st.caption("No stages were timed on this rerun.")
+            return
+        rows = pd.DataFrame({
+            "stage": [span.stage for span in spans],
+            "source": [span.source or "" for span in spans],
+            "ms": [round(span.seconds * 1000, 1) for span in spans],
+            "bytes": [span.bytes for span in spans],
+            "features": [span.features for span in spans],
+            "detail": [", ".join(f"{key}={value}" for key, value in span.detail.items()) for span in spans],
+        }).sort_values("ms", ascending=False)
+        st.caption(f"{len(spans)} stages, {rows['ms'].sum():.0f}ms in total (worker stages overlap)")
+        st.dataframe(rows, hide_index=True, use_container_width=True)
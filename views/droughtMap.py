@@ -1,99 +1,85 @@
-import requests
 import folium
-import pandas as pd
 import streamlit as st
-from streamlit_folium import st_folium
+import streamlit.components.v1 as components
+from folium.plugins import VectorGridProtobuf
+from branca.colormap import StepColormap
 import json
-
-# Base URL for US Drought Current (ID: 3)
-url = "https://services9.arcgis.com/RHVPKKiFTONKtxq3/arcgis/rest/services/US_Drought_Intensity_v1/FeatureServer/3/query"
-
-params = {
-    'where': '1=1',
-    'outFields': '*',
-    'returnGeometry': 'true',
-    'returnCentroid': 'true',
-    'f': 'json',
-    'resultRecordCount': 1000,
-    'outSR': 4326
-}
-
-def fetch_drought_data():
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        features = data.get('features', [])
-        drought_categories = {
-            'd0': {'color': '#FFFF00', 'label': 'D0 (Abnormally Dry)'},
-            'd1': {'color': '#FFA500', 'label': 'D1 (Moderate Drought)'},
-            'd2': {'color': '#FF0000', 'label': 'D2 (Severe Drought)'},
-            'd3': {'color': '#8B0000', 'label': 'D3 (Extreme Drought)'},
-            'd4': {'color': '#800080', 'label': 'D4 (Exceptional Drought)'},
+from droughtData import CHOROPLETH_COLORS, FOLIUM_ZOOM, get_drought_layer, get_drought_view, publish_drought_tiles
+from tileServer import MAX_ZOOM
+import timing
+
+# Initial zoom of the folium map; the GeoJSON fallback is generalized for it
+MAP_ZOOM = FOLIUM_ZOOM
+
+# Leaflet.VectorGrid style for the drought tiles, with the choropleth colours
+VECTOR_GRID_OPTIONS = """{
+    "maxNativeZoom": %d,
+    "vectorTileLayerStyles": {
+        "drought": function(properties) {
+            var colors = %s;
+            return {
+                "fill": true,
+                "fillColor": colors[properties.dm] || "#999999",
+                "fillOpacity": 0.7,
+                "color": "#000000",
+                "opacity": 0.2,
+                "weight": 1
+            };
         }
-        processed_data = []
-        for feature in features:
-            attributes = feature.get('attributes', {})
-            geometry = feature.get('geometry', {})
-            rings = geometry.get('rings', [])
-            processed_data.append({
-                "OBJECTID": attributes.get("OBJECTID"),
-                "period": attributes.get("period"),
-                "dm": attributes.get("dm"),
-                "rings": rings,
-                "label": drought_categories.get(f'd{attributes.get("dm")}', {}).get("label", "Unknown")
-            })
-        return processed_data, drought_categories
-    else:
-        print(f"Error fetching data: {response.status_code}")
-        return [], {}
-
-def create_choropleth_map(drought_data, drought_key):
-    df = pd.DataFrame(drought_data)
-
-
-    m = folium.Map(location=[39.5, -98.35], zoom_start=4)
+    }
+}""" % (MAX_ZOOM, json.dumps(CHOROPLETH_COLORS))
 
-    geojson_features = []
-    for entry in drought_data:
-        geojson_features.append({
-            "type": "Feature",
-            "geometry": {
-                "type": "Polygon",
-                "coordinates": entry["rings"]
-            },
-            "properties": {
-                "OBJECTID": entry["OBJECTID"],
-                "drought_level": entry["dm"]
-            }
-        })
+def create_choropleth_map(layer):
+    m = folium.Map(location=[39.5, -98.35], zoom_start=MAP_ZOOM)
 
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": geojson_features
-    }
+    tile_url = publish_drought_tiles(layer)
+    if tile_url:
+        # Leaflet fetches only the vector tiles in view
+        VectorGridProtobuf(tile_url, "Drought Intensity", VECTOR_GRID_OPTIONS).add_to(m)
+        return m
 
-    folium.Choropleth(
-        geo_data=geojson_data,
+    # The GeoJSON and its fill colours are built with each snapshot, generalized for the zoom, by droughtData
+    folium.GeoJson(
+        get_drought_view(layer, MAP_ZOOM).geojson,
         name='choropleth',
-        data=df,
-        columns=['OBJECTID', 'dm'], 
-        key_on='feature.properties.OBJECTID',  
-        fill_color='YlOrRd',
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name='Drought Intensity'
+        style_function=lambda feature: {
+            "fillColor": feature["properties"]["fill"],
+            "fillOpacity": 0.7,
+            "color": "#000000",
+            "opacity": 0.2,
+            "weight": 1
+        }
     ).add_to(m)
+    StepColormap(CHOROPLETH_COLORS, vmin=0, vmax=len(CHOROPLETH_COLORS),
+                 caption='Drought Intensity').add_to(m)
 
     return m
 
+# (snapshot key, rendered map HTML) of the last drought map rendered
+_map_html = (None, None)
+
+def get_map_html(layer):
+    """
+    The drought map rendered to HTML, once per snapshot. Rendering embeds
+    (and folium re-templates) the whole layer, which takes seconds when the
+    GeoJSON fallback is in use, so reruns reuse the same page.
+    """
+    global _map_html
+    key, html = _map_html
+    if key != layer.key:
+        with timing.span("folium_render", "drought") as span:
+            html = create_choropleth_map(layer).get_root().render()
+            span.add(bytes=len(html))
+        _map_html = (layer.key, html)
+    return html
+
 def display_drought_map():
     st.title("Drought Intensity Visualization")
-    drought_data, drought_key = fetch_drought_data()
+    layer = get_drought_layer()
 
-    if drought_data:
+    if layer and layer.entries:
         
-        m = create_choropleth_map(drought_data, drought_key)
-        st_folium(m, width=700, height=500)
+        components.html(get_map_html(layer), width=700, height=500)
 
     else:
         st.error("Failed to fetch drought data.")
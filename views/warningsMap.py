@@ -1,29 +1,65 @@
 import streamlit as st
 import pandas as pd
 import pydeck as pdk
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from warningsData import main as get_warnings_data, INTERESTED_EVENTS
+from warningsData import INTERESTED_EVENTS, MAP_ZOOM, SCOPE_RADII_KM, envelope_warnings, start_scoped_warnings
+from ingestService import latest_snapshot
 from views.dashboard import get_coordinates
+from deckBuffers import CompactDeck, point_layer_data
+from tileServer import MAX_ZOOM, TileSource, features_key, get_tile_server
+import numpy as np
+import shapely
 import requests
+import time
 
-def display_event_map(lat=None, lon=None):
-    st.title("Smart Warning Map")
+# Envelope radius (km) per area choice; None loads every warning in the country
+SCOPE_AREAS = dict(zip(["Local", "Regional", "Wide"], SCOPE_RADII_KM), National=None)
+# Initial map zoom that roughly fits each envelope
+SCOPE_ZOOMS = dict(zip(SCOPE_RADII_KM, [7, 6, 4]))
+# How often a map showing snapshot warnings checks for its scoped load (seconds)
+REFINE_POLL = 2
 
-    st.write("Live fetching warning data... 🔴")
+@st.fragment(run_every=REFINE_POLL)
+def rerun_when_loaded(load):
+    if load.done():
+        st.rerun()
 
-    event_properties, coordinates, labels = get_warnings_data()
-
-    event_list = []
-    for event_type, events in event_properties.items():
-        for event in events:
-            event_list.append({
-                'latitude': event['latitude'],
-                'longitude': event['longitude'],
-                'event_type': event_type
-            })
+def display_event_map(lat=None, lon=None):
+    st.title("Smart Warning Map")
 
-    df = pd.DataFrame(event_list)
+    radius_km = None
+    if lat is not None and lon is not None:
+        # Zooming out widens the query envelope; only "National" reads the full table
+        area = st.select_slider("Area", options=list(SCOPE_AREAS), value="Local")
+        radius_km = SCOPE_AREAS[area]
+
+    # The scoped warnings load in the background; until they are in, the
+    # envelope is cut from the national snapshot, so the page never waits on
+    # the cell queries
+    scoped = None
+    if radius_km is not None:
+        zoom = SCOPE_ZOOMS[radius_km]
+        load = start_scoped_warnings(lat, lon, radius_km, zoom)
+        scoped = load.result() if load.done() else None
+
+    if scoped is not None:
+        warnings, properties = scoped
+    else:
+        snapshot = latest_snapshot("warnings")
+        if snapshot is None:
+            st.info("Warning data is still loading; check back in a moment.")
+            return
+        st.caption(f"Warnings as of {time.strftime('%H:%M', time.localtime(snapshot.fetched_at))} "
+                   f"({snapshot.age / 60:.0f} min ago), refreshed in the background")
+        if radius_km is None:
+            warnings, properties = snapshot.data
+            zoom = MAP_ZOOM
+        else:
+            warnings, properties = envelope_warnings(snapshot.data, lat, lon, radius_km)
+            if load.done():
+                st.caption("Nearby warnings couldn't be refined; showing this area of the national map.")
+            else:
+                st.caption("Refining nearby warnings...")
+                rerun_when_loaded(load)
 
     unique_event_types = INTERESTED_EVENTS
     num_event_types = len(unique_event_types)
@@ -44,36 +80,96 @@ def display_event_map(lat=None, lon=None):
 
     event_type_colors = dict(zip(unique_event_types, color_palette))
 
-    df['color'] = df['event_type'].map(event_type_colors)
+    # event_type is categorical over INTERESTED_EVENTS, so its codes index the palette
+    codes = warnings['event_type'].cat.codes.to_numpy()
+    located = codes >= 0
+    df = point_layer_data(
+        warnings['latitude'].to_numpy()[located],
+        warnings['longitude'].to_numpy()[located],
+        codes[located],
+        color_palette
+    )
 
     if lat is None or lon is None:
         lat, lon = 39.5, -98.35
 
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        data=df,
-        get_position='[longitude, latitude]',
-        get_radius=6000,
-        get_fill_color='color',
-        pickable=True,
-    )
+    # Scoped tables are small enough to embed; the national one is served as tiles
+    tile_url = publish_warning_tiles(warnings, color_palette) if radius_km is None else None
+    if tile_url:
+        # Only the tiles in view are loaded, whatever the number of warnings
+        layer = pdk.Layer(
+            "MVTLayer",
+            data=tile_url,
+            max_zoom=MAX_ZOOM,
+            point_type='circle',
+            get_point_radius=6000,
+            get_fill_color='[properties.r, properties.g, properties.b]',
+            pickable=True,
+        )
+    else:
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data=df,
+            get_position='[longitude, latitude]',
+            get_radius=6000,
+            get_fill_color='[r, g, b]',
+            pickable=True,
+        )
 
     view_state = pdk.ViewState(
         latitude=lat, 
         longitude=lon,
-        zoom=6,
+        zoom=zoom,
         pitch=0
     )
 
     col1, col2 = st.columns([10, 4])
 
     with col1:
-        st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view_state), key="event_map")
+        st.pydeck_chart(CompactDeck(layers=[layer], initial_view_state=view_state), key="event_map")
 
     with col2:
         display_custom_legend(event_type_colors)
 
+def display_saved_event_map():
+    """
+    The event map around the farm location saved from the Dashboard's city,
+    scoped to an envelope; the national map until a city has been entered.
+    """
+    lat, lon = st.session_state.get("coords") or (None, None)
+    if lat is None or lon is None:
+        st.caption("Enter your city on the Dashboard to see the warnings around your farm.")
+    display_event_map(lat, lon)
+
+def publish_warning_tiles(warnings, color_palette):
+    """
+    Publish the located warnings to the local vector tile server and return
+    the tile URL template, or None when tiles are unavailable.
+    """
+    server = get_tile_server()
+    if server is None:
+        return None
+
+    def build():
+        located = warnings[warnings['event_type'].notna()]
+        colors = np.asarray(color_palette)[located['event_type'].cat.codes.to_numpy()]
+        properties = [
+            {"event_type": event_type, "cluster_id": int(cluster_id), "r": int(r), "g": int(g), "b": int(b)}
+            for event_type, cluster_id, (r, g, b)
+            in zip(located['event_type'].astype(str), located['cluster_id'], colors)
+        ]
+        geometries = shapely.points(located['longitude'].to_numpy(), located['latitude'].to_numpy())
+        return TileSource("warnings", geometries, properties)
+
+    key = features_key(warnings['layer_id'], warnings['feature_id'], warnings['cluster_id'])
+    server.publish("warnings", key, build)
+    return server.tile_url("warnings")
+
 def display_custom_legend(event_type_colors):
+    # matplotlib is only needed for the legend, so it isn't imported with the page
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
+
     fig, ax = plt.subplots(figsize=(3, 2))
 
     legend_items = []
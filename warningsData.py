@@ -1,14 +1,24 @@
 # warningsData.py
 
+import os
 import requests
 import json
 import numpy as np
-from sklearn.cluster import DBSCAN
-import urllib.parse
+import pandas as pd
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from clusterEngine import IncrementalDBSCAN
+from featureSync import FeatureLayerSync
+from featureCache import get_cache
+from featureQuery import build_query, generalization_params, out_fields, query_band
+from featureReader import stream_features
+from ingestService import RETRY_DELAY, register_source, submit_load
+import timing
 from shapely.geometry import shape
-import matplotlib.pyplot as plt
 
-BASE_URL = "https://services9.arcgis.com/RHVPKKiFTONKtxq3/ArcGIS/rest/services/NWS_Watches_Warnings_v1/FeatureServer/"
+BASE_URL = os.getenv("FARMVIS_WARNINGS_URL", "https://services9.arcgis.com/RHVPKKiFTONKtxq3/ArcGIS/rest/services/NWS_Watches_Warnings_v1/FeatureServer/")
 INTERESTED_EVENTS = [
     "Flash Flood Warning", "Hydrologic Advisory", "Hydrologic Outlook",
     "Low Water Advisory", "Flash Flood Statement", "Flash Flood Watch",
@@ -17,87 +27,342 @@ INTERESTED_EVENTS = [
 ]
 LAYERS = [1, 2, 3, 4, 5, 6, 8, 9, 10, 11, 12]
 
+# DBSCAN neighbourhood radius in kilometres (great-circle distance)
+CLUSTER_EPS_KM = 10
+CLUSTER_MIN_SAMPLES = 3
+# Scoped tables each keep their own clusterer; at most this many are kept
+MAX_CLUSTERERS = 32
+
+# Keep a local copy of each layer and only download new or edited features
+DELTA_SYNC = True
+
+# Serve layers from the shared on-disk cache for CACHE_TTL seconds
+FEATURE_CACHE = True
+CACHE_TTL = 300
+
+# How often the ingest service rebuilds the warnings snapshot (seconds)
+INGEST_INTERVAL = 300
+
+# Envelope radii (km) for the scoped warning map, smallest first
+SCOPE_RADII_KM = [150, 400, 800]
+# Scoped queries fetch warnings per grid cell, so nearby users reuse already
+# cached cells. Each radius has its own grid level with cells of this size
+# (degrees), so a small envelope doesn't download a much larger area
+SCOPE_CELL_DEGREES = dict(zip(SCOPE_RADII_KM, [1.0, 2.0, 4.0]))
+
+# The only properties build_warning_table reads
+QUERY_FIELDS = ["Event"]
+# Zoom of the national Event Map. The national table is queried generalized
+# for it (see featureQuery), which moves polygon centroids by well under a pixel.
+MAP_ZOOM = 6
+
+# Concurrency limit for layer fetches and per-layer request timeout (seconds)
+MAX_WORKERS = 6
+LAYER_TIMEOUT = 10
+
+_session = None
+_clusterers = {}
+# Session scripts and the ingest thread share the clusterer registry
+_clusterers_lock = threading.Lock()
+# (first cell, last cell, zoom) -> (start time, Future) of a background scoped load
+_scoped_loads = {}
+_scoped_loads_lock = threading.Lock()
+_layer_syncs = {}
+
+def get_session(pool_size=MAX_WORKERS):
+    """
+    Return a shared keep-alive session so layer requests reuse pooled connections.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
 def encode_events(events):
-    return ','.join([f"'{urllib.parse.quote(event)}'" for event in events])
-
-def fetch_data_from_layer(layer_id, where_clause):
-    query = f"query?where={where_clause}&outFields=*&returnGeometry=true&f=pgeojson"
-    response = requests.get(BASE_URL + str(layer_id) + '/' + query)
-    if response.status_code == 200:
-        data = response.json()
-        if 'features' in data:
-            return data['features']
-        else:
-            return []
+    return ','.join(["'" + event.replace("'", "''") + "'" for event in events])
+
+def get_layer_sync(layer_id, where_clause, session=None, timeout=LAYER_TIMEOUT, zoom=None):
+    band = query_band(zoom)
+    key = (layer_id, where_clause, band)
+    if key not in _layer_syncs:
+        _layer_syncs[key] = FeatureLayerSync(
+            BASE_URL + str(layer_id), where=where_clause, out_fields=out_fields(QUERY_FIELDS), fmt="pgeojson",
+            session=session or get_session(), timeout=timeout, extra_params=generalization_params(band),
+            source="warnings"
+        )
+    return _layer_syncs[key]
+
+def fetch_data_from_layer(layer_id, where_clause, session=None, timeout=LAYER_TIMEOUT, delta=None, zoom=None):
+    """
+    Features for one layer, served from the on-disk cache while it is fresh,
+    or None if the layer couldn't be fetched. With zoom, geometry is
+    generalized for its band and cached per band.
+    """
+    if not FEATURE_CACHE:
+        return download_layer(layer_id, where_clause, session, timeout, delta, zoom)
+    return get_cache().get_or_fetch(
+        f"warnings/{layer_id}", {"url": BASE_URL, "where": where_clause, "band": query_band(zoom)},
+        lambda: download_layer(layer_id, where_clause, session, timeout, delta, zoom),
+        ttl=CACHE_TTL
+    )
+
+def download_layer(layer_id, where_clause, session=None, timeout=LAYER_TIMEOUT, delta=None, zoom=None):
+    if DELTA_SYNC if delta is None else delta:
+        sync = get_layer_sync(layer_id, where_clause, session, timeout, zoom)
+        try:
+            sync.refresh()
+        except (requests.RequestException, ValueError) as e:
+            # Keep serving the last synchronised copy, if there is one
+            print(f"Failed to sync layer {layer_id}: {e}")
+            return sync.snapshot() if sync.features else None
+        return sync.snapshot()
+
+    session = session or get_session()
+    params, _ = build_query(where_clause, QUERY_FIELDS, zoom, f="pgeojson")
+    try:
+        # pbf where the server supports it; JSON is decoded feature by feature,
+        # never holding the whole body as bytes and text
+        stream = stream_features(session, "GET", BASE_URL + str(layer_id) + '/query', params, timeout, "warnings")
+        return list(stream)
+    except requests.RequestException as e:
+        print(f"Failed to fetch data from layer {layer_id}: {e}")
+        return None
+    except ValueError as e:
+        print(f"Failed to read data from layer {layer_id}: {e}")
+        return None
+
+def scope_level(radius_km):
+    """
+    Cell size (degrees) of the grid level for an envelope radius: that of
+    the smallest SCOPE_RADII_KM entry covering it, else the coarsest.
+    """
+    for radius in SCOPE_RADII_KM:
+        if radius_km <= radius:
+            return SCOPE_CELL_DEGREES[radius]
+    return SCOPE_CELL_DEGREES[SCOPE_RADII_KM[-1]]
+
+def envelope_bounds(lat, lon, radius_km):
+    """
+    (south, north, west, east) in degrees of an envelope of radius_km around a point.
+    """
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.0 * max(np.cos(np.radians(lat)), 0.01))
+    return max(lat - dlat, -90), min(lat + dlat, 90), lon - dlon, lon + dlon
+
+def scope_cells(lat, lon, radius_km):
+    """
+    Grid cells (cell_degrees, col, row) covering an envelope of radius_km
+    around a point, on the grid level for radius_km.
+    """
+    cell_degrees = scope_level(radius_km)
+    south, north, west, east = envelope_bounds(lat, lon, radius_km)
+    cols = range(int(np.floor(west / cell_degrees)), int(np.floor(east / cell_degrees)) + 1)
+    rows = range(int(np.floor(south / cell_degrees)), int(np.floor(north / cell_degrees)) + 1)
+    return [(cell_degrees, col, row) for col in cols for row in rows]
+
+def cell_envelope(cell):
+    """
+    Query parameters restricting a FeatureServer query to one grid cell.
+    """
+    cell_degrees, col, row = cell
+    xmin, ymin = col * cell_degrees, row * cell_degrees
+    return {
+        "geometry": f"{xmin},{ymin},{xmin + cell_degrees},{ymin + cell_degrees}",
+        "geometryType": "esriGeometryEnvelope",
+        "inSR": 4326,
+        "spatialRel": "esriSpatialRelIntersects",
+    }
+
+def fetch_cell_from_layer(layer_id, where_clause, cell, session=None, timeout=LAYER_TIMEOUT, zoom=None):
+    """
+    Features of one layer inside one grid cell, cached per grid level, cell
+    and zoom band, or None if the cell couldn't be fetched.
+    """
+    cache = get_cache() if FEATURE_CACHE else None
+    params, band = build_query(where_clause, QUERY_FIELDS, zoom, f="pgeojson", **cell_envelope(cell))
+    key = (f"warnings/{layer_id}/cell",
+           {"url": BASE_URL, "where": where_clause, "level": cell[0], "cell": list(cell[1:]), "band": band})
+    if cache is not None:
+        cached = cache.get(*key)
+        if cached is not None:
+            return cached
+
+    session = session or get_session()
+    try:
+        stream = stream_features(session, "GET", BASE_URL + str(layer_id) + '/query', params, timeout, "warnings")
+        features = list(stream)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Failed to fetch cell {cell} from layer {layer_id}: {e}")
+        return None
+    if 'error' in stream.meta:
+        print(f"Failed to fetch cell {cell} from layer {layer_id}: {stream.meta['error']}")
+        return None
+
+    # Empty cells are cached too, so they aren't queried again until they expire
+    if cache is not None:
+        cache.set(*key, features, ttl=CACHE_TTL)
+    return features
+
+def fetch_scoped_layers(layers, where_clause, cells, max_workers=MAX_WORKERS, timeout=LAYER_TIMEOUT, zoom=None):
+    """
+    Fetch every layer restricted to the given cells, one query per (layer, cell).
+    A feature crossing cell edges comes back from each cell but is kept once.
+    A layer none of whose cells could be fetched comes back as None.
+    """
+    session = get_session()
+    jobs = [(layer, cell) for layer in layers for cell in cells]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(
+            timing.bind(lambda job: fetch_cell_from_layer(job[0], where_clause, job[1], session=session,
+                                                          timeout=timeout, zoom=zoom)),
+            jobs
+        ))
+
+    per_layer = {layer: {} for layer in layers}
+    fetched = set()
+    for (layer, cell), features in zip(jobs, results):
+        if features is None:
+            continue
+        fetched.add(layer)
+        seen = per_layer[layer]
+        for feature in features:
+            key = feature.get('id', feature.get('properties', {}).get('OBJECTID'))
+            seen[key if key is not None else len(seen)] = feature
+    return [list(per_layer[layer].values()) if layer in fetched else None for layer in layers]
+
+def fetch_layers(layers, where_clause, max_workers=MAX_WORKERS, timeout=LAYER_TIMEOUT, zoom=None):
+    """
+    Fetch features for every layer, at most max_workers requests in flight at once.
+    Results come back in the same order as layers, None for a layer that failed.
+    """
+    if max_workers <= 1:
+        return [fetch_data_from_layer(layer, where_clause, timeout=timeout, zoom=zoom) for layer in layers]
+
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            timing.bind(lambda layer: fetch_data_from_layer(layer, where_clause, session=session, timeout=timeout,
+                                                            zoom=zoom)),
+            layers
+        ))
+
+def process_layers(layers, where_clause, max_workers=MAX_WORKERS, timeout=LAYER_TIMEOUT, cells=None, zoom=None):
+    """
+    Fetch every layer and build one columnar warning table.
+
+    Returns (warnings, properties, layer_summary). warnings is a DataFrame with
+    one row per located feature: latitude, longitude, layer_id, event_type
+    (categorical over INTERESTED_EVENTS, NaN for anything else), feature_id
+    and prop_idx, the row's index into the properties list. With cells, only
+    features inside those grid cells are fetched. With zoom, geometry is
+    generalized on the server for a map at that zoom. Properties hold only
+    OBJECTID, QUERY_FIELDS and, when delta-synced, the layer's edit-date
+    field. A layer that couldn't be fetched has "failed"
+    set in its summary.
+    """
+    if cells is None:
+        layer_features = fetch_layers(layers, where_clause, max_workers=max_workers, timeout=timeout, zoom=zoom)
     else:
-        print(f"Failed to fetch data from layer {layer_id}. Status code: {response.status_code}, Response: {response.text}")
-        return []
+        layer_features = fetch_scoped_layers(layers, where_clause, cells, max_workers=max_workers, timeout=timeout,
+                                             zoom=zoom)
+    return build_warning_table(layers, layer_features)
 
-def process_layers(layers, where_clause):
-    coordinates = []
-    # Initialize event_properties with empty lists for each interested event
-    event_properties = {event: [] for event in INTERESTED_EVENTS}
+def build_warning_table(layers, layer_features):
+    """
+    Parse the features fetched for each layer (None for a failed layer) into
+    the warning table.
+    """
+    latitudes = []
+    longitudes = []
+    layer_ids = []
+    feature_ids = []
+    event_types = []
+    properties = []
     layer_summary = {}
 
-    for layer in layers:
-        features = fetch_data_from_layer(layer, where_clause)
-        print(f"Layer {layer}: Found {len(features)} features")
+    # Reading coordinates out of the features, including polygon centroids
+    with timing.span("geometry_build", "warnings") as span:
+        for layer, features in zip(layers, layer_features):
+            layer_summary[layer] = {
+                "total_features": len(features or []),
+                "valid_coordinates": 0,
+                "invalid_geometries": 0,
+                "failed": features is None
+            }
+            if features is None:
+                print(f"Layer {layer}: Failed to fetch")
+                continue
+            print(f"Layer {layer}: Found {len(features)} features")
 
-        layer_summary[layer] = {
-            "total_features": len(features),
-            "valid_coordinates": 0,
-            "invalid_geometries": 0
-        }
+            for feature in features:
+                if 'geometry' in feature:
+                    geom_type = feature['geometry']['type']
 
-        for feature in features:
-            if 'geometry' in feature:
-                geom_type = feature['geometry']['type']
-                geom = shape(feature['geometry'])
-
-                if geom_type == 'Point':
-                    lat = feature['geometry']['coordinates'][1]
-                    lon = feature['geometry']['coordinates'][0]
-                    coordinates.append([lat, lon])
-
-                    event_type = feature['properties']['Event']
-                    if event_type in INTERESTED_EVENTS:
-                        event_properties[event_type].append({
-                            "layer_id": layer,
-                            "latitude": lat,
-                            "longitude": lon,
-                            "properties": feature['properties']
-                        })
-                    layer_summary[layer]["valid_coordinates"] += 1
+                    if geom_type == 'Point':
+                        lon, lat = feature['geometry']['coordinates'][:2]
+                    elif geom_type in ['Polygon', 'MultiPolygon']:
+                        centroid = shape(feature['geometry']).centroid
+                        lat, lon = centroid.y, centroid.x
+                    else:
+                        layer_summary[layer]["invalid_geometries"] += 1
+                        continue
 
-                elif geom_type in ['Polygon', 'MultiPolygon']:
-                    centroid = geom.centroid
-                    coordinates.append([centroid.y, centroid.x])
-
-                    event_type = feature['properties']['Event']
-                    if event_type in INTERESTED_EVENTS:
-                        event_properties[event_type].append({
-                            "layer_id": layer,
-                            "latitude": centroid.y,
-                            "longitude": centroid.x,
-                            "properties": feature['properties']
-                        })
+                    latitudes.append(lat)
+                    longitudes.append(lon)
+                    layer_ids.append(layer)
+                    feature_ids.append(feature.get('id', feature['properties'].get('OBJECTID', len(properties))))
+                    event_types.append(feature['properties'].get('Event'))
+                    properties.append(feature['properties'])
                     layer_summary[layer]["valid_coordinates"] += 1
-
                 else:
                     layer_summary[layer]["invalid_geometries"] += 1
-            else:
-                layer_summary[layer]["invalid_geometries"] += 1
+        span.add(features=len(properties))
+
+    with timing.span("dataframe_build", "warnings") as span:
+        warnings = pd.DataFrame({
+            "latitude": np.asarray(latitudes, dtype=float),
+            "longitude": np.asarray(longitudes, dtype=float),
+            "layer_id": np.asarray(layer_ids, dtype=int),
+            "feature_id": feature_ids,
+            "event_type": pd.Categorical(event_types, categories=INTERESTED_EVENTS),
+            "prop_idx": np.arange(len(properties)),
+        })
+        span.add(features=len(warnings))
 
-    return coordinates, event_properties, layer_summary
+    return warnings, properties, layer_summary
 
-def apply_dbscan(coordinates, eps=0.1, min_samples=3):
+def get_clusterer(scope=None):
+    """
+    Return the clusterer for a scope (None for the national table), which
+    keeps its neighbourhood graph between refreshes so only added or expired
+    warnings are re-examined.
+    """
+    with _clusterers_lock:
+        clusterer = _clusterers.pop(scope, None)
+        if clusterer is None:
+            clusterer = IncrementalDBSCAN(eps_km=CLUSTER_EPS_KM, min_samples=CLUSTER_MIN_SAMPLES)
+            if len(_clusterers) >= MAX_CLUSTERERS:
+                # Forget the least recently used scope
+                del _clusterers[next(key for key in _clusterers if key is not None)]
+        # Re-inserting keeps the dict in least-recently-used order
+        _clusterers[scope] = clusterer
+        return clusterer
+
+def apply_dbscan(coordinates, keys=None, scope=None):
     if len(coordinates) > 0:
-        coords = np.array(coordinates)
-        db = DBSCAN(eps=eps, min_samples=min_samples).fit(coords)
-        labels = db.labels_
+        if keys is None:
+            keys = [tuple(coord) for coord in coordinates]
+        clusterer = get_clusterer(scope)
+        with timing.span("dbscan", "warnings", scope=scope) as span:
+            labels = clusterer.update(keys, coordinates)
+            span.add(features=len(coordinates))
 
         n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
-        n_noise = list(labels).count(-1)
+        n_noise = int(np.count_nonzero(labels == -1))
 
         print(f"Number of clusters found by DBSCAN: {n_clusters}")
         print(f"Number of noise points found by DBSCAN: {n_noise}")
@@ -107,24 +372,91 @@ def apply_dbscan(coordinates, eps=0.1, min_samples=3):
         print("No valid coordinates found for DBSCAN clustering.")
         return [], 0, 0
 
-def main():
+def where_interested():
     encoded_event_names = encode_events(INTERESTED_EVENTS)
-    where_clause = f"Event IN ({encoded_event_names})"
-    
-    coordinates, event_properties, layer_summary = process_layers(LAYERS, where_clause)
-    
-    labels, n_clusters, n_noise = apply_dbscan(coordinates)
-
-    for idx, label in enumerate(labels):
-        if label == -1:
-            continue
-        for event_type, properties in event_properties.items():
-            if idx < len(properties) and properties[idx]['latitude'] == coordinates[idx][0] and properties[idx]['longitude'] == coordinates[idx][1]:
-                properties[idx]['cluster_id'] = label
-                
-    print("Event types found:", list(event_properties.keys()))
+    return f"Event IN ({encoded_event_names})"
 
-    return event_properties, coordinates, labels
+def cluster_warnings(warnings, scope=None):
+    keys = list(zip(warnings["layer_id"], warnings["feature_id"]))
+    labels, n_clusters, n_noise = apply_dbscan(warnings[["latitude", "longitude"]].to_numpy(), keys, scope)
+    # Labels come back in row order, so they attach to the table positionally
+    warnings["cluster_id"] = np.asarray(labels, dtype=int)
+    return warnings
+
+def all_failed(layer_summary):
+    failed = [layer for layer, summary in layer_summary.items() if summary["failed"]]
+    if failed and len(failed) == len(layer_summary):
+        print("Every warning layer failed to load")
+        return True
+    return False
+
+def load_warnings():
+    """
+    Fetch, parse and cluster every layer. Returns (warnings, properties), the
+    data of a "warnings" ingest snapshot, or None if every layer failed, so
+    an outage isn't published as a map without warnings.
+    """
+    warnings, properties, layer_summary = process_layers(LAYERS, where_interested(), zoom=MAP_ZOOM)
+    if all_failed(layer_summary):
+        return None
+    cluster_warnings(warnings)
+
+    print("Event types found:", list(warnings["event_type"].dropna().unique()))
+
+    return warnings, properties
+
+def load_scoped_warnings(lat, lon, radius_km, zoom=None):
+    """
+    Warnings within roughly radius_km of a point, as (warnings, properties),
+    for a map at zoom.
+
+    Only the cells covering the envelope, on the grid level for radius_km,
+    are queried, each cached on its own, so nearby users share them.
+    Clusters are computed over the scoped table only. None if every layer
+    failed.
+    """
+    cells = scope_cells(lat, lon, radius_km)
+    warnings, properties, layer_summary = process_layers(LAYERS, where_interested(), cells=cells, zoom=zoom)
+    if all_failed(layer_summary):
+        return None
+    cluster_warnings(warnings, scope=(min(cells), max(cells)))
+    return warnings, properties
+
+def start_scoped_warnings(lat, lon, radius_km, zoom=None):
+    """
+    Future of load_scoped_warnings(lat, lon, radius_km, zoom), run on the
+    ingest threads so a page never waits on the cell queries. Sessions on the
+    same envelope share one load. A result is reloaded once older than
+    CACHE_TTL, and a failed one (None) after RETRY_DELAY.
+    """
+    cells = scope_cells(lat, lon, radius_km)
+    key = (min(cells), max(cells), zoom)
+    now = time.time()
+    with _scoped_loads_lock:
+        started, load = _scoped_loads.pop(key, (None, None))
+        if load is None or load.done() and now - started >= (CACHE_TTL if load.result() else RETRY_DELAY):
+            started, load = now, submit_load(load_scoped_warnings, lat, lon, radius_km, zoom)
+            if len(_scoped_loads) >= MAX_CLUSTERERS:
+                # Forget the least recently used envelope
+                del _scoped_loads[next(iter(_scoped_loads))]
+        _scoped_loads[key] = started, load
+        return load
+
+def envelope_warnings(data, lat, lon, radius_km):
+    """
+    The rows of a national (warnings, properties) snapshot inside an envelope
+    of radius_km around a point, for showing an area until its scoped load is
+    in. properties is shared, so prop_idx still indexes it.
+    """
+    warnings, properties = data
+    south, north, west, east = envelope_bounds(lat, lon, radius_km)
+    inside = (warnings["latitude"].between(south, north) & warnings["longitude"].between(west, east)).to_numpy()
+    return warnings[inside].reset_index(drop=True), properties
+
+register_source("warnings", load_warnings, INGEST_INTERVAL)
+
+def main():
+    return load_warnings()
 
 if __name__ == "__main__":
     main()